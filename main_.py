@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
 if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+
     from xls2any.scripts import xls2any_
 
     xls2any_.main()
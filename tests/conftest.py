@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+import openpyxl
+import pytest
+
+from xls2any import utils
+
+
+@pytest.fixture
+def make_workbook(tmp_path):
+    def make(filename, rows, sheetname='Sheet1'):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = sheetname
+        for row in rows:
+            ws.append(list(row))
+        filepath = tmp_path / filename
+        wb.save(str(filepath))
+        return str(filepath)
+    return make
+
+
+@pytest.fixture
+def capture():
+    def run(func, *args, **kwds):
+        outer = utils.Ctx.start_capture()
+        try:
+            result = func(*args, **kwds)
+        finally:
+            records = utils.Ctx.stop_capture(outer)
+        return result, records
+    return run
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+
+import jinja2
+import openpyxl
+import pytest
+
+from xls2any import j2ext
+from xls2any import x2pyxl
+from xls2any.utils import Ctx
+
+TEMPLATE = (
+    "{% cache 'block', ws, key %}"
+    "{% for row in ws['@id$2:@id'] %}{{ render(row.valx('@id')) }}{% endfor %}"
+    "{% endcache %}"
+)
+
+
+@pytest.fixture
+def env(tmp_path):
+    env = jinja2.Environment(extensions=[j2ext.CacheExtension])
+    env.fragment_cache_dir = str(tmp_path / 'fragments')
+    env.calls = []
+
+    def render(value):
+        env.calls.append(value)
+        if value == 2:
+            Ctx.error('坏值 {0}', value)
+        return '{0},'.format(value)
+    env.globals['render'] = render
+    return env
+
+
+@pytest.fixture
+def sheet_path(make_workbook):
+    return make_workbook('a.xlsx', [('id',), (1,), (2,)])
+
+
+def render(env, capture, sheet_path, key=None, source=TEMPLATE):
+    ws = x2pyxl.load_worksheet(sheet_path, 'Sheet1', 1)
+    del env.calls[:]
+    return capture(env.from_string(source).render, ws=ws, key=key)
+
+
+def fragment_files(env):
+    return sorted(os.listdir(env.fragment_cache_dir))
+
+
+def test_hit_replays_text_and_errors(env, capture, sheet_path):
+    text, records = render(env, capture, sheet_path)
+    assert text == '1,2,'
+    assert env.calls == [1, 2]
+    assert len(fragment_files(env)) == 1
+    cached, cached_records = render(env, capture, sheet_path)
+    assert cached == text
+    assert env.calls == []
+    assert cached_records == records
+    assert [record[3] for record in records] == ['坏值 {0}']
+
+
+def test_key_invalidation(env, capture, sheet_path):
+    render(env, capture, sheet_path)
+    render(env, capture, sheet_path, key='other')
+    assert env.calls == [1, 2]
+    render(env, capture, sheet_path, source=TEMPLATE.replace("'block'", "'renamed'"))
+    assert env.calls == [1, 2]
+    render(env, capture, sheet_path, source=TEMPLATE.replace('render(', 'render(1 + '))
+    assert env.calls == [2, 3]
+    assert len(fragment_files(env)) == 4
+
+    wb = openpyxl.load_workbook(sheet_path)
+    wb.active.append([3])
+    wb.save(sheet_path)
+    text, _ = render(env, capture, sheet_path)
+    assert text == '1,2,3,'
+    assert env.calls == [1, 2, 3]
+
+
+def test_unreadable_fragments_are_misses(env, capture, sheet_path):
+    render(env, capture, sheet_path)
+    filename = os.path.join(env.fragment_cache_dir, fragment_files(env)[0])
+    for data in (b'garbage', b'', pickle.dumps(['not', 'a', 'fragment']),
+                 # a class that no longer exists
+                 b'\x80\x04\x95\x1a\x00\x00\x00\x00\x00\x00\x00\x8c\x07xls2any\x94\x8c\x07Missing\x94\x93\x94.'):
+        with open(filename, 'wb') as fp:
+            fp.write(data)
+        text, _ = render(env, capture, sheet_path)
+        assert text == '1,2,'
+        assert env.calls == [1, 2]
+
+
+def test_failed_dump_leaves_no_temp_file(env, capture, capsys, monkeypatch, sheet_path):
+    def dump(obj, fp, protocol):
+        fp.write(b'partial')
+        raise TypeError('cannot pickle')
+    monkeypatch.setattr(pickle, 'dump', dump)
+    text, records = render(env, capture, sheet_path)
+    assert text == '1,2,'
+    assert len(records) == 1
+    assert '无法写入缓存块' in capsys.readouterr().err
+    assert fragment_files(env) == []
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from xls2any import x2pyxl
+
+
+def load(make_workbook, rows):
+    filepath = make_workbook('check.xlsx', [('title',), ('id',)] + [(val,) for val in rows])
+    return x2pyxl.load_worksheet(filepath, 'Sheet1', 2)
+
+
+def test_check_passes(make_workbook, capture):
+    ws = load(make_workbook, [1, 2, 3])
+    result, records = capture(ws.check, '@id', 'x < 5', '3:')
+    assert result is True
+    assert records == []
+
+
+def test_check_skips_blank_rows(make_workbook, capture):
+    ws = load(make_workbook, [1, 6, None, 7, 2, None, None, 8])
+    result, records = capture(ws.check, '@id', 'x < 5', '3:')
+    assert result is False
+    assert len(records) == 1
+    level, context, lineno, msg, args, kwds = records[0]
+    assert level == 'ERROR'
+    assert lineno == 4
+    assert args[0] == 3
+    assert args[1] == 'A4=6, A6=7, A10=8'
+
+
+def test_check_counts_exceptions_as_failures(make_workbook, capture):
+    ws = load(make_workbook, [1, 'bad', 9, 2])
+    result, records = capture(ws.check, '@id', 'x < 5', '3:')
+    assert result is False
+    assert len(records) == 1
+    _, _, lineno, _, args, _ = records[0]
+    assert lineno == 4
+    assert args[0] == 2
+    assert args[1].startswith("A4='bad'（TypeError")
+    assert args[1].endswith('A5=9')
+
+
+def test_check_reports_bad_expression(make_workbook, capture):
+    ws = load(make_workbook, [1])
+    result, records = capture(ws.check, '@id', 'x <', '3:')
+    assert result is False
+    assert len(records) == 1
+    assert records[0][3].startswith('校验表达式异常')
+
+
+def test_check_names(make_workbook, capture):
+    ws = load(make_workbook, [1, 1006])
+    result, records = capture(ws.check, '@id', 'x < limit', '3:', limit=1005)
+    assert result is False
+    assert records[0][4][1] == 'A4=1006'
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from xls2any import x2pyxl
+
+ROWS = [
+    ('id', 'name'),
+    (5, 'a'),
+    ('x', 'b'),
+    ('5', 'c'),
+    (None, 'd'),
+    (' x ', 'e'),
+    (7, 'f'),
+    (5.0, 'g'),
+]
+
+
+def duplicates(records):
+    return sorted((record[2], record[4][3], record[4][4]) for record in records)
+
+
+@pytest.mark.parametrize('hashed', [False, True])
+def test_chkuniq_finds_mixed_duplicates(make_workbook, capture, hashed):
+    filepath = make_workbook('uniq.xlsx', ROWS)
+    ws = x2pyxl.load_worksheet(filepath, 'Sheet1', 1)
+    _, records = capture(ws.chkuniq, '@id$2:@id', hashed=hashed)
+    assert all(record[0] == 'ERROR' for record in records)
+    assert duplicates(records) == [(4, 4, 2), (6, 6, 3), (8, 8, 2)]
+    assert {record[2]: record[4][2] for record in records} == {4: ('5',), 6: (' x ',), 8: (5,)}
+
+
+def test_stream_chkuniq_matches_default(make_workbook, capture):
+    filepath = make_workbook('uniq.xlsx', ROWS)
+    ws = x2pyxl.load_worksheet(filepath, 'Sheet1', 1, stream=True)
+    _, records = capture(ws.chkuniq, '@id$2:@id')
+    assert duplicates(records) == [(4, 4, 2), (6, 6, 3), (8, 8, 2)]
+
+
+def test_chkuniq_unique(make_workbook, capture):
+    filepath = make_workbook('uniq.xlsx', [('id',), (1,), (2,), ('3',)])
+    ws = x2pyxl.load_worksheet(filepath, 'Sheet1', 1)
+    for hashed in (False, True):
+        _, records = capture(ws.chkuniq, '@id$2:@id', hashed=hashed)
+        assert records == []
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import jinja2
+import pytest
+
+from xls2any import x2pyxl
+from xls2any.utils import Ctx
+from xls2any.scripts import xls2any_
+
+
+def infer(source):
+    return xls2any_.infer_used_columns(jinja2.Environment().parse(source))
+
+
+def test_infer_constant_keys():
+    assert infer("{% for row in ws['@id$2:@id'] %}{{ row['@name'] }}{{ row.valx('@lvl') }}"
+                 "{% endfor %}") == ['@name', '@lvl']
+
+
+def test_infer_method_args():
+    assert infer("{{ ws.findall(1, '@id$2:@id', '@key') }}") == ['@id$2:@id', '@key']
+    assert infer("{{ ws.findone(1, '@id$2:@id') }}") == ['@id$2:@id']
+    assert infer("{{ ws.records('@id$2:@id', '@id', '@name', as_='dict') }}") == ['@id', '@name']
+    assert infer("{{ ws.sorted_by('@id$2:@id', '@lvl', '@id') }}") == ['@lvl', '@id']
+    assert infer("{{ ws.where('@id$2:@id', '@lvl', 'xgt', 1, '@tag', 'required') }}") == [
+        '@lvl', '@tag']
+    assert infer("{{ ws.check('@lvl', 'x > 0') }}") == ['@lvl']
+    assert infer("{{ rows | xgroupby('@type') }}") == ['@type']
+    assert infer("{% for grp in row.cut('@drop', 2, 3) %}{{ grp[0] }}{% endfor %}") == [
+        ('@drop', 6)]
+
+
+@pytest.mark.parametrize('source', [
+    "{{ row[name] }}",
+    "{{ row[1] }}",
+    "{{ row.valx(name) }}",
+    "{{ row.vals() }}",
+    "{{ ws.records('@id$2:@id', *keys) }}",
+    "{{ ws.records('@id$2:@id', '@id', key) }}",
+    "{{ ws.findall(1, tab) }}",
+    "{{ ws.where('@id$2:@id', key, 'xeq', 1) }}",
+    "{{ rows | xgroupby(key) }}",
+    "{% include 'other.j2' %}",
+])
+def test_infer_gives_up_on_dynamic_access(source):
+    assert infer(source) is None
+
+
+def test_auto_columns_projection(make_workbook, monkeypatch):
+    filepath = make_workbook('a.xlsx', [('id', 'name', 'lvl'), (1, 'a', 5), (2, 'b', 6)])
+    monkeypatch.setattr(x2pyxl, 'AUTO_COLUMNS', infer("{{ row['@name'] }}"))
+    ws = x2pyxl.load_worksheet(filepath, 'Sheet1', 1, columns='auto')
+    assert [row.valx('@name') for row in ws['@id$2:@lvl']] == ['a', 'b']
+    assert [row.valx('@lvl') for row in ws['@id$2:@lvl']] == [None, None]
+    monkeypatch.setattr(x2pyxl, 'AUTO_COLUMNS', infer("{{ row[name] }}"))
+    ws = x2pyxl.load_worksheet(filepath, 'Sheet1', 1, columns='auto')
+    assert [row.valx('@lvl') for row in ws['@id$2:@lvl']] == [5, 6]
+
+
+def test_load_restores_context(make_workbook, capture):
+    filepath = make_workbook('a.xlsx', [('id',), (1,)])
+    Ctx.set_ctx('tmpl.j2', 7)
+    try:
+        x2pyxl.load_worksheet(filepath, 'Sheet1', 1, schema={'@id': 'int'})
+        assert Ctx.get_ctx() == ('tmpl.j2', 7)
+        _, records = capture(x2pyxl.load_worksheet, filepath, 'Sheet1', 1, schema={'@id': 'date'})
+        assert [record[1:3] for record in records] == [('a.xlsx#Sheet1', 2)]
+        assert Ctx.get_ctx() == ('tmpl.j2', 7)
+    finally:
+        Ctx.set_ctx(None, None)
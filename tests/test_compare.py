@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import functools
+import itertools
+
+from xls2any import x2pyxl
+
+VALUES = [
+    0, 1, 2.5, 1001, '1001', ' 1002 ', '999', 'abc', 'abd', 'axy', '怪物a', '怪物b', '',
+    None, True, False, datetime.date(2020, 1, 1), datetime.datetime(2020, 1, 1, 8),
+]
+
+
+def test_string_compare_uses_whole_text():
+    assert not x2pyxl.xeq_('abc', 'axy')
+    assert not x2pyxl.xeq_('1001', '1002')
+    assert x2pyxl.xeq_(' abc ', 'abc')
+    assert x2pyxl.xlt_('abc', 'abd')
+    assert x2pyxl.xgt_('abd', 'abc')
+    assert x2pyxl.xlt_('怪物a', '怪物b')
+    assert x2pyxl.xlt_('zz', 'aaa')
+
+
+def test_compare_is_antisymmetric():
+    for val1, val2 in itertools.product(VALUES, repeat=2):
+        cmp1 = x2pyxl.xcmp_(val1, val2)
+        cmp2 = x2pyxl.xcmp_(val2, val1)
+        assert (cmp1 > 0) - (cmp1 < 0) == -((cmp2 > 0) - (cmp2 < 0)), (val1, val2)
+
+
+def test_mixed_text_and_numbers():
+    assert x2pyxl.xlt_(1001, '1002')
+    assert x2pyxl.xgt_('1002', 1001)
+    assert x2pyxl.xlt_('1001', 1002)
+    assert x2pyxl.xgt_(1002, '1001')
+    assert x2pyxl.xeq_('1001', 1001)
+
+
+def test_sort_is_stable_under_input_order():
+    values = [1001, '1003', 1002, ' 1000 ', '1002']
+    key = functools.cmp_to_key(x2pyxl.xcmp_)
+    for perm in itertools.permutations(values):
+        assert [x2pyxl.xstr(val) for val in sorted(perm, key=key)] == \
+            ['1000', '1001', '1002', '1002', '1003']
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+
+import pytest
+
+from xls2any import utils
+from xls2any.scripts import xls2any_
+
+Ctx = utils.Ctx
+
+
+class Aborted(Exception):
+    pass
+
+
+def on_abort():
+    raise Aborted()
+
+
+@pytest.fixture
+def errors():
+    Ctx.reset_errors()
+    Ctx.set_abort_handler(on_abort)
+    yield Ctx
+    Ctx.set_error_mode()
+    Ctx.set_abort_handler(None)
+    Ctx.set_ctx(None, None)
+    Ctx.reset_errors()
+
+
+def flushed():
+    buf = io.StringIO()
+    Ctx.flush(buf)
+    return buf.getvalue()
+
+
+def test_summary_groups_rows(errors):
+    errors.set_error_mode('summary')
+    for lineno in (4, 2, 3, 9):
+        errors.set_ctx('a.xlsx#S', lineno)
+        errors.error('数值错误 {0}', lineno)
+    errors.set_ctx(None, None)
+    errors.error('其他错误')
+    lines = flushed().splitlines()
+    assert len(lines) == 2
+    assert '[a.xlsx#S:2-4,9]' in lines[0]
+    assert '数值错误 4 (共4处)' in lines[0]
+    assert '[-]' in lines[1]
+
+
+def test_json_counts_and_clears(errors):
+    errors.set_error_mode('json')
+    errors.set_ctx('a.xlsx#S', 3)
+    errors.error('bad {0}', 1)
+    errors.error('bad {0}', 2)
+    result = json.loads(flushed())
+    assert result['count'] == 2
+    assert result['errors'][0]['file'] == 'a.xlsx'
+    assert result['errors'][0]['sheet'] == 'S'
+    assert result['errors'][0]['count'] == 2
+    assert json.loads(flushed()) == {'count': 0, 'errors': []}
+
+
+@pytest.mark.parametrize('mode', utils.Ctx.ERROR_MODES)
+def test_max_errors_cutoff(errors, mode, capsys):
+    errors.set_error_mode(mode, 2)
+    errors.error('first')
+    with pytest.raises(Aborted):
+        errors.error('second')
+    errors.reset_errors()
+    errors.error('first again')
+    with pytest.raises(Aborted):
+        errors.error('second again')
+
+
+def test_serve_requests_do_not_share_errors(tmp_path, errors):
+    template = tmp_path / 'errors.j2'
+    template.write_text("{% do error('bad {0}', 1) %}{% do error('bad {0}', 2) %}ok")
+    for _ in range(2):
+        code, out, err = xls2any_.serve_request(
+            ['--errors', 'json', str(template)], str(tmp_path))
+        assert code == 0
+        assert out.strip() == 'ok'
+        assert json.loads(err)['count'] == 2
+    for _ in range(2):
+        code, out, err = xls2any_.serve_request(
+            ['--errors', 'json', '--max-errors', '2', str(template)], str(tmp_path))
+        assert code == 1
+        assert json.loads(err)['count'] == 3
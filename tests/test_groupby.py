@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+import pytest
+
+from xls2any import x2pyxl
+
+ROWS = [
+    ('id', 'name'),
+    (1001, 'a'),
+    ('1001', 'b'),
+    (' 1002 ', 'c'),
+    (1002.0, 'd'),
+    ('x', 'e'),
+    (1001, 'f'),
+    (' x', 'g'),
+]
+
+
+def group_names(rows, sort):
+    groups = []
+    for key, group in x2pyxl.xgroupby(rows, '@id', sort=sort):
+        groups.append(sorted(row.valx('@name') for row in group))
+    return groups
+
+
+@pytest.fixture
+def rows(make_workbook):
+    filepath = make_workbook('groupby.xlsx', ROWS)
+    return list(x2pyxl.load_worksheet(filepath, 'Sheet1', 1)['2:'])
+
+
+def test_xkey_matches_xeq():
+    for val1, val2 in [
+        (1001, '1001'), ('1001', 1001.0), (' 5 ', 5), ('x ', 'x'), (None, ''),
+        ('TRUE', True), ('1', True), (' FALSE ', False), ('0', False),
+        (datetime.date(2020, 1, 1), '2020-01-01'),
+        (datetime.datetime(2020, 1, 1, 8), '2020-01-01 08:00:00'),
+        (datetime.datetime(2020, 1, 1, 8, 0, 0, 5), '2020-01-01 08:00:00.000005'),
+        (datetime.time(8, 30), ' 08:30:00'),
+    ]:
+        assert x2pyxl.xeq_(val1, val2)
+        assert x2pyxl.xkey_(val1) == x2pyxl.xkey_(val2)
+    for val1, val2 in [
+        (1001, '1002'), ('x', 1), ('', 0), ('true', True), ('TRUE', False),
+        ('2020-1-01', datetime.date(2020, 1, 1)), ('8:30:00', datetime.time(8, 30)),
+    ]:
+        assert not x2pyxl.xeq_(val1, val2)
+        assert x2pyxl.xkey_(val1) != x2pyxl.xkey_(val2)
+
+
+def test_hashed_groups_match_sorted_groups(rows):
+    expected = [['e', 'g'], ['a', 'b', 'f'], ['c', 'd']]
+    assert group_names(rows, True) == expected
+    assert group_names(rows, 'keys') == expected
+    assert group_names(rows, False) == [['a', 'b', 'f'], ['c', 'd'], ['e', 'g']]
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import jinja2
+import openpyxl
+import pytest
+
+from xls2any import utils
+from xls2any import x2pyxl
+from xls2any.scripts import xls2any_
+
+
+@pytest.fixture
+def keep(monkeypatch):
+    monkeypatch.setattr(x2pyxl, 'LOADED_SHEETS', None)
+    monkeypatch.setattr(xls2any_, 'ENVIRONMENTS', None)
+    monkeypatch.setattr(xls2any_, 'COMPILED_TEMPLATES', None)
+
+
+def test_lru_cache():
+    cache = utils.LRUCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1
+    cache['c'] = 3
+    assert 'b' not in cache
+    assert ('a' in cache, 'c' in cache, len(cache)) == (True, True, 2)
+    assert cache.pop('a') == 1
+    assert cache.get('a', 0) == 0
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_loaded_sheets_are_bounded(keep, make_workbook):
+    x2pyxl.keep_worksheets(maxsize=2)
+    paths = [make_workbook('{0}.xlsx'.format(i), [('id',), (i,)]) for i in range(3)]
+    sheets = [x2pyxl.load_worksheet(path, 'Sheet1', 1) for path in paths]
+    assert len(x2pyxl.LOADED_SHEETS) == 2
+    assert x2pyxl.load_worksheet(paths[2], 'Sheet1', 1) is sheets[2]
+    assert x2pyxl.load_worksheet(paths[0], 'Sheet1', 1) is not sheets[0]
+
+
+def test_changed_sheet_is_reloaded(keep, make_workbook):
+    x2pyxl.keep_worksheets()
+    path = make_workbook('a.xlsx', [('id',), (1,)])
+    first = x2pyxl.load_worksheet(path, 'Sheet1', 1)
+    assert x2pyxl.load_worksheet(path, 'Sheet1', 1) is first
+    wb = openpyxl.load_workbook(path)
+    wb.active.append([2])
+    wb.save(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    second = x2pyxl.load_worksheet(path, 'Sheet1', 1)
+    assert second is not first
+    assert [row.valx('@id') for row in second['@id$2:@id']] == [1, 2]
+    assert len(x2pyxl.LOADED_SHEETS) == 1
+
+
+def test_compiled_templates_are_bounded(keep):
+    xls2any_.keep_compiled(maxsize=2)
+    env = xls2any_.get_environment()
+    assert xls2any_.get_environment() is env
+    first = xls2any_.compile_template(env, 'a {{ 1 }}')
+    assert xls2any_.compile_template(env, 'a {{ 1 }}') is first
+    for text in ('b', 'c'):
+        xls2any_.compile_template(env, text)
+    assert len(xls2any_.COMPILED_TEMPLATES) == 2
+    assert xls2any_.compile_template(env, 'a {{ 1 }}') is not first
+    assert isinstance(first[1], jinja2.Template)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import jinja2
+import pytest
+
+from xls2any import j2ext
+from xls2any.scripts import xls2any_
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    main = tmp_path / 'main'
+    lib = tmp_path / 'lib'
+    (lib / 'sub').mkdir(parents=True)
+    main.mkdir()
+    (main / 'a.j2').write_text('main a')
+    (lib / 'a.j2').write_text('lib a')
+    (lib / 'sub' / 'b.j2').write_text("{% include 'a.j2' %} b")
+    return main, lib
+
+
+def make_env(searchpath, bytecode_cache=None):
+    return jinja2.Environment(
+        loader=j2ext.TemplateLoader(str(path) for path in searchpath),
+        bytecode_cache=bytecode_cache)
+
+
+def test_search_order(dirs):
+    main, lib = dirs
+    env = make_env([main, lib])
+    assert env.get_template('a.j2').render() == 'main a'
+    assert env.get_template('sub/b.j2').render() == 'main a b'
+    assert env.loader.loaded == {str(main / 'a.j2'), str(lib / 'sub' / 'b.j2')}
+    assert make_env([lib, main]).get_template('sub/b.j2').render() == 'lib a b'
+    with pytest.raises(jinja2.TemplateNotFound):
+        env.get_template('missing.j2')
+    with pytest.raises(jinja2.TemplateNotFound):
+        env.get_template('../lib/a.j2')
+
+
+def test_detects_encoding(tmp_path):
+    text = '-- 这是自动生成的配置文件，请不要手动修改。'
+    (tmp_path / 'utf8.j2').write_bytes(text.encode('utf-8'))
+    (tmp_path / 'utf16.j2').write_bytes(text.encode('utf-16'))
+    env = make_env([tmp_path])
+    assert env.get_template('utf8.j2').render() == text
+    assert env.get_template('utf16.j2').render() == text
+
+
+def test_reloads_changed_template(dirs):
+    main, lib = dirs
+    env = make_env([main])
+    assert env.get_template('a.j2').render() == 'main a'
+    (main / 'a.j2').write_text('main a2')
+    stat = os.stat(str(main / 'a.j2'))
+    os.utime(str(main / 'a.j2'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert env.get_template('a.j2').render() == 'main a2'
+
+
+def test_bytecode_cache(dirs, tmp_path, monkeypatch):
+    main, _ = dirs
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    compiled = []
+    original = jinja2.Environment.compile
+
+    def compile(self, source, *args, **kwds):
+        compiled.append(source)
+        return original(self, source, *args, **kwds)
+    monkeypatch.setattr(jinja2.Environment, 'compile', compile)
+
+    memory = j2ext.MemoryBytecodeCache(jinja2.FileSystemBytecodeCache(str(cache_dir)))
+    assert make_env([main], memory).get_template('a.j2').render() == 'main a'
+    assert make_env([main], memory).get_template('a.j2').render() == 'main a'
+    assert len(compiled) == 1
+    assert len(os.listdir(str(cache_dir))) == 1
+    # a new process only has the files
+    fresh = j2ext.MemoryBytecodeCache(jinja2.FileSystemBytecodeCache(str(cache_dir)))
+    assert make_env([main], fresh).get_template('a.j2').render() == 'main a'
+    assert len(compiled) == 1
+    # changed sources miss both caches
+    (main / 'a.j2').write_text('main a2')
+    assert make_env([main], fresh).get_template('a.j2').render() == 'main a2'
+    assert len(compiled) == 2
+    memory.clear()
+    assert os.listdir(str(cache_dir)) == []
+
+
+def test_search_path_option(dirs, tmp_path):
+    main, lib = dirs
+    (main / 'top.j2').write_text("{% include 'sub/b.j2' %}")
+    code, out, _ = xls2any_.serve_request(
+        ['--search-path', str(lib), str(main / 'top.j2')], str(tmp_path))
+    assert (code, out.strip()) == (0, 'main a b')
+    code, _, err = xls2any_.serve_request([str(main / 'top.j2')], str(tmp_path))
+    assert code == 1
+    assert 'sub/b.j2' in err
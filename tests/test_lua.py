@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from xls2any import x2pylua
+from xls2any.scripts import xls2any_
+
+VALUE = {
+    'items': [{'name': 'sword', 'kind': 'weapon', 'lvl': i} for i in range(50)],
+    'names': ['sword'] * 5 + ['shield', 'a "quoted"\nline'] * 3,
+    'nested': {'weapon': {'weapon': ['weapon', 1.5, True, None]}},
+    'sparse': {1: 'one', 3: 'three', 'end': 'sword'},
+}
+
+
+def test_lua_closed():
+    assert xls2any_.do_lua({'a': 1}) == '{a=1}'
+    assert xls2any_.do_lua({'a': 1}, closed=False) == 'a=1'
+
+
+def test_lua_dedupe_shares_tables():
+    output = xls2any_.do_lua([{'a': 1}, {'a': 1}], dedupe=True)
+    assert output.startswith('(function()')
+    assert output.count('a=1') == 1
+
+
+def test_lua_dedupe_rejects_open_output():
+    with pytest.raises(ValueError):
+        xls2any_.do_lua([{'a': 1}, {'a': 1}], closed=False, dedupe=True)
+
+
+def lua_value(obj):
+    if hasattr(obj, 'items') and not isinstance(obj, (dict, str)):
+        return {key: lua_value(val) for key, val in obj.items()}
+    return obj
+
+
+def python_value(obj):
+    # the plain shape lua tables load into
+    if isinstance(obj, dict):
+        return {key: python_value(val) for key, val in obj.items() if val is not None}
+    elif isinstance(obj, (list, tuple)):
+        return {idx: python_value(val) for idx, val in enumerate(obj, 1) if val is not None}
+    return obj
+
+
+def test_lua_module_hoists_repeated_strings():
+    output = x2pylua.dumps_module(VALUE, hoist=2)
+    assert output.startswith('local _S = {}')
+    assert output.count('"sword"') == 1
+    assert output.count('"weapon"') == 1
+    assert '"shield"' not in output.partition('return ')[2]
+    assert 'local _S' not in x2pylua.dumps_module(VALUE, hoist=0)
+
+
+def test_lua_module_chunks_large_tables():
+    output = x2pylua.dumps_module(VALUE, chunk_size=16)
+    assert output.count('(function()') > 2
+    assert '(function()' not in x2pylua.dumps_module(VALUE, hoist=0)
+    with pytest.raises(ValueError):
+        x2pylua.dumps_module(VALUE, chunk_size=0)
+
+
+@pytest.mark.parametrize('hoist, chunk_size', [(2, 4096), (0, 8), (2, 8), (3, 1)])
+def test_lua_module_loads_like_lua(hoist, chunk_size):
+    lupa = pytest.importorskip('lupa')
+    runtime = lupa.LuaRuntime()
+    module = runtime.execute(xls2any_.do_lua_module(VALUE, hoist=hoist, chunk_size=chunk_size))
+    plain = runtime.eval(xls2any_.do_lua(VALUE))
+    assert lua_value(module) == lua_value(plain) == python_value(VALUE)
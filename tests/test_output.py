@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import io
+import os
+
+import pytest
+
+from xls2any import utils
+from xls2any.utils import Output
+
+
+@pytest.fixture(autouse=True)
+def output():
+    Output.set_changed_only(False)
+    yield
+    Output.reset()
+    Output.set_changed_only(False)
+
+
+def test_queued_writer_keeps_order():
+    sink = io.BytesIO()
+    writer = utils.QueuedWriter(sink, 'utf-8', queue_size=2, chunk_size=4)
+    for i in range(1000):
+        writer.write('{0},'.format(i))
+    writer.write('中文')
+    writer.close()
+    text = sink.getvalue().decode('utf-8')
+    assert text == ''.join('{0},'.format(i) for i in range(1000)) + '中文'
+
+
+def test_queued_writer_reports_errors():
+    class BrokenSink(object):
+        def write(self, data):
+            raise IOError('disk full')
+    writer = utils.QueuedWriter(BrokenSink(), 'utf-8', chunk_size=1)
+    writer.write('a')
+    with pytest.raises(IOError):
+        writer.close()
+
+
+def test_commit_writes_target(tmp_path):
+    target = tmp_path / 'out.lua'
+    Output.open(str(target))
+    Output.write('return 1\n')
+    Output.close()
+    assert target.read_bytes() == 'return 1{0}'.format(os.linesep).encode()
+    assert os.listdir(str(tmp_path)) == ['out.lua']
+    assert Output.results() == [(str(target), True)]
+
+
+def test_gzip_output(tmp_path):
+    target = tmp_path / 'out.lua.gz'
+    Output.open(str(target))
+    Output.write('x' * 100)
+    Output.close()
+    with gzip.open(str(target), 'rb') as fp:
+        assert fp.read() == b'x' * 100
+
+
+def test_fsync_output(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, 'fsync', synced.append)
+    Output.open(str(tmp_path / 'a.lua'))
+    Output.close()
+    assert synced == []
+    Output.open(str(tmp_path / 'b.lua'), fsync=True)
+    Output.close()
+    assert len(synced) == 1
+
+
+@pytest.mark.parametrize('changed_only', [False, True])
+def test_discard_keeps_previous_file(tmp_path, changed_only):
+    Output.set_changed_only(changed_only)
+    target = tmp_path / 'out.lua'
+    target.write_bytes(b'old')
+    Output.open(str(target))
+    Output.write('partial')
+    Output.close(commit=False)
+    assert target.read_bytes() == b'old'
+    assert os.listdir(str(tmp_path)) == ['out.lua']
+    Output.open(str(tmp_path / 'new.lua'))
+    Output.reset()
+    assert os.listdir(str(tmp_path)) == ['out.lua']
+
+
+def test_failed_commit_keeps_previous_file(tmp_path):
+    target = tmp_path / 'out.lua'
+    target.write_bytes(b'old')
+    Output.open(str(target), encoding='ascii')
+    Output.write('中文')
+    with pytest.raises(UnicodeEncodeError):
+        Output.close()
+    assert target.read_bytes() == b'old'
+    assert os.listdir(str(tmp_path)) == ['out.lua']
+
+
+def test_binary_output(tmp_path):
+    output = Output.open_binary(str(tmp_path / 'out.bin'))
+    output.stream.write(b'\x00\x01')
+    Output.close_binary(output)
+    assert (tmp_path / 'out.bin').read_bytes() == b'\x00\x01'
+
+
+def test_changed_only_keeps_unchanged_file(tmp_path):
+    Output.set_changed_only(True)
+    target = tmp_path / 'out.lua'
+    for text in ('a', 'a', 'b'):
+        Output.open(str(target))
+        Output.write(text)
+        Output.close()
+    assert Output.results() == [(str(target), True), (str(target), False), (str(target), True)]
+    assert target.read_bytes() == b'b'
+    assert os.listdir(str(tmp_path)) == ['out.lua']
+
+
+def test_changed_only_keeps_mtime_and_mode(tmp_path):
+    Output.set_changed_only(True)
+    target = tmp_path / 'out.lua'
+    target.write_bytes(b'same')
+    os.chmod(str(target), 0o640)
+    os.utime(str(target), ns=(1000000000, 1000000000))
+    Output.open(str(target))
+    Output.write('same')
+    Output.close()
+    assert os.stat(str(target)).st_mtime_ns == 1000000000
+    Output.open(str(target))
+    Output.write('new')
+    Output.close()
+    assert os.stat(str(target)).st_mtime_ns != 1000000000
+    assert os.stat(str(target)).st_mode & 0o777 == 0o640
+    assert Output.results() == [(str(target), False), (str(target), True)]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import jinja2
+import pytest
+
+from xls2any import j2ext
+from xls2any import x2pyxl
+from xls2any.utils import Ctx, Output
+
+TEMPLATE = (
+    "{% pfor row in ws['@id$2:@id'] chunks=chunks %}"
+    "{% if row.valx('@id') % 25 == 0 %}{{ error('坏行 {0}', row.valx('@id')) }}{% endif %}"
+    "{{ row.valx('@id') }},"
+    "{% endpfor %}"
+)
+
+
+@pytest.fixture
+def sheet(make_workbook):
+    filepath = make_workbook('a.xlsx', [('id',)] + [(i,) for i in range(1, 301)])
+    return x2pyxl.load_worksheet(filepath, 'Sheet1', 1)
+
+
+def render(sheet, chunks):
+    env = jinja2.Environment(extensions=[j2ext.PforExtension])
+    env.globals['error'] = lambda *args: Ctx.error(*args) or ''
+    return env.from_string(TEMPLATE).render(ws=sheet, chunks=chunks)
+
+
+@pytest.mark.skipif(j2ext._fork_context() is None, reason='needs fork')
+def test_parallel_matches_sequential(sheet, capture, tmp_path):
+    expected, expected_records = capture(render, sheet, 1)
+    assert expected == ''.join('{0},'.format(i) for i in range(1, 301))
+    assert [record[1:3] for record in expected_records] == [
+        ('a.xlsx#Sheet1', i + 1) for i in range(25, 301, 25)]
+    # the output writer thread is busy while the loop forks
+    Output.open(str(tmp_path / 'out.txt'))
+    try:
+        Output.write('x' * 100000)
+        text, records = capture(render, sheet, 4)
+        Output.write(text)
+    finally:
+        Output.close()
+        Output.reset()
+    assert text == expected
+    assert records == expected_records
+    assert (tmp_path / 'out.txt').read_text() == 'x' * 100000 + expected
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import jinja2
+import pytest
+
+from xls2any import x2pyxl
+from xls2any.scripts import xls2any_
+
+
+@pytest.fixture(autouse=True)
+def preloaded(monkeypatch):
+    sheets = {}
+    monkeypatch.setattr(x2pyxl, 'PRELOADED_SHEETS', sheets)
+    return sheets
+
+
+def loadws_calls(source):
+    return list(xls2any_.find_loadws_calls(jinja2.Environment().parse(source)))
+
+
+def test_find_plain_calls():
+    assert loadws_calls("{{ loadws('a.xlsx', 'S1') }}{{ loadws('b.xlsx', 'S2', 1, 'fast') }}") == [
+        ('a.xlsx', 'S1', 'openpyxl'), ('b.xlsx', 'S2', 'fast')]
+    assert loadws_calls("{{ loadws('a.xlsx', 'S1', 1, engine='fast', columns=none) }}") == [
+        ('a.xlsx', 'S1', 'fast')]
+
+
+def test_find_skips_stream_and_projected_calls():
+    assert loadws_calls("{{ loadws('a.xlsx', 'S1', 1, stream=true) }}") == []
+    assert loadws_calls("{{ loadws('a.xlsx', 'S1', 1, stream=flag) }}") == []
+    assert loadws_calls("{{ loadws('a.xlsx', 'S1', 1, columns=['@id']) }}") == []
+    assert loadws_calls("{{ loadws('a.xlsx', 'S1', 1, 'openpyxl', 'auto') }}") == []
+    assert loadws_calls("{{ loadws('a.xlsx', 'S1', 1, stream=false) }}") == [
+        ('a.xlsx', 'S1', 'openpyxl')]
+
+
+def test_projection_ignores_preloaded_sheet(make_workbook, preloaded):
+    filepath = make_workbook('a.xlsx', [('id', 'lvl'), (1, 0), (2, 5)])
+    x2pyxl.preload_worksheets([(filepath, 'Sheet1', 'openpyxl')], jobs=1)
+    assert len(preloaded) == 1
+    ws = x2pyxl.load_worksheet(filepath, 'Sheet1', 1, columns=['@id'])
+    assert [row.valx('@id') for row in ws['@id$2:@lvl']] == [1, 2]
+    assert [row.valx('@lvl') for row in ws['@id$2:@lvl']] == [None, None]
+    ws = x2pyxl.load_worksheet(filepath, 'Sheet1', 1)
+    assert [row.valx('@lvl') for row in ws['@id$2:@lvl']] == [0, 5]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from xls2any import x2pyxl
+
+ROWS = [
+    ('id', 'name', 'lvl'),
+    (1, 'a', 1),
+    (2, None, 2),
+    (3, 'c', None),
+    (None, None, None),
+    (5, ' ', 5),
+    (6, 'f', 6),
+    (None, None, None),
+    (None, None, None),
+    (9, 'i', 9),
+]
+
+
+@pytest.fixture
+def sheet(make_workbook):
+    return x2pyxl.load_worksheet(make_workbook('a.xlsx', ROWS), 'Sheet1', 1)
+
+
+def test_records_as_types(sheet):
+    records = list(sheet.records('@id$2:@lvl', '@id', '@name', as_='tuple'))
+    assert records[:3] == [(1, 'a'), (2, None), (3, 'c')]
+    assert len(records) == 9
+    assert next(sheet.records('@id$2:@lvl', '@id', 3, as_='dict')) == {'id': 1, '3': 1}
+    record = next(sheet.records('@id$2:@lvl', '@id', '@name', as_='namedtuple'))
+    assert (record.id, record.name) == (1, 'a')
+    with pytest.raises(ValueError):
+        list(sheet.records('@id$2:@lvl'))
+    with pytest.raises(ValueError):
+        list(sheet.records('@id$2:@lvl', '@id', as_='list'))
+
+
+@pytest.mark.parametrize('keys', [('@id',), ('@id', '@name'), ('@name', '@lvl')])
+@pytest.mark.parametrize('over', [0, 1, 2, 3])
+def test_required_matches_xrequire(sheet, keys, over):
+    records = list(sheet.records('@id$2:@lvl', *keys, required=True, over=over))
+    expected = [tuple(row.valx(key) for key in keys)
+                for row in x2pyxl.xrequire(sheet['@id$2:@lvl'], *keys, over=over)]
+    assert records == expected
+
+
+def test_required_over(sheet):
+    assert [r[0] for r in sheet.records('@id$2:@lvl', '@id', required=True)] == [1, 2, 3, 5, 6, 9]
+    assert [r[0] for r in sheet.records('@id$2:@lvl', '@id', required=True, over=2)] == [
+        1, 2, 3, 5, 6]
+    assert [r[0] for r in sheet.records('@id$2:@lvl', '@id', '@name', required=True, over=2)] == [
+        1, 3]
+    # over only applies with required
+    assert len(list(sheet.records('@id$2:@lvl', '@id', over=1))) == 9
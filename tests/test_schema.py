@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from xls2any import x2pyxl
+
+DATE = datetime.date(2020, 1, 2)
+DATETIME = datetime.datetime(2020, 1, 2, 3, 4, 5)
+
+
+@pytest.mark.parametrize('convert, value, expected', [
+    ('int', ' 12 ', 12),
+    ('int', 12.0, 12),
+    ('int', '3.0', 3),
+    ('float', '1.5', 1.5),
+    ('float', 2, 2.0),
+    ('num', '7', 7),
+    ('num', '7.5', 7.5),
+    ('num', Decimal('1.5'), 1.5),
+    ('num', True, 1),
+    ('str', 12, '12'),
+    ('str', ' x ', 'x'),
+    ('str', True, 'TRUE'),
+    ('bool', 'true', True),
+    ('bool', ' 0 ', False),
+    ('bool', 2, True),
+    ('date', DATETIME, DATE),
+    ('date', ' 2020-01-02 ', DATE),
+    ('datetime', DATE, datetime.datetime(2020, 1, 2)),
+    ('datetime', '2020-01-02 03:04:05', DATETIME),
+    ('datetime', '2020-01-02T03:04:05', DATETIME),
+    ('datetime', '2020-01-02 03:04:05.250', DATETIME.replace(microsecond=250000)),
+    ('datetime', '2020-01-02 03:04', DATETIME.replace(second=0)),
+    ('datetime', '2020-01-02', datetime.datetime(2020, 1, 2)),
+])
+def test_convert(convert, value, expected):
+    result = x2pyxl.SCHEMA_TYPES[convert](value)
+    assert result == expected
+    assert type(result) is type(expected)
+
+
+@pytest.mark.parametrize('convert, value', [
+    ('int', '1.5'),
+    ('int', 'x'),
+    ('float', None),
+    ('num', 'x'),
+    ('str', object()),
+    ('bool', 'yes'),
+    ('date', '2020/01/02'),
+    ('date', '2020-01-02 03:04:05'),
+    ('date', 12),
+    ('datetime', '02.01.2020'),
+    ('datetime', datetime.time(1, 2)),
+])
+def test_convert_failure(convert, value):
+    with pytest.raises((TypeError, ValueError)):
+        x2pyxl.SCHEMA_TYPES[convert](value)
+
+
+def test_schema_reports_failures(make_workbook, capture):
+    filepath = make_workbook('a.xlsx', [
+        ('id', 'when', 'name'),
+        ('1', '2020-01-02', 'a'),
+        ('x', 'soon', 'b'),
+        ('3', ' ', 'c'),
+        ('y', '2020-01-03', 'd'),
+    ])
+    ws, records = capture(x2pyxl.load_worksheet, filepath, 'Sheet1', 1,
+                          schema={'@id': 'int', '@when': 'date', '@name': 'str'})
+    assert [row.valx('@id') for row in ws['@id$2:@name']] == [1, 'x', 3, 'y']
+    assert [row.valx('@when') for row in ws['@id$2:@name']] == [
+        DATE, 'soon', ' ', datetime.date(2020, 1, 3)]
+    messages = sorted(
+        (context, lineno, msg.format(*args, **kwds))
+        for _, context, lineno, msg, args, kwds in records)
+    assert messages == [
+        ('a.xlsx#Sheet1', 3, "列A的值无法转换为int类型，共2处：A3='x', A5='y'"),
+        ('a.xlsx#Sheet1', 3, "列B的值无法转换为date类型，共1处：B3='soon'"),
+    ]
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+
+import pytest
+
+from xls2any import server
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='unix sockets only')
+
+
+@pytest.fixture
+def address(tmp_path):
+    return str(tmp_path / 'xls2any.sock')
+
+
+def start(address):
+    thread = threading.Thread(
+        target=server.serve, args=(lambda args, cwd: (0, repr(args), cwd), address))
+    thread.daemon = True
+    thread.start()
+    for _ in range(500):
+        if server.connect(address) is not None:
+            return thread
+        thread.join(0.01)
+    pytest.fail('server did not start')
+
+
+def test_round_trip(address):
+    thread = start(address)
+    try:
+        assert server.request(['a.j2'], '/tmp', address) == (0, "['a.j2']", '/tmp')
+    finally:
+        assert server.stop(address) == (0, '', '')
+        thread.join(5)
+    assert not os.path.exists(address + '.key')
+    assert server.request(['a.j2'], '/tmp', address) is None
+
+
+def test_ignores_readable_key(address):
+    thread = start(address)
+    try:
+        os.chmod(address + '.key', 0o644)
+        assert server.connect(address) is None
+        assert server.request(['a.j2'], '/tmp', address) is None
+        os.chmod(address + '.key', 0o600)
+    finally:
+        assert server.stop(address) == (0, '', '')
+        thread.join(5)
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid') or os.getuid() != 0, reason='needs chown')
+def test_ignores_foreign_files(address):
+    with open(address, 'wb'):
+        pass
+    os.chmod(address, 0o600)
+    fd = os.open(address + '.key', os.O_WRONLY | os.O_CREAT, 0o600)
+    os.write(fd, b'k' * server.AUTHKEY_SIZE)
+    os.close(fd)
+    assert server._read_key(address) == b'k' * server.AUTHKEY_SIZE
+    os.chown(address + '.key', 12345, -1)
+    assert server._read_key(address) is None
+    assert server.connect(address) is None
+    os.chown(address, 12345, -1)
+    with pytest.raises(SystemExit):
+        server.serve(lambda args, cwd: None, address)
+    assert os.path.exists(address)
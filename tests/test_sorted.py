@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from xls2any import utils
+from xls2any import x2pyxl
+
+ROWS = [('id', 'type', 'lvl')] + [
+    (i, 'abc'[i % 3], (i * 7) % 5) for i in range(1, 31)]
+
+
+@pytest.fixture
+def sheet(make_workbook):
+    return x2pyxl.load_worksheet(make_workbook('a.xlsx', ROWS), 'Sheet1', 1)
+
+
+@pytest.fixture
+def sorts(monkeypatch):
+    sizes = []
+    sort_rows = x2pyxl._sort_rows
+
+    def spy(rows, keys, asc=True):
+        rows = tuple(rows)
+        sizes.append(len(rows))
+        return sort_rows(rows, keys, asc)
+    monkeypatch.setattr(x2pyxl, '_sort_rows', spy)
+    return sizes
+
+
+def ids(rows):
+    return [row.valx('@id') for row in rows]
+
+
+def expected_ids(keys, asc=True):
+    rows = sorted(ROWS[1:], key=lambda row: tuple(row[ROWS[0].index(key[1:])] for key in keys),
+                  reverse=not asc)
+    return [row[0] for row in rows]
+
+
+@pytest.mark.parametrize('asc', [True, False])
+def test_prefix_reuse(sheet, sorts, asc):
+    by_type = sheet.sorted_by('@id$2:@lvl', '@type', asc=asc)
+    assert ids(by_type) == expected_ids(['@type'], asc)
+    assert sorts == [30]
+    by_type_lvl = sheet.sorted_by('@id$2:@lvl', '@type', '@lvl', asc=asc)
+    assert ids(by_type_lvl) == expected_ids(['@type', '@lvl'], asc)
+    # only the three runs of equal types are sorted again
+    assert sorts == [30, 10, 10, 10]
+    assert sheet.sorted_by('@id$2:@lvl', '@type', '@lvl', asc=asc) is not by_type_lvl
+    assert ids(sheet.sorted_by('@id$2:@lvl', '@type', '@lvl', asc=asc)) == ids(by_type_lvl)
+    assert len(sorts) == 4
+    # a different direction is not a prefix
+    sheet.sorted_by('@id$2:@lvl', '@type', '@lvl', '@id', asc=not asc)
+    assert sorts[4:] == [30]
+
+
+def test_prefix_reuse_is_counted(sheet):
+    utils.Stats.set_enabled(True)
+    try:
+        sheet.sorted_by('@id$2:@lvl', '@type')
+        sheet.sorted_by('@id$2:@lvl', '@type', '@lvl')
+        assert utils.Stats.counters()['sorted.prefix_reuses'] == 1
+    finally:
+        utils.Stats.set_enabled(False)
+        utils.Stats.reset()
+
+
+def test_sorted_findall(sheet):
+    view = sheet.sorted_by('@id$2:@lvl', '@type', '@lvl')
+    assert len(view) == 30
+    assert view.keys == ('@type', '@lvl') and view.asc
+    assert ids(view.findall('b')) == [i for i in expected_ids(['@type', '@lvl']) if i % 3 == 1]
+    assert ids(view.findall(('a', 0))) == [15, 30]
+    assert ids(view.findall(['a', 0], '@type', '@lvl')) == [15, 30]
+    assert ids(view.findall('z')) == []
+    assert view.findone(('c', 4)).valx('@id') == 2
+    with pytest.raises(ValueError):
+        view.findall(1, '@lvl')
+    with pytest.raises(ValueError):
+        view.findall(('a', 0), '@type')
+    with pytest.raises(ValueError):
+        view.findone(('c', 9))
+
+
+def test_sorted_findall_descending(sheet):
+    view = sheet.sorted_by('@id$2:@lvl', '@lvl', asc=False)
+    assert ids(view.findall(4)) == [2, 7, 12, 17, 22, 27]
+    assert ids(view.findall(9)) == []
+
+
+def test_groupby_reuses_sorted_view(sheet):
+    view = sheet.sorted_by('@id$2:@lvl', '@type')
+    utils.Stats.set_enabled(True)
+    try:
+        groups = [key.valx('@type') for key, _ in x2pyxl.xgroupby(view, '@type')]
+        assert 'groupby.sorts' not in utils.Stats.counters()
+        list(x2pyxl.xgroupby(view, '@lvl'))
+        assert utils.Stats.counters()['groupby.sorts'] == 1
+    finally:
+        utils.Stats.set_enabled(False)
+        utils.Stats.reset()
+    assert groups == ['a', 'b', 'c']
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+from xls2any import utils
+from xls2any import x2pyxl
+from xls2any.scripts import xls2any_
+
+TEMPLATE = (
+    "{% set ws = loadws('a.xlsx', 'Sheet1', 1) %}"
+    "{% for row in ws['@id$2:@id'] %}{{ row.valx('@id') }},{% endfor %}"
+    "{{ ws.findall(2, '@id$2:@id')[0].valx('@id') }}"
+)
+
+
+@pytest.fixture(autouse=True)
+def stats(monkeypatch):
+    yield utils.Stats
+    utils.Stats.set_enabled(False)
+    utils.Stats.reset()
+    utils.MemStats.set_limit(0)
+
+
+def test_counters_are_off_by_default(stats):
+    stats.add('rows.yielded', 3)
+    assert stats.counters() == {}
+    stats.set_enabled(True)
+    stats.add('rows.yielded', 3)
+    assert stats.counters() == {'rows.yielded': 3}
+
+
+def test_cache_skips_memory_check_without_limit(make_workbook, monkeypatch):
+    checks = []
+    monkeypatch.setattr(utils.MemStats, 'check', classmethod(lambda cls: checks.append(1)))
+    ws = x2pyxl.load_worksheet(make_workbook('a.xlsx', [('id',), (1,), (2,)]), 'Sheet1', 1)
+    ws.findall(1, '@id$2:@id')
+    list(ws.select('@id$2:@id'))
+    assert checks == []
+    utils.MemStats.set_limit(1 << 40)
+    ws.findall(2, '@id$3:@id')
+    list(ws.select('@id$3:@id'))
+    assert checks
+
+
+def test_stats_option(make_workbook, tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    make_workbook('a.xlsx', [('id',), (1,), (2,)])
+    template = tmp_path / 'a.j2'
+    template.write_text(TEMPLATE)
+    code, out, _ = xls2any_.serve_request(['--stats', 'stats.json', str(template)], str(tmp_path))
+    assert (code, out.strip()) == (0, '1,2,2')
+    counters = json.loads((tmp_path / 'stats.json').read_text())['counters']
+    # the loop and the index build each read both rows
+    assert counters['rows.yielded'] == 4
+    assert counters['index.builds'] == 1
+    assert counters['findall.lookups'] == 1
+    assert counters['sheets.loaded'] == 1
+    code, out, _ = xls2any_.serve_request([str(template)], str(tmp_path))
+    assert (code, out.strip()) == (0, '1,2,2')
+    assert utils.Stats.counters() == {}
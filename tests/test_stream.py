@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from xls2any import x2pyxl
+
+ROWS = [
+    ('title', None),
+    ('id', 'name'),
+    (1, 'a'),
+    (2, 'b'),
+    (2, 'c'),
+]
+
+
+def test_stream_head_iterate_and_chkuniq(make_workbook, capture):
+    filepath = make_workbook('stream.xlsx', ROWS)
+    ws = x2pyxl.load_worksheet(filepath, 'Sheet1', 2, stream=True)
+    assert isinstance(ws, x2pyxl.StreamSheetView)
+    assert [row.valx('@id') for row in ws['3:']] == [1, 2, 2]
+
+    ws = x2pyxl.load_worksheet(filepath, 'Sheet1', 2, stream=True)
+    assert [row.vidx for row in ws] == [1, 2, 3, 4, 5]
+
+    ws = x2pyxl.load_worksheet(filepath, 'Sheet1', 2, stream=True)
+    _, records = capture(ws.chkuniq, '@id$3:@id')
+    assert len(records) == 1
+    level, context, lineno, msg, args, kwds = records[0]
+    assert level == 'ERROR'
+    assert lineno == 5
+    assert args[3] == 5 and args[4] == 4
+
+
+def test_stream_rejects_going_back(make_workbook):
+    filepath = make_workbook('stream.xlsx', ROWS)
+    ws = x2pyxl.load_worksheet(filepath, 'Sheet1', 2, stream=True)
+    list(ws['3:'])
+    try:
+        list(ws['3:'])
+    except ValueError as exc:
+        assert '流式工作表只能向前读取' in str(exc)
+    else:
+        assert False, 'second pass over a stream should fail'
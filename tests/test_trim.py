@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import openpyxl
+import pytest
+from openpyxl.styles import Font
+
+from xls2any import x2pyxl
+
+
+@pytest.fixture
+def sparse_path(tmp_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Sheet1'
+    for row in [('id', 'name'), (1, 'a'), (2, 'b')]:
+        ws.append(row)
+    # formatted but empty cells stretch the declared dimension
+    ws['A5000'].font = Font(bold=True)
+    ws['CZ1'].font = Font(bold=True)
+    filepath = str(tmp_path / 'sparse.xlsx')
+    wb.save(filepath)
+    return filepath
+
+
+def ids(ws):
+    return [row.valx('@id') for row in ws['@id$2:@id']]
+
+
+@pytest.mark.parametrize('kwds', [{'engine': 'fast'}, {'trim': True}, {'columns': ['@id']}])
+def test_sparse_sheet_warns(sparse_path, capsys, kwds):
+    ws = x2pyxl.load_worksheet(sparse_path, 'Sheet1', 1, **kwds)
+    err = capsys.readouterr().err
+    assert 'WARN' in err
+    assert "'Sheet1'" in err and 'A1:B3' in err
+    if kwds.get('trim'):
+        assert ids(ws) == [1, 2]
+    else:
+        assert len(ids(ws)) == 4999
+
+
+def test_openpyxl_engine_does_not_warn(sparse_path, capsys):
+    ws = x2pyxl.load_worksheet(sparse_path, 'Sheet1', 1)
+    assert 'WARN' not in capsys.readouterr().err
+    assert len(ids(ws)) == 4999
+
+
+@pytest.mark.parametrize('engine', ['openpyxl', 'fast'])
+def test_trim_bounds(sparse_path, capsys, engine):
+    ws = x2pyxl.load_worksheet(sparse_path, 'Sheet1', 1, engine=engine, trim=True)
+    assert ids(ws) == [1, 2]
+    assert [row.valx('@name') for row in ws['@id$2:']] == ['a', 'b']
+    assert [len(row) for row in ws['2:']] == [2, 2]
+
+
+def test_dense_sheet_does_not_warn(make_workbook, capsys):
+    filepath = make_workbook('dense.xlsx', [('id',)] + [(i,) for i in range(10)])
+    x2pyxl.load_worksheet(filepath, 'Sheet1', 1, engine='fast', trim=True)
+    assert 'WARN' not in capsys.readouterr().err
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from xls2any import x2pyxl
+
+
+@pytest.fixture
+def workbooks(make_workbook):
+    return [
+        make_workbook('a.xlsx', [('id', 'lvl'), (1, 1), (2, 2)]),
+        make_workbook('b.xlsx', [('id', 'lvl'), (3, 9), (1, 3)]),
+    ]
+
+
+def test_union_iterates_all_files(workbooks):
+    pattern = os.path.join(os.path.dirname(workbooks[0]), '*.xlsx')
+    ws = x2pyxl.load_worksheets(pattern, 'Sheet1', 1)
+    assert str(ws) == 'a.xlsx等2个工作簿#Sheet1'
+    rows = list(ws['@id$2:@lvl'])
+    assert [row.valx('@id') for row in rows] == [1, 2, 3, 1]
+    assert [(str(row.sheet), row.vidx) for row in rows] == [
+        ('a.xlsx#Sheet1', 2), ('a.xlsx#Sheet1', 3), ('b.xlsx#Sheet1', 2), ('b.xlsx#Sheet1', 3)]
+    assert len(ws.findall(1, '@id$2:@id')) == 2
+
+
+def test_union_header_mismatch(workbooks, make_workbook):
+    other = make_workbook('c.xlsx', [('key', 'lvl'), (4, 4)])
+    with pytest.raises(ValueError) as excinfo:
+        x2pyxl.load_worksheets(workbooks + [other], 'Sheet1', 1, jobs=1)
+    assert 'c.xlsx#Sheet1' in str(excinfo.value)
+
+
+def test_union_chkuniq_reports_source(workbooks, capture):
+    ws = x2pyxl.load_worksheets(workbooks, 'Sheet1', 1, jobs=1)
+    for hashed in (False, True):
+        _, records = capture(ws.chkuniq, '@id$2:@id', hashed=hashed)
+        assert len(records) == 1
+        level, context, lineno, msg, args, kwds = records[0]
+        assert (context, lineno) == ('b.xlsx#Sheet1', 3)
+        assert args[3:] == ('b.xlsx#Sheet1:3', 'a.xlsx#Sheet1:2')
+
+
+def test_union_check_reports_source(workbooks, capture):
+    ws = x2pyxl.load_worksheets(workbooks, 'Sheet1', 1, jobs=1)
+    result, records = capture(ws.check, '@lvl', 'x < 5', '@id$2:@lvl')
+    assert result is False
+    assert len(records) == 1
+    _, context, lineno, _, args, _ = records[0]
+    assert (context, lineno) == ('b.xlsx#Sheet1', 2)
+    assert args == (1, 'B2=9')
+
+
+def test_union_chkref(workbooks, make_workbook, capture):
+    ws = x2pyxl.load_worksheets(workbooks, 'Sheet1', 1, jobs=1)
+    refs = x2pyxl.load_worksheet(make_workbook('r.xlsx', [('ref',), (3,), (5,)]), 'Sheet1', 1)
+    result, records = capture(refs.chkref, '@ref$2:@ref', '@ref', ws, '@id$2:@id', '@id')
+    assert result is False
+    assert records[0][4][-1] == '3=5'
+    result, records = capture(ws.chkref, '@id$2:@id', '@id', refs, '@ref$2:@ref', '@ref')
+    assert result is False
+    assert [(record[1], record[2]) for record in records] == [
+        ('a.xlsx#Sheet1', 2), ('b.xlsx#Sheet1', 3)]
+
+
+def test_union_rejects_row_numbers(workbooks):
+    ws = x2pyxl.load_worksheets(workbooks, 'Sheet1', 1, jobs=1)
+    with pytest.raises(ValueError):
+        ws.rowx(2)
+
+
+def test_union_has_no_length(workbooks):
+    ws = x2pyxl.load_worksheets(workbooks, 'Sheet1', 1, jobs=1)
+    assert len(ws.views) == 2
+    # a single sheet has no length either, rows are counted through a range
+    with pytest.raises(TypeError):
+        len(ws)
+    assert len(list(ws['@id$2:@id'])) == 4
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from xls2any import x2pyxl
+
+ROWS = [
+    ('id', 'type', 'level', 'tag'),
+    (1, 1, 5, 'a'),
+    (2, '2', 10, None),
+    (3, 3, 15, 'c'),
+    (4, ' 1 ', 20, ' '),
+    (5, 'x', 25, 'e'),
+]
+
+
+@pytest.fixture
+def sheet(make_workbook):
+    return x2pyxl.load_worksheet(make_workbook('a.xlsx', ROWS), 'Sheet1', 1)
+
+
+def where_ids(sheet, *conds):
+    return [row.valx('@id') for row in sheet.where('@id$2:@tag', *conds)]
+
+
+def filter_ids(sheet, test, key, *vals):
+    return [row.valx('@id') for row in sheet['@id$2:@tag'] if test(row.valx(key), *vals)]
+
+
+@pytest.mark.parametrize('name, vals, expected', [
+    ('xeq', (1,), [1, 4]),
+    ('xne', (1,), [2, 3, 5]),
+    ('xlt', ('2',), [1, 4]),
+    ('xge', (2,), [2, 3, 5]),
+    ('in', ([1, '2'],), [1, 2, 4]),
+    ('in', ((' 3', 'x ', 9),), [3, 5]),
+    ('in', ([],), []),
+])
+def test_where_tests(sheet, name, vals, expected):
+    assert where_ids(sheet, '@type', name, *vals) == expected
+    test = x2pyxl.WHERE_TESTS[name][0]
+    if name == 'in':
+        vals = (x2pyxl._xin_index(vals[0]),)
+    assert filter_ids(sheet, test, '@type', *vals) == expected
+
+
+def test_in_matches_xeq_scan(sheet):
+    values = [1, '1', 1.0, '2', 2, 'x', ' x ', None, '', 'TRUE', True, 3.5]
+    for val in values:
+        for row in sheet['@id$2:@tag']:
+            cell = row.valx('@type')
+            assert x2pyxl._xin(cell, x2pyxl._xin_index([val])) == x2pyxl.xeq_(cell, val)
+
+
+def test_where_combines_conditions(sheet):
+    assert where_ids(sheet, '@level', 'between', 10, 20) == [2, 3, 4]
+    assert where_ids(sheet, '@level', 'between', 10, 20, '@tag', 'required') == [3]
+    assert where_ids(sheet, '@type', 'in', [1, 3], '@level', 'xgt', 5) == [3, 4]
+
+
+def test_where_rejects_bad_conditions(sheet):
+    with pytest.raises(ValueError):
+        where_ids(sheet, '@type', 'in', '13')
+    with pytest.raises(ValueError):
+        where_ids(sheet, '@type', 'like', 1)
+    with pytest.raises(ValueError):
+        where_ids(sheet, '@type', 'between', 1)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import os
+import datetime
+
+import pytest
+
+from xls2any import utils
+from xls2any import x2pybin
+
+
+def roundtrip(obj):
+    return x2pybin.loads(x2pybin.dumps(obj))
+
+
+@pytest.fixture
+def output():
+    yield utils.Output
+    utils.Output.reset()
+    utils.Output.set_changed_only(False)
+
+
+@pytest.mark.parametrize('num', [0, 1, -1, 63, -64, 64, 127, 128, -129, 2 ** 31, -2 ** 63, 2 ** 70, -2 ** 70 - 1])
+def test_zigzag_varint(num):
+    assert x2pybin.unzigzag(x2pybin.zigzag(num)) == num
+    assert roundtrip(num) == num
+
+
+def test_small_ints_take_one_byte():
+    assert x2pybin.dumps(-64) == x2pybin.BIN_MAGIC + bytes([x2pybin.TAG_INT, 127])
+    assert len(x2pybin.dumps(64)) == len(x2pybin.BIN_MAGIC) + 3
+
+
+@pytest.mark.parametrize('num', [0.0, -1.5, 3.141592653589793, 1e300, float('inf')])
+def test_floats(num):
+    assert roundtrip(num) == num
+    assert type(roundtrip(num)) is float
+
+
+def test_scalars():
+    assert roundtrip(None) is None
+    assert roundtrip(True) is True
+    assert roundtrip(False) is False
+
+
+def test_string_table():
+    data = x2pybin.dumps(['怪物', 'abc', '怪物', 'abc'])
+    assert data.count('怪物'.encode('utf-8')) == 1
+    assert data.count(b'abc') == 1
+    assert x2pybin.loads(data) == ['怪物', 'abc', '怪物', 'abc']
+
+
+def test_nested_values():
+    obj = {'id': 1, 'drops': [{'item': 'x', 'prob': 0.5}, [1, [2, None]]], 3: 'three'}
+    assert roundtrip(obj) == obj
+    assert roundtrip((1, 2)) == [1, 2]
+
+
+def test_circular_values_are_dropped():
+    obj = [1]
+    obj.append(obj)
+    assert roundtrip(obj) == [1]
+
+
+def test_date_and_datetime_truncation():
+    assert roundtrip(datetime.date(2020, 2, 29)) == datetime.date(2020, 2, 29)
+    stamp = datetime.datetime(2020, 2, 29, 23, 59, 58, 999999)
+    assert roundtrip(stamp) == datetime.datetime(2020, 2, 29, 23, 59, 58)
+
+
+def test_unsupported_type():
+    with pytest.raises(TypeError):
+        x2pybin.dumps({1, 2})
+
+
+def test_bad_magic():
+    with pytest.raises(ValueError):
+        x2pybin.loads(b'XXXX\x00')
+
+
+def test_writer_stream(tmp_path, output):
+    filename = str(tmp_path / 'data.bin')
+    records = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'a'}, [datetime.date(2021, 1, 1), -7]]
+    with x2pybin.BinWriter(filename) as writer:
+        for record in records:
+            writer.write(record)
+    assert writer.closed
+    assert x2pybin.load(filename) == records
+    with open(filename, 'rb') as fp:
+        assert list(x2pybin.iter_loads(fp.read())) == records
+    assert output.results() == [(filename, True)]
+
+
+def test_writer_compress(tmp_path, output):
+    filename = str(tmp_path / 'data.bin.gz')
+    writer = x2pybin.BinWriter(filename)
+    writer.write('abc')
+    output.close()
+    assert writer.closed
+    with open(filename, 'rb') as fp:
+        assert fp.read(2) == x2pybin.GZIP_MAGIC
+    assert x2pybin.load(filename) == ['abc']
+
+
+def test_writer_write_if_changed(tmp_path, output):
+    filename = str(tmp_path / 'data.bin')
+    output.set_changed_only(True)
+    for expected in (True, False):
+        writer = x2pybin.BinWriter(filename)
+        writer.write([1, 2, 3])
+        output.close()
+        assert output.results()[-1] == (filename, expected)
+    assert x2pybin.load(filename) == [[1, 2, 3]]
+    assert [name for name in os.listdir(str(tmp_path))] == ['data.bin']
+
+
+def test_writer_discarded_on_abort(tmp_path, output):
+    filename = str(tmp_path / 'data.bin')
+    output.set_changed_only(True)
+    writer = x2pybin.BinWriter(filename)
+    writer.write(1)
+    output.close(commit=False)
+    assert writer.closed
+    assert os.listdir(str(tmp_path)) == []
+    with pytest.raises(ValueError):
+        writer.write(2)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import zipfile
+
+import openpyxl
+import pytest
+from openpyxl.utils.datetime import CALENDAR_MAC_1904
+
+from xls2any import xlsxfast
+
+SHEET_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<dimension ref="A1:D5"/><sheetData>'
+    '<row r="1">'
+    '<c r="A1" t="inlineStr"><is><t>line1\r\nline2\rline3&#13;end</t></is></c>'
+    '<c r="B1" t="inlineStr"><is><t>&lt;a&gt; &amp;amp; &quot;&apos; &#128;&#x9f;&#x20AC;</t></is></c>'
+    '<c r="C1" t="inlineStr"><is><r><t>rich </t></r><r><t>text</t></r></is></c>'
+    '</row>'
+    '<row r="2">'
+    '<c r="A2" t="str"><f>A1</f><v>a\r\nb &amp; c</v></c>'
+    '<c r="B2" t="b"><v>1</v></c>'
+    '<c r="D2"><v>1.5</v></c>'
+    '</row>'
+    '<row r="5"><c r="B5"><v>42</v></c></row>'
+    '</sheetData></worksheet>'
+)
+WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/></Relationships>'
+)
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" '
+    'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+
+def openpyxl_rows(filepath, sheetname='Sheet1'):
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        return normalize(wb[sheetname].iter_rows(values_only=True))
+    finally:
+        wb.close()
+
+
+def fast_rows(filepath, sheetname='Sheet1'):
+    ws = xlsxfast.open_worksheet(filepath, sheetname)
+    return normalize([cell.value for cell in row] for row in ws.iter_rows())
+
+
+def normalize(rows):
+    rows = [list(row) for row in rows]
+    for row in rows:
+        while row and row[-1] is None:
+            row.pop()
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+@pytest.fixture(params=['regex', 'tree'])
+def loader(request, monkeypatch):
+    if request.param == 'tree':
+        def fallback(*args, **kwds):
+            raise xlsxfast._FallbackError()
+        monkeypatch.setattr(xlsxfast.FastWorksheet, '_load_regex', fallback)
+    return request.param
+
+
+@pytest.mark.parametrize('epoch', [None, CALENDAR_MAC_1904])
+def test_matches_openpyxl(tmp_path, loader, epoch):
+    wb = openpyxl.Workbook()
+    if epoch is not None:
+        wb.epoch = epoch
+    ws = wb.active
+    ws.title = 'Sheet1'
+    ws.append(['id', 'name', 'when', 'time', 'flag'])
+    ws.append([1, 'a & b <c>', datetime.datetime(2020, 1, 2, 3, 4, 5), datetime.time(8, 30), True])
+    ws.append([2.5, 'line1\r\nline2\rline3', datetime.datetime(1900, 1, 1), None, False])
+    ws.append([3, '中文\t"quoted"', datetime.date(2021, 12, 31), datetime.time(0, 0, 1)])
+    ws['H2000'] = 'sparse'
+    ws['C2001'] = -7
+    filepath = str(tmp_path / 'a.xlsx')
+    wb.save(filepath)
+    expected = openpyxl_rows(filepath)
+    assert expected[2][1] == 'line1\nline2\nline3'
+    assert fast_rows(filepath) == expected
+
+
+def test_inline_strings_match_openpyxl(tmp_path, loader):
+    filepath = str(tmp_path / 'inline.xlsx')
+    with zipfile.ZipFile(filepath, 'w') as archive:
+        archive.writestr('[Content_Types].xml', CONTENT_TYPES)
+        archive.writestr('_rels/.rels', ROOT_RELS)
+        archive.writestr('xl/workbook.xml', WORKBOOK_XML)
+        archive.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS)
+        archive.writestr('xl/worksheets/sheet1.xml', SHEET_XML)
+    expected = openpyxl_rows(filepath)
+    assert expected[0][0] == 'line1\nline2\nline3\rend'
+    assert expected[0][1] == '<a> &amp; "\' \x80\x9f€'
+    assert fast_rows(filepath) == expected
+
+
+def test_unescape():
+    assert xlsxfast._unescape('a\r\nb\rc&#13;') == 'a\nb\nc\r'
+    assert xlsxfast._unescape('&#128;&#x80;') == '\x80\x80'
+    assert xlsxfast._unescape('&amp;lt;') == '&lt;'
+    with pytest.raises(xlsxfast._FallbackError):
+        xlsxfast._unescape('&nbsp;')
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+import multiprocessing
+
+import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+from jinja2.loaders import split_template_path
+
+from . import utils
+from . import x2pyxl
+from . import __version__
+
+Ctx = utils.Ctx
+
+PFOR_MIN_ROWS = 64
+FRAGMENT_CONSTS = (str, int, float, bool, type(None))
+
+_PFOR_JOB = None
+
+
+def _split_bounds(total, chunks):
+    size, rest = divmod(total, chunks)
+    bounds = []
+    start = 0
+    for i in range(chunks):
+        stop = start + size + (1 if i < rest else 0)
+        if stop > start:
+            bounds.append((start, stop))
+        start = stop
+    return bounds
+
+
+def _render_rows(items, caller):
+    buf = []
+    for item in items:
+        if isinstance(item, x2pyxl.XlRowView):
+            Ctx.set_ctx(item.sheet, item.vidx)
+        buf.append(caller(item))
+    return ''.join(buf)
+
+
+def _render_chunk(bounds):
+    items, caller = _PFOR_JOB
+    start, stop = bounds
+    counters = utils.Stats.counters()
+    Ctx.start_capture()
+    try:
+        text = _render_rows(items[start:stop], caller)
+    except utils.AbortError:
+        return False, None, Ctx.stop_capture(), utils.Stats.since(counters)
+    except Exception:
+        exc_msg = utils.get_pyexc_msg()
+        Ctx.error('并行循环渲染失败 => {0}', exc_msg)
+        return False, exc_msg, Ctx.stop_capture(), utils.Stats.since(counters)
+    return True, text, Ctx.stop_capture(), utils.Stats.since(counters)
+
+
+def _fork_context():
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        return None
+
+
+def render_parallel(items, caller, chunks=None):
+    global _PFOR_JOB
+    items = list(items)
+    chunks = chunks or os.cpu_count() or 1
+    if not isinstance(chunks, int) or chunks <= 0:
+        Ctx.throw('并行循环的分块数必须是正整数：{0!r}', chunks)
+    chunks = min(chunks, len(items) // PFOR_MIN_ROWS)
+    mp_context = _fork_context()
+    if chunks <= 1 or mp_context is None:
+        return _render_rows(items, caller)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    utils.Output.drain()
+    _PFOR_JOB = (items, caller)
+    try:
+        jobs = min(chunks, os.cpu_count() or 1)
+        with mp_context.Pool(jobs) as pool:
+            results = pool.map(_render_chunk, _split_bounds(len(items), chunks))
+    finally:
+        _PFOR_JOB = None
+
+    buf = []
+    for success, text, records, counters in results:
+        utils.Stats.merge(counters)
+        Ctx.replay(records)
+        if not success:
+            Ctx.throw('并行循环渲染失败 => {0}', text, exc_tp=RuntimeError)
+        buf.append(text)
+    return ''.join(buf)
+
+
+class PforExtension(Extension):
+    tags = {'pfor'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        target = parser.parse_assign_target(
+            name_only=True, extra_end_rules=('name:in',))
+        target.set_ctx('param')
+        parser.stream.expect('name:in')
+        iterable = parser.parse_tuple(
+            with_condexpr=False, extra_end_rules=('name:chunks',))
+        chunks = nodes.Const(None)
+        if parser.stream.skip_if('name:chunks'):
+            parser.stream.expect('assign')
+            chunks = parser.parse_expression()
+        body = parser.parse_statements(('name:endpfor',), drop_needle=True)
+        call = self.call_method('_render', [iterable, chunks])
+        return nodes.CallBlock(call, [target], [], body).set_lineno(lineno)
+
+    def _render(self, iterable, chunks, caller):
+        return render_parallel(iterable, caller, chunks)
+
+
+def default_fragment_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') \
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'xls2any', 'fragments')
+
+
+def fragment_fingerprint(value):
+    if isinstance(value, x2pyxl.SheetView):
+        return value.fingerprint()
+    if isinstance(value, tuple) and len(value) == 2 \
+            and isinstance(value[0], x2pyxl.SheetView):
+        return value[0].fingerprint(value[1])
+    if not isinstance(value, FRAGMENT_CONSTS):
+        Ctx.throw('缓存块的参数只能是工作表、(工作表, 范围)或常量：{0!r}', value)
+    return repr(value)
+
+
+def _load_fragment(filename):
+    # unpickling a stale or foreign file can fail in any way, all of them
+    # just mean the block is rendered again
+    try:
+        with open(filename, 'rb') as fp:
+            fragment = pickle.load(fp)
+    except Exception:
+        return None
+    if not isinstance(fragment, tuple) or len(fragment) != 2 \
+            or not isinstance(fragment[0], str):
+        return None
+    return fragment
+
+
+def _dump_fragment(filename, text, records):
+    dirname = os.path.dirname(filename)
+    tmpname = None
+    try:
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            pickle.dump((text, records), fp, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, filename)
+        tmpname = None
+    except Exception:
+        # message arguments may not be picklable
+        Ctx.warn('无法写入缓存块：{0}', filename)
+    finally:
+        if tmpname is not None:
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
+
+
+class CacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super(CacheExtension, self).__init__(environment)
+        environment.extend(fragment_cache_dir=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        # the dumped nodes stand for the block source
+        source = hashlib.sha1(repr(body).encode('utf-8')).hexdigest()
+        call = self.call_method('_render', [nodes.Const(source), nodes.List(args)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, source, args, caller):
+        name = args[0]
+        if not isinstance(name, str):
+            Ctx.throw('缓存块的名称必须是字符串：{0!r}', name)
+        digest = hashlib.sha1(repr((__version__, name, source)).encode('utf-8'))
+        for arg in args[1:]:
+            digest.update(fragment_fingerprint(arg).encode('utf-8'))
+        cache_dir = self.environment.fragment_cache_dir or default_fragment_dir()
+        filename = os.path.join(cache_dir, digest.hexdigest() + '.pickle')
+
+        fragment = _load_fragment(filename)
+        if fragment is not None:
+            utils.Stats.add('cache.fragments.hits')
+            text, records = fragment
+            Ctx.replay(records)
+            return text
+        utils.Stats.add('cache.fragments.misses')
+        outer = Ctx.start_capture()
+        try:
+            text = caller()
+        finally:
+            records = Ctx.stop_capture(outer)
+            Ctx.replay(records)
+        _dump_fragment(filename, text, records)
+        return text
+
+
+class TemplateLoader(jinja2.BaseLoader):
+
+    def __init__(self, searchpath):
+        self.searchpath = list(searchpath)
+        self.loaded = set()
+
+    def get_source(self, environment, template):
+        pieces = split_template_path(template)
+        for searchpath in self.searchpath:
+            filename = os.path.join(searchpath, *pieces)
+            if os.path.isfile(filename):
+                break
+        else:
+            raise jinja2.TemplateNotFound(template)
+        with open(filename, 'rb') as fp:
+            data = fp.read()
+        source = data.decode(utils.detect_encoding(data), errors='ignore')
+        mtime = os.path.getmtime(filename)
+        self.loaded.add(filename)
+
+        def uptodate():
+            try:
+                return os.path.getmtime(filename) == mtime
+            except OSError:
+                return False
+        return source, filename, uptodate
+
+
+class MemoryBytecodeCache(jinja2.BytecodeCache):
+
+    def __init__(self, fallback=None):
+        self._codes = {}
+        self._fallback = fallback
+
+    def load_bytecode(self, bucket):
+        entry = self._codes.get(bucket.key)
+        if entry is not None and entry[0] == bucket.checksum:
+            bucket.code = entry[1]
+            return
+        if self._fallback is not None:
+            self._fallback.load_bytecode(bucket)
+            if bucket.code is not None:
+                self._codes[bucket.key] = (bucket.checksum, bucket.code)
+
+    def dump_bytecode(self, bucket):
+        self._codes[bucket.key] = (bucket.checksum, bucket.code)
+        if self._fallback is not None:
+            self._fallback.dump_bytecode(bucket)
+
+    def clear(self):
+        self._codes.clear()
+        if self._fallback is not None:
+            self._fallback.clear()
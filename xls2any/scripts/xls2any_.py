@@ -1,44 +1,47 @@
 # -*- coding: utf-8 -*-
 
-import io
 import os
 import re
 import sys
+import io
 import json
+import base64
 import functools
 import traceback
+import collections
 
 import click
 import jinja2
+from jinja2 import nodes
 from jinja2 import filters
 from jinja2 import defaults
 
+from .. import j2ext
+from .. import server
 from .. import utils
+from .. import x2pybin
 from .. import x2pylua
 from .. import x2pyxl
 
 Ctx = utils.Ctx
 
 
-VARX_REGEX = re.compile(r'\bx\b')
+CHECK_GLOBALS = {'__builtins__': utils.CHECK_BUILTINS}
 
 
-def get_pyexc_msg():
-    exc_type, exc_value, exc_tb = sys.exc_info()
-    del exc_tb
-    exc_msg = traceback.format_exception_only(exc_type, exc_value)[0]
-    return exc_msg.strip()
+class CheckScope(object):
 
+    def __init__(self, ctx, value):
+        self._ctx = ctx
+        self._value = value
 
-def expand_check_expr(expr, value):
-    cur = 0
-    buf = io.StringIO()
-    for match in VARX_REGEX.finditer(expr):
-        buf.write(expr[cur:match.start()])
-        buf.write(str(value))
-        cur = match.end()
-    buf.write(expr[cur:])
-    return buf.getvalue()
+    def __getitem__(self, key):
+        if key == 'x':
+            return self._value
+        rval = self._ctx.resolve(key)
+        if isinstance(rval, jinja2.Undefined):
+            raise KeyError(key)
+        return rval
 
 
 def ignore_return(func):
@@ -62,7 +65,22 @@ def do_num(value, default=0):
         return default
 
 
-def do_json(value, indent=None, closed=True):
+def dedupe_json(value):
+    graph = utils.DedupeGraph()
+    root = graph.add(value)
+    shared = graph.shared(root)
+    if not shared:
+        return value
+    refs = {nid: {'$ref': i} for i, nid in enumerate(shared)}
+    return {
+        '$refs': [graph.materialize(nid, refs) for nid in shared],
+        '$value': graph.materialize(root, refs),
+    }
+
+
+def do_json(value, indent=None, closed=True, dedupe=False):
+    if dedupe:
+        value = dedupe_json(value)
     options = {}
     options['sort_keys'] = True
     options['ensure_ascii'] = False
@@ -73,11 +91,16 @@ def do_json(value, indent=None, closed=True):
     output = json.dumps(value, **options)
     if output and not closed and (output[0]+output[-1]) in {'{}','[]'}:
         output = output[1:-1].strip()
+    utils.Stats.add('json.chars', len(output))
     return output
 
 
-def do_lua(value, indent=None, closed=True):
+def do_lua(value, indent=None, closed=True, dedupe=False):
+    # deduped output is a function expression, there are no braces to strip
+    if dedupe and not closed:
+        Ctx.throw('lua 过滤器的 dedupe=True 不能与 closed=False 同时使用')
     options = {}
+    options['dedupe'] = dedupe
     if indent is not None:
         options['indent'] = indent
     else:
@@ -85,28 +108,39 @@ def do_lua(value, indent=None, closed=True):
     output = x2pylua.dumps(value, **options)
     if output and not closed and (output[0]+output[-1]) in {'{}'}:
         output = output[1:-1].strip()
+    utils.Stats.add('lua.chars', len(output))
     return output
 
 
+def do_lua_module(value, indent=None, hoist=2, chunk_size=4096):
+    options = {}
+    if indent is not None:
+        options['indent'] = indent
+    else:
+        options['separators'] = (',', '=')
+    output = x2pylua.dumps_module(value, hoist=hoist, chunk_size=chunk_size, **options)
+    utils.Stats.add('lua.chars', len(output))
+    return output
+
+
+def do_bin(value):
+    return base64.b64encode(x2pybin.dumps(value)).decode('ascii')
+
+
 @filters.contextfilter
 def do_check(ctx, value, expr, msg=None):
-    global_ = ctx.get_exported()
-    global_['__builtins__'] = dict(
-        abs=abs, all=all, any=any, bin=bin, bool=bool, chr=chr,
-        divmod=divmod, float=float, hex=hex, int=int, len=len, max=max,
-        min=min, oct=oct, ord=ord, round=round, str=str, sum=sum,
-    )
     try:
-        rval = eval(expr, global_, {'x': value})
+        code = utils.compile_check_expr(expr)
+        rval = eval(code, CHECK_GLOBALS, CheckScope(ctx, value))
     except Exception:
-        msg1 = '校验表达式异常 {0} -- ' + get_pyexc_msg()
+        msg1 = '校验表达式异常 {0} -- ' + utils.get_pyexc_msg()
     else:
         if not rval:
             msg1 = msg or '数值校验不通过 {0}'
         else:
             msg1 = None
     if msg1:
-        Ctx.error(msg1, repr(expand_check_expr(expr, value)))
+        Ctx.error(msg1, repr(utils.expand_check_expr(expr, value)))
     return value
 
 
@@ -164,6 +198,7 @@ def do_tabs(num=1):
 FILTERS = {
     'abs':          defaults.DEFAULT_FILTERS['abs'],
     'b':            do_bool,
+    'bin':          do_bin,
     'bool':         do_bool,
     'check':        do_check,
     'choice':       defaults.DEFAULT_FILTERS['random'],
@@ -183,6 +218,7 @@ FILTERS = {
     'list':         defaults.DEFAULT_FILTERS['list'],
     'lower':        defaults.DEFAULT_FILTERS['lower'],
     'lua':          do_lua,
+    'lua_module':   do_lua_module,
     'max':          defaults.DEFAULT_FILTERS['max'],
     'min':          defaults.DEFAULT_FILTERS['min'],
     'n':            do_num,
@@ -212,12 +248,14 @@ TESTS.update({
 })
 GLOBALS = {
     'abort':        Ctx.abort,
+    'binout':       x2pybin.BinWriter,
     'cycler':       defaults.DEFAULT_NAMESPACE['cycler'],
     'debug':        Ctx.debug,
     'dict':         defaults.DEFAULT_NAMESPACE['dict'],
     'error':        Ctx.error,
     'joiner':       defaults.DEFAULT_NAMESPACE['joiner'],
     'loadws':       x2pyxl.load_worksheet,
+    'loadws_many':  x2pyxl.load_worksheets,
     'namespace':    defaults.DEFAULT_NAMESPACE['namespace'],
     'output':       ignore_return(utils.open_as_stdout),
     'range':        defaults.DEFAULT_NAMESPACE['range'],
@@ -227,14 +265,219 @@ GLOBALS = {
 }
 
 
-def get_j2exc_lineno():
+def find_loadws_calls(j2ast):
+    for call in j2ast.find_all(nodes.Call):
+        if not isinstance(call.node, nodes.Name) or call.node.name != 'loadws':
+            continue
+        args = call.args[:4]
+        if len(args) < 2 or not all(isinstance(arg, nodes.Const) for arg in args):
+            continue
+        engine = args[3].value if len(args) > 3 else 'openpyxl'
+        options = dict(zip(('columns', 'schema', 'trim', 'stream'), call.args[4:8]))
+        for kwarg in call.kwargs:
+            if kwarg.key == 'engine' and isinstance(kwarg.value, nodes.Const):
+                engine = kwarg.value.value
+            elif kwarg.key in ('columns', 'stream'):
+                options[kwarg.key] = kwarg.value
+        # streamed sheets are read lazily and projected sheets read only
+        # their own columns, a preloaded full sheet would be of no use
+        if any(not isinstance(options[key], nodes.Const) or options[key].value
+               for key in ('columns', 'stream') if key in options):
+            continue
+        yield args[0].value, args[1].value, engine
+
+
+COLUMN_ARG_METHODS = {
+    'valx':     (0,),
+    'hidx':     (0,),
+    'expr':     (0,),
+    'exprcol':  (0,),
+    'exprrow':  (0,),
+    'exproff':  (0,),
+    'check':    (0, 2),
+    'chkuniq':  (0,),
+    'chkref':   (1, 4),
+    'vlookup':  (1,),
+}
+COLUMN_VARARG_METHODS = {
+    'findall':      1,
+    'findone':      1,
+    'records':      1,
+    'sorted_by':    1,
+}
+GROUP_METHODS = {'cut', 'slc'}
+
+
+def _const_args(call):
+    if not all(isinstance(arg, nodes.Const) for arg in call.args):
+        return None
+    return [arg.value for arg in call.args]
+
+
+def _is_group_node(node, group_names):
+    while isinstance(node, nodes.Filter):
+        node = node.node
+    if isinstance(node, nodes.Name):
+        return node.name in group_names
+    return isinstance(node, nodes.Call) \
+        and isinstance(node.node, nodes.Getattr) \
+        and node.node.attr in GROUP_METHODS
+
+
+TEMPLATE_REF_NODES = (nodes.Include, nodes.Import, nodes.FromImport, nodes.Extends)
+
+
+def infer_used_columns(j2ast):
+    # columns used by other templates are unknown here
+    if any(True for _ in j2ast.find_all(TEMPLATE_REF_NODES)):
+        return None
+    group_names = set()
+    for loop in j2ast.find_all(nodes.For):
+        if _is_group_node(loop.iter, set()) and isinstance(loop.target, nodes.Name):
+            group_names.add(loop.target.name)
+
+    columns = []
+    for node in j2ast.find_all((nodes.Getitem, nodes.Call, nodes.Filter)):
+        if isinstance(node, nodes.Getitem):
+            if isinstance(node.arg, nodes.Const) and isinstance(node.arg.value, str):
+                # row ranges on sheets only select rows, cells are read later
+                if x2pyxl.RANGE_SEP not in node.arg.value \
+                        and not x2pyxl.VINDEX_REGEX.match(node.arg.value.strip()):
+                    columns.append(node.arg.value)
+            elif not _is_group_node(node.node, group_names):
+                return None
+        elif isinstance(node, nodes.Filter):
+            if node.name not in ('xgroupby', 'xrequire'):
+                continue
+            args = _const_args(node)
+            if args is None:
+                return None
+            if any(not isinstance(arg, str) for arg in args) \
+                    and not _is_group_node(node.node, group_names):
+                return None
+            columns.extend(arg for arg in args if isinstance(arg, str))
+        elif isinstance(node.node, nodes.Getattr):
+            attr = node.node.attr
+            if attr in COLUMN_ARG_METHODS:
+                for idx in COLUMN_ARG_METHODS[attr]:
+                    if idx >= len(node.args):
+                        continue
+                    arg = node.args[idx]
+                    if not isinstance(arg, nodes.Const):
+                        return None
+                    if isinstance(arg.value, str):
+                        columns.append(arg.value)
+            elif attr in COLUMN_VARARG_METHODS:
+                args = node.args[COLUMN_VARARG_METHODS[attr]:]
+                if node.dyn_args is not None or not all(
+                        isinstance(arg, nodes.Const) and isinstance(arg.value, str)
+                        for arg in args):
+                    return None
+                columns.extend(arg.value for arg in args)
+            elif attr == 'where':
+                args = node.args[1:]
+                while args:
+                    if node.dyn_args is not None or len(args) < 2 \
+                            or not isinstance(args[0], nodes.Const) \
+                            or not isinstance(args[1], nodes.Const) \
+                            or args[1].value not in x2pyxl.WHERE_TESTS:
+                        return None
+                    if not isinstance(args[0].value, str):
+                        return None
+                    columns.append(args[0].value)
+                    args = args[2 + x2pyxl.WHERE_TESTS[args[1].value][1]:]
+            elif attr in GROUP_METHODS:
+                args = _const_args(node)
+                if not args or not isinstance(args[0], str):
+                    return None
+                size = args[1] if len(args) > 1 else 1
+                num = args[2] if len(args) > 2 else (1 if attr == 'cut' else 0)
+                columns.append((args[0], size * max(num, 1)))
+            elif attr in ('vals', 'aslist', 'asdict', 'keys', 'locate'):
+                if attr == 'vals' and node.args:
+                    args = _const_args(node)
+                    if args is None or not all(isinstance(arg, str) for arg in args):
+                        return None
+                    columns.extend(args)
+                elif not _is_group_node(node.node.node, group_names):
+                    return None
+    return columns
+
+
+def load_manifest(manifest):
+    try:
+        entries = json.load(manifest)
+    except ValueError:
+        Ctx.abort('无法解析预加载清单：{0}', manifest.name)
+    for entry in entries:
+        if isinstance(entry, dict):
+            entry = [entry.get('file'), entry.get('sheet'), entry.get('engine', 'openpyxl')]
+        elif isinstance(entry, (list, tuple)) and len(entry) == 2:
+            entry = list(entry) + ['openpyxl']
+        if not isinstance(entry, (list, tuple)) or len(entry) != 3 \
+                or not all(isinstance(x, str) for x in entry):
+            Ctx.abort('错误的预加载清单项：{0!r}', entry)
+        yield tuple(entry)
+
+
+def get_j2exc_location(template_files=()):
     exc_tb = sys.exc_info()[2]
     stacks = traceback.extract_tb(exc_tb)
     exc_tb = None
     for frame in reversed(stacks):
         if frame[0] in {'<template>', '<unknown>'}:
-            return frame[1]
-    return 1
+            return None, frame[1]
+        if frame[0] in template_files:
+            return os.path.basename(frame[0]), frame[1]
+    return None, 1
+
+
+def report_outputs():
+    Ctx.set_ctx(None, None)
+    results = utils.Output.results()
+    for filename, changed in results:
+        Ctx.info('输出 {0}：{1}', filename, '已更新' if changed else '内容未变化')
+    Ctx.info('输出 共{0}个文件已更新，{1}个文件内容未变化',
+             sum(1 for _, changed in results if changed),
+             sum(1 for _, changed in results if not changed))
+
+
+def report_memory(output_size):
+    Ctx.set_ctx(None, None)
+    for phase, peak, current in utils.MemStats.phases():
+        Ctx.info('内存 阶段{0}：峰值{1}，当前{2}',
+                 phase, utils.format_size(peak), utils.format_size(current))
+    Ctx.info('内存 渲染结果：{0}个字符', output_size)
+    if utils.MemStats.drops():
+        Ctx.info('内存 超过软上限而清除缓存：{0}次', utils.MemStats.drops())
+    namespaces = collections.OrderedDict()
+    for name, cells, caches in x2pyxl.memory_report():
+        Ctx.info('内存 工作表{0}：单元格{1}，缓存{2}', name, utils.format_size(cells),
+                 '，'.join('{0}({1}项){2}'.format(key, count, utils.format_size(size))
+                          for key, (count, size) in caches.items()) or '无')
+        for key, (count, size) in caches.items():
+            total = namespaces.get(key, (0, 0))
+            namespaces[key] = (total[0] + count, total[1] + size)
+    for key, (count, size) in namespaces.items():
+        Ctx.info('内存 缓存{0}：{1}项，{2}', key, count, utils.format_size(size))
+
+
+def mark_phase(filename, phase):
+    utils.MemStats.mark(phase)
+    utils.Stats.mark(phase, filename)
+
+
+def write_stats(filename):
+    report = utils.Stats.report()
+    report['outputs'] = [
+        collections.OrderedDict([('file', name), ('changed', changed)])
+        for name, changed in utils.Output.results()
+    ]
+    try:
+        with open(filename, 'w', encoding='utf-8') as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=2)
+    except IOError:
+        Ctx.abort('无法写入统计文件：{0}', filename)
 
 
 def print_version(ctx, param, value):
@@ -248,45 +491,216 @@ def print_version(ctx, param, value):
     ctx.exit()
 
 
-@click.command()
-@click.argument('template', type=click.File('rb'))
-@click.option('--debug', is_flag=True)
-@click.option('--verbose', is_flag=True)
-@click.option('--version', is_flag=True, callback=print_version, expose_value=False, is_eager=True)
-def main(template, debug, verbose):
-    Ctx.set_debug(debug)
-    if verbose:
-        @Ctx.set_abort_handler
-        def _at_abort():
-            Ctx.error(traceback.format_exc())
-            sys.exit(1)
+ENVIRONMENTS = None
+COMPILED_TEMPLATES = None
+COMPILED_TEMPLATES_MAX = 64
 
-    os.chdir(os.path.dirname(os.path.abspath(template.name)))
 
-    j2data = template.read()
-    encoding = utils.detect_encoding(j2data)
-    try:
-        j2txt = j2data.decode(encoding, errors="ignore")
-    except (LookupError, TypeError):
-        Ctx.set_ctx(os.path.basename(template.name), 1)
-        Ctx.abort('无法识别模板文件的文件编码')
+def keep_compiled(flag=True, maxsize=COMPILED_TEMPLATES_MAX):
+    global ENVIRONMENTS, COMPILED_TEMPLATES
+    ENVIRONMENTS = {} if flag else None
+    # every edit of a template is a new key, old texts must age out
+    COMPILED_TEMPLATES = utils.LRUCache(maxsize) if flag else None
+
+
+def get_environment(cache_dir=None):
+    if ENVIRONMENTS is None:
+        return create_environment(cache_dir)
+    j2env = ENVIRONMENTS.get(cache_dir)
+    if j2env is None:
+        j2env = ENVIRONMENTS[cache_dir] = create_environment(cache_dir)
+    return j2env
 
+
+def compile_template(j2env, j2txt):
+    cache_key = (id(j2env), j2txt)
+    compiled = COMPILED_TEMPLATES.get(cache_key) if COMPILED_TEMPLATES is not None else None
+    if compiled is not None:
+        utils.Stats.add('templates.reused')
+        return compiled
+    j2ast = j2env.parse(j2txt)
+    compiled = j2ast, j2env.from_string(j2ast)
+    if COMPILED_TEMPLATES is not None:
+        COMPILED_TEMPLATES[cache_key] = compiled
+    return compiled
+
+
+def create_environment(cache_dir=None):
+    fallback = jinja2.FileSystemBytecodeCache(cache_dir) if cache_dir else None
     j2env = jinja2.Environment(
         extensions=[
             'jinja2.ext.do',
             'jinja2.ext.loopcontrols',
+            j2ext.PforExtension,
+            j2ext.CacheExtension,
         ],
+        bytecode_cache=j2ext.MemoryBytecodeCache(fallback),
     )
+    if cache_dir:
+        j2env.fragment_cache_dir = os.path.join(cache_dir, 'fragments')
     j2env.filters.clear()
     j2env.filters.update(FILTERS)
     j2env.tests.clear()
     j2env.tests.update(TESTS)
     j2env.globals.clear()
     j2env.globals.update(GLOBALS)
+    return j2env
+
+
+def render_template(j2env, template, filepath, search_path=(),
+                    prefetch=False, manifest=(), jobs=None):
+    filename = os.path.basename(filepath)
+    os.chdir(os.path.dirname(filepath))
+
+    j2data = template.read()
+    encoding = utils.detect_encoding(j2data)
     try:
-        j2res = j2env.from_string(j2txt).render()
+        j2txt = j2data.decode(encoding, errors="ignore")
+    except (LookupError, TypeError):
+        Ctx.set_ctx(filename, 1)
+        Ctx.abort('无法识别模板文件的文件编码')
+
+    utils.Stats.start()
+    j2loader = j2ext.TemplateLoader([os.path.dirname(filepath)] + list(search_path))
+    j2env.loader = j2loader
+    output_size = 0
+    try:
+        j2ast, j2tpl = compile_template(j2env, j2txt)
+        x2pyxl.set_auto_columns(infer_used_columns(j2ast))
+        Ctx.debug('模板使用的列：{0!r}', x2pyxl.AUTO_COLUMNS)
+        mark_phase(filename, 'parse')
+        if prefetch or manifest:
+            entries = list(manifest)
+            if prefetch:
+                entries.extend(find_loadws_calls(j2ast))
+            x2pyxl.preload_worksheets(entries, jobs=jobs)
+            mark_phase(filename, 'prefetch')
+        for chunk in j2tpl.generate():
+            output_size += len(chunk)
+            utils.Output.write(chunk)
+        utils.Output.write('\n')
+        utils.Stats.add('output.chars', output_size + 1)
+        mark_phase(filename, 'render')
+        utils.Output.close()
+        mark_phase(filename, 'output')
     except Exception:
-        Ctx.set_ctx(os.path.basename(template.name), get_j2exc_lineno())
-        Ctx.abort('处理模板文件时发生错误 => {0}', get_pyexc_msg())
-    else:
-        print(j2res, file=sys.stdout, flush=True)
+        exc_file, exc_line = get_j2exc_location(j2loader.loaded)
+        Ctx.set_ctx(exc_file or filename, exc_line)
+        Ctx.abort('处理模板文件时发生错误 => {0}', utils.get_pyexc_msg())
+    finally:
+        utils.Output.close(commit=False)
+    return output_size
+
+
+@click.command()
+@click.argument('templates', nargs=-1, required=True, type=click.File('rb'))
+@click.option('--debug', is_flag=True)
+@click.option('--verbose', is_flag=True)
+@click.option('--errors', type=click.Choice(Ctx.ERROR_MODES), default='stream')
+@click.option('--max-errors', type=int, default=0)
+@click.option('--prefetch', is_flag=True)
+@click.option('--manifest', type=click.File('r', encoding='utf-8'))
+@click.option('--jobs', type=int, default=None)
+@click.option('--mem-limit', type=int, default=0)
+@click.option('--write-if-changed', is_flag=True)
+@click.option('--search-path', multiple=True, type=click.Path(exists=True, file_okay=False))
+@click.option('--cache-dir', type=click.Path(file_okay=False))
+@click.option('--stats', type=click.Path(dir_okay=False))
+@click.option('--no-server', is_flag=True, expose_value=False)
+@click.option('--version', is_flag=True, callback=print_version, expose_value=False, is_eager=True)
+def render(templates, debug, verbose, errors, max_errors, prefetch, manifest, jobs, mem_limit,
+         write_if_changed, search_path, cache_dir, stats):
+    Ctx.set_debug(debug)
+    Ctx.set_error_mode(errors, max_errors)
+    utils.MemStats.set_limit(mem_limit * 1024 * 1024)
+    utils.Stats.set_enabled(stats)
+    utils.Output.set_changed_only(write_if_changed)
+    if verbose:
+        @Ctx.set_abort_handler
+        def _at_abort():
+            Ctx.error(traceback.format_exc())
+            Ctx.flush()
+            sys.exit(1)
+
+    search_path = [os.path.abspath(path) for path in search_path]
+    filepaths = [os.path.abspath(template.name) for template in templates]
+    if cache_dir:
+        cache_dir = os.path.abspath(cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+    manifest = list(load_manifest(manifest)) if manifest else []
+    if stats:
+        stats = os.path.abspath(stats)
+
+    j2env = get_environment(cache_dir)
+    output_size = 0
+    for template, filepath in zip(templates, filepaths):
+        output_size += render_template(
+            j2env, template, filepath, search_path,
+            prefetch=prefetch, manifest=manifest, jobs=jobs)
+    Ctx.flush()
+    if write_if_changed:
+        report_outputs()
+    if verbose:
+        report_memory(output_size)
+    if stats:
+        write_stats(stats)
+
+
+def reset_run_state():
+    Ctx.set_abort_handler(None)
+    Ctx.reset_errors()
+    utils.Output.reset()
+    utils.MemStats.reset()
+    utils.Stats.reset()
+    x2pyxl.PRELOADED_SHEETS.clear()
+
+
+def serve_request(args, cwd):
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+    code = 0
+    try:
+        os.chdir(cwd)
+        reset_run_state()
+        code = render.main(args=args, prog_name='xls2any', standalone_mode=False) or 0
+    except SystemExit as exc:
+        code = exc.code if isinstance(exc.code, int) else 1
+    except click.ClickException as exc:
+        exc.show()
+        code = exc.exit_code
+    except click.Abort:
+        code = 1
+    except Exception:
+        print(traceback.format_exc(), file=sys.stderr)
+        code = 1
+    finally:
+        out, err = sys.stdout.getvalue(), sys.stderr.getvalue()
+        sys.stdout, sys.stderr = stdout, stderr
+    return code, out, err
+
+
+@click.command()
+@click.option('--address', default=None)
+@click.option('--stop', is_flag=True)
+def serve(address, stop):
+    if stop:
+        if server.stop(address) is None:
+            Ctx.abort('没有正在运行的渲染服务')
+        return
+    x2pyxl.keep_worksheets()
+    keep_compiled()
+    server.serve(serve_request, address)
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else list(args)
+    if args[:1] == ['serve']:
+        return serve.main(args=args[1:], prog_name='xls2any serve')
+    if '--no-server' not in args:
+        result = server.request(args)
+        if result is not None:
+            code, out, err = result
+            sys.stdout.write(out)
+            sys.stderr.write(err)
+            sys.exit(code)
+    return render.main(args=args, prog_name='xls2any')
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import getpass
+import tempfile
+from multiprocessing import connection
+
+from . import utils
+
+Ctx = utils.Ctx
+
+SERVER_ENV = 'XLS2ANY_SERVER'
+AUTHKEY_SIZE = 32
+
+
+def default_address():
+    address = os.environ.get(SERVER_ENV)
+    if address:
+        return address
+    user = getpass.getuser()
+    if sys.platform == 'win32':
+        return r'\\.\pipe\xls2any-' + user
+    rundir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(rundir, 'xls2any-{0}.sock'.format(user))
+
+
+def _family(address):
+    return 'AF_PIPE' if address.startswith('\\\\') else 'AF_UNIX'
+
+
+def _key_path(address):
+    if _family(address) == 'AF_PIPE':
+        return os.path.join(tempfile.gettempdir(), address.rsplit('\\', 1)[-1] + '.key')
+    return address + '.key'
+
+
+def _is_private(path):
+    # the default address may live in a shared temp directory, files planted
+    # there by other users must not be trusted
+    if not hasattr(os, 'getuid'):
+        return True
+    try:
+        stat = os.lstat(path)
+    except OSError:
+        return False
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o077
+
+
+def _read_key(address):
+    path = _key_path(address)
+    if not _is_private(path):
+        return None
+    try:
+        with open(path, 'rb') as fp:
+            return fp.read()
+    except IOError:
+        return None
+
+
+def _write_key(address):
+    path = _key_path(address)
+    if os.path.lexists(path):
+        if hasattr(os, 'getuid') and os.lstat(path).st_uid != os.getuid():
+            Ctx.abort('渲染服务的密钥文件属于其他用户：{0}', path)
+        os.remove(path)
+    authkey = os.urandom(AUTHKEY_SIZE)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as fp:
+        fp.write(authkey)
+    return authkey
+
+
+def connect(address=None):
+    address = address or default_address()
+    if _family(address) == 'AF_UNIX' and not _is_private(address):
+        return None
+    authkey = _read_key(address)
+    if authkey is None:
+        return None
+    try:
+        return connection.Client(address, family=_family(address), authkey=authkey)
+    except (OSError, EOFError, connection.AuthenticationError):
+        return None
+
+
+def _call(message, address=None):
+    conn = connect(address)
+    if conn is None:
+        return None
+    try:
+        conn.send(message)
+        return conn.recv()
+    except (OSError, EOFError):
+        return None
+    finally:
+        conn.close()
+
+
+def request(args, cwd=None, address=None):
+    return _call(('render', list(args), cwd or os.getcwd()), address)
+
+
+def stop(address=None):
+    return _call(('stop',), address)
+
+
+def serve(handler, address=None):
+    address = address or default_address()
+    family = _family(address)
+    conn = connect(address)
+    if conn is not None:
+        conn.close()
+        Ctx.abort('渲染服务已在运行：{0}', address)
+    if family == 'AF_UNIX' and os.path.lexists(address):
+        if hasattr(os, 'getuid') and os.lstat(address).st_uid != os.getuid():
+            Ctx.abort('渲染服务地址属于其他用户：{0}', address)
+        os.remove(address)
+    authkey = _write_key(address)
+    umask = os.umask(0o077)
+    try:
+        listener = connection.Listener(address, family=family, authkey=authkey)
+    except OSError:
+        Ctx.abort('无法监听地址：{0}', address)
+    finally:
+        os.umask(umask)
+
+    Ctx.info('渲染服务已启动：{0}', address)
+    try:
+        with listener:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, connection.AuthenticationError):
+                    continue
+                with conn:
+                    try:
+                        message = conn.recv()
+                    except (OSError, EOFError):
+                        continue
+                    if message[0] == 'stop':
+                        conn.send((0, '', ''))
+                        break
+                    result = handler(*message[1:])
+                    try:
+                        conn.send(result)
+                    except (OSError, EOFError):
+                        continue
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(_key_path(address)):
+            os.remove(_key_path(address))
+    Ctx.set_ctx(None, None)
+    Ctx.info('渲染服务已停止')
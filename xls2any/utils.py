@@ -1,42 +1,177 @@
 # -*- coding: utf-8 -*-
 
+import io
+import os
+import re
 import sys
+import gzip
+import json
+import time
+import queue
+import codecs
+import ctypes
+import hashlib
+import tempfile
+import weakref
+import threading
 import datetime
 import functools
+import traceback
+import collections
 
 import chardet
 import colorama
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
 colorama.init()
 
 
+VARX_REGEX = re.compile(r'\bx\b')
+CHECK_BUILTINS = dict(
+    abs=abs, all=all, any=any, bin=bin, bool=bool, chr=chr,
+    divmod=divmod, float=float, hex=hex, int=int, len=len, max=max,
+    min=min, oct=oct, ord=ord, round=round, str=str, sum=sum,
+)
+
+
+def format_rows(rows):
+    spans = []
+    for row in sorted(set(rows)):
+        if spans and spans[-1][1] + 1 == row:
+            spans[-1][1] = row
+        else:
+            spans.append([row, row])
+    return ','.join(
+        str(beg) if beg == end else '%s-%s' % (beg, end)
+        for beg, end in spans
+    )
+
+
+class ErrorGroup(object):
+    __slots__ = ('level', 'context', 'msg', 'args', 'kwds', 'rows', 'count')
+
+    def __init__(self, level, context, msg, args, kwds):
+        self.level = level
+        self.context = context
+        self.msg = msg
+        self.args = args
+        self.kwds = kwds
+        self.rows = []
+        self.count = 0
+
+    @property
+    def message(self):
+        return str(self.msg).format(*self.args, **self.kwds)
+
+    def asdict(self):
+        filename, _, sheetname = (self.context or '').partition('#')
+        return {
+            'level': self.level,
+            'file': filename or None,
+            'sheet': sheetname or None,
+            'rows': format_rows(self.rows),
+            'count': self.count,
+            'template': str(self.msg),
+            'message': self.message,
+        }
+
+
+class ErrorCollector(object):
+
+    def __init__(self):
+        self._groups = collections.OrderedDict()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(self._groups.values())
+
+    def add(self, level, context, lineno, msg, args, kwds):
+        key = (level, context, str(msg))
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = ErrorGroup(level, context, msg, args, kwds)
+        if lineno is not None:
+            group.rows.append(lineno)
+        group.count += 1
+        self._count += 1
+
+    def tally(self):
+        self._count += 1
+
+    def clear(self):
+        self._groups.clear()
+        self._count = 0
+
+
+class AbortError(Exception):
+    pass
+
+
+PORTABLE_TYPES = (
+    type(None), bool, int, float, str, bytes,
+    datetime.date, datetime.time, datetime.timedelta,
+)
+
+
+def portable_value(value):
+    if isinstance(value, PORTABLE_TYPES):
+        return value
+    elif isinstance(value, (tuple, list)):
+        return type(value)(portable_value(item) for item in value)
+    else:
+        return str(value)
+
+
 class Ctx(object):
-    _ctx_arg = {}
+    _ctx_file = None
+    _ctx_line = None
     _log_fmt = '%(color)s%(asctime)s %(level)s [%(context)s] %(message)s%(reset)s'
     _at_abort = None
     _in_debug = False
+    _err_mode = 'stream'
+    _err_max = 0
+    _errors = ErrorCollector()
+    _capture = None
+
+    ERROR_MODES = ('stream', 'summary', 'json')
 
     @classmethod
     def set_ctx(cls, filename, lineno):
-        cls._ctx_arg.update(
-            filename=filename,
-            lineno=lineno,
-        )
+        cls._ctx_file = filename
+        cls._ctx_line = lineno
+
+    @classmethod
+    def get_ctx(cls):
+        return cls._ctx_file, cls._ctx_line
 
     @classmethod
     def set_debug(cls, flag):
         cls._in_debug = bool(flag)
 
     @classmethod
-    def get_msg(cls, color, level, message, reset=colorama.Style.RESET_ALL):
+    def set_error_mode(cls, mode='stream', max_errors=0):
+        if mode not in cls.ERROR_MODES:
+            cls.throw('错误的错误输出模式：{0!r}', mode)
+        cls._err_mode = mode
+        cls._err_max = max_errors or 0
+
+    @classmethod
+    def get_msg(cls, color, level, message, reset=colorama.Style.RESET_ALL, context=None):
         asctime = datetime.datetime.now().isoformat(timespec='seconds')
-        if 'filename' in cls._ctx_arg:
-            context = "%s:%s" % (
-                cls._ctx_arg['filename'],
-                cls._ctx_arg['lineno'],
-            )
-        else:
-            context = '-'
+        if context is None:
+            if cls._ctx_file is not None and cls._ctx_line is not None:
+                context = "%s:%s" % (cls._ctx_file, cls._ctx_line)
+            elif cls._ctx_file is not None:
+                context = str(cls._ctx_file)
+            else:
+                context = '-'
         return cls._log_fmt % locals()
 
     @classmethod
@@ -51,33 +186,153 @@ class Ctx(object):
         print(line, file=sys.stderr)
 
     @classmethod
-    def error(cls, msg, *args, **kwds):
+    def info(cls, msg, *args, **kwds):
+        line = cls.get_msg(
+            colorama.Fore.LIGHTCYAN_EX,
+            'INFO',
+            str(msg).format(*args, **kwds),
+        )
+        print(line, file=sys.stderr)
+
+    @classmethod
+    def warn(cls, msg, *args, **kwds):
         line = cls.get_msg(
-            colorama.Fore.LIGHTYELLOW_EX,
-            'ERROR',
+            colorama.Fore.LIGHTMAGENTA_EX,
+            'WARN',
             str(msg).format(*args, **kwds),
         )
         print(line, file=sys.stderr)
 
+    @classmethod
+    def error(cls, msg, *args, **kwds):
+        if cls._capture is not None:
+            cls._capture.append(cls._make_record('ERROR', msg, args, kwds))
+            return
+        Stats.add('errors')
+        if cls._err_mode == 'stream':
+            line = cls.get_msg(
+                colorama.Fore.LIGHTYELLOW_EX,
+                'ERROR',
+                str(msg).format(*args, **kwds),
+            )
+            print(line, file=sys.stderr)
+            cls._errors.tally()
+        else:
+            context = str(cls._ctx_file) if cls._ctx_file is not None else None
+            cls._errors.add('ERROR', context, cls._ctx_line, msg, args, kwds)
+        if 0 < cls._err_max <= len(cls._errors):
+            cls.abort('错误数量达到上限：{0}', cls._err_max)
+
     @classmethod
     def throw(cls, msg, *args, exc_tp=ValueError, **kwds):
         raise exc_tp(str(msg).format(*args, **kwds))
 
     @classmethod
     def abort(cls, msg, *args, **kwds):
-        line = cls.get_msg(
-            colorama.Fore.LIGHTRED_EX,
-            'FATAL',
-            str(msg).format(*args, **kwds),
-        )
-        print(line, file=sys.stderr)
+        if cls._capture is not None:
+            cls._capture.append(cls._make_record('FATAL', msg, args, kwds))
+            raise AbortError(str(msg).format(*args, **kwds))
+        if cls._err_mode == 'stream':
+            line = cls.get_msg(
+                colorama.Fore.LIGHTRED_EX,
+                'FATAL',
+                str(msg).format(*args, **kwds),
+            )
+            print(line, file=sys.stderr)
+        else:
+            context = str(cls._ctx_file) if cls._ctx_file is not None else None
+            cls._errors.add('FATAL', context, cls._ctx_line, msg, args, kwds)
+            cls.flush()
         at_abort = cls._at_abort or (lambda: sys.exit(1))
         at_abort()
 
+    @classmethod
+    def reset_errors(cls):
+        cls._errors.clear()
+
     @classmethod
     def set_abort_handler(cls, func):
         cls._at_abort = func
 
+    @classmethod
+    def _make_record(cls, level, msg, args, kwds):
+        context = str(cls._ctx_file) if cls._ctx_file is not None else None
+        args = tuple(portable_value(arg) for arg in args)
+        kwds = {key: portable_value(val) for key, val in kwds.items()}
+        return level, context, cls._ctx_line, str(msg), args, kwds
+
+    @classmethod
+    def start_capture(cls):
+        outer, cls._capture = cls._capture, []
+        return outer
+
+    @classmethod
+    def stop_capture(cls, outer=None):
+        records, cls._capture = cls._capture or [], outer
+        return records
+
+    @classmethod
+    def replay(cls, records):
+        for level, context, lineno, msg, args, kwds in records:
+            cls.set_ctx(context, lineno)
+            if level == 'FATAL':
+                cls.abort(msg, *args, **kwds)
+            else:
+                cls.error(msg, *args, **kwds)
+
+    @classmethod
+    def flush(cls, file=None):
+        file = file or sys.stderr
+        if cls._err_mode == 'json':
+            result = {
+                'count': len(cls._errors),
+                'errors': [grp.asdict() for grp in cls._errors],
+            }
+            print(json.dumps(result, ensure_ascii=False, indent=2), file=file)
+        elif cls._err_mode == 'summary':
+            for grp in cls._errors:
+                color = colorama.Fore.LIGHTRED_EX \
+                    if grp.level == 'FATAL' else colorama.Fore.LIGHTYELLOW_EX
+                if grp.context is None:
+                    context = '-'
+                elif grp.rows:
+                    context = '%s:%s' % (grp.context, format_rows(grp.rows))
+                else:
+                    context = grp.context
+                message = grp.message
+                if grp.count > 1:
+                    message = '%s (共%s处)' % (message, grp.count)
+                print(cls.get_msg(color, grp.level, message, context=context), file=file)
+        cls._errors.clear()
+
+
+def get_pyexc_msg():
+    exc_type, exc_value, exc_tb = sys.exc_info()
+    del exc_tb
+    exc_msg = traceback.format_exception_only(exc_type, exc_value)[0]
+    return exc_msg.strip()
+
+
+def expand_check_expr(expr, value):
+    cur = 0
+    buf = io.StringIO()
+    for match in VARX_REGEX.finditer(expr):
+        buf.write(expr[cur:match.start()])
+        buf.write(str(value))
+        cur = match.end()
+    buf.write(expr[cur:])
+    return buf.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def compile_check_expr(expr):
+    return compile(expr, '<check>', 'eval')
+
+
+@functools.lru_cache(maxsize=None)
+def compile_check_column(expr):
+    return compile('[not ({0}) for x in __xs__]'.format(expr), '<check>', 'eval')
+
 
 def detect_encoding(binary_data, default='utf-8', confidence=0.75):
     result = chardet.detect(binary_data)
@@ -87,13 +342,357 @@ def detect_encoding(binary_data, default='utf-8', confidence=0.75):
         return default
 
 
-def open_as_stdout(filename, encoding='utf-8'):
+OUTPUT_QUEUE_SIZE = 64
+OUTPUT_CHUNK_SIZE = 1 << 16
+
+
+class _HashingFile(io.RawIOBase):
+
+    def __init__(self, fp):
+        self._fp = fp
+        self.digest = hashlib.sha1()
+
+    def writable(self):
+        return True
+
+    def fileno(self):
+        return self._fp.fileno()
+
+    def write(self, data):
+        self.digest.update(data)
+        return self._fp.write(data)
+
+    def close(self):
+        if not self.closed:
+            self._fp.close()
+        super(_HashingFile, self).close()
+
+
+def file_digest(filename, chunk_size=1 << 20):
+    digest = hashlib.sha1()
     try:
-        sys.stdout = open(filename, 'w', encoding=encoding)
+        with open(filename, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(chunk_size), b''):
+                digest.update(chunk)
     except IOError:
-        Ctx.throw('无法打开目标输出流：{0}', filename)
-    except LookupError:
-        Ctx.throw('错误的文件编码名称：{0}', encoding)
+        return None
+    return digest.digest()
+
+
+class QueuedWriter(object):
+
+    def __init__(self, fp, encoding='utf-8',
+                 queue_size=OUTPUT_QUEUE_SIZE, chunk_size=OUTPUT_CHUNK_SIZE):
+        self._fp = fp
+        self._encoder = codecs.getincrementalencoder(encoding)()
+        self._queue = queue.Queue(queue_size)
+        self._chunk_size = chunk_size
+        self._buffer = []
+        self._buffered = 0
+        self._error = None
+        self._thread = threading.Thread(target=self._drain, name='xls2any-output')
+        self._thread.daemon = True
+        self._thread.start()
+        self.closed = False
+
+    def _drain(self):
+        while True:
+            text = self._queue.get()
+            if text is None:
+                self._queue.task_done()
+                break
+            if self._error is None:
+                if os.linesep != '\n':
+                    text = text.replace('\n', os.linesep)
+                try:
+                    self._fp.write(self._encoder.encode(text))
+                except Exception as exc:
+                    self._error = exc
+            self._queue.task_done()
+        if self._error is None:
+            try:
+                self._fp.write(self._encoder.encode('', final=True))
+            except Exception as exc:
+                self._error = exc
+
+    def _check_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def write(self, text):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        self._check_error()
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self._chunk_size:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            text = ''.join(self._buffer)
+            self._buffer = []
+            self._buffered = 0
+            self._queue.put(text)
+
+    def drain(self):
+        # waits until the thread is idle, it must not hold the sink's
+        # locks when the process forks
+        self.flush()
+        self._queue.join()
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._check_error()
+
+
+class FileOutput(object):
+
+    def _setup(self, fp, encoding, compress, fsync):
+        self._fp = io.BufferedWriter(fp)
+        if compress:
+            self._sink = gzip.GzipFile(filename='', mode='wb', fileobj=self._fp, mtime=0)
+        else:
+            self._sink = self._fp
+        self._fsync = fsync
+        # binary outputs write straight into the sink
+        self.stream = QueuedWriter(self._sink, encoding) if encoding else self._sink
+
+    def _finish(self):
+        try:
+            if self.stream is not self._sink:
+                self.stream.close()
+        finally:
+            if self._sink is not self._fp:
+                self._sink.close()
+            self._fp.flush()
+            if self._fsync:
+                os.fsync(self._fp.fileno())
+            self._fp.close()
+
+    def _open_temp(self, filename):
+        # write next to the target and rename on commit, so that a failed
+        # render never leaves a truncated file behind
+        self.filename = filename
+        dirname = os.path.dirname(os.path.abspath(filename))
+        fd, self._tmpname = tempfile.mkstemp(prefix='.xls2any-', dir=dirname)
+        return os.fdopen(fd, 'wb', buffering=0)
+
+    def _replace(self):
+        try:
+            mode = os.stat(self.filename).st_mode & 0o777
+        except OSError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(self._tmpname, mode)
+        os.replace(self._tmpname, self.filename)
+
+    def _abandon(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+    def discard(self):
+        self._abandon()
+        if self._tmpname is not None and os.path.exists(self._tmpname):
+            os.remove(self._tmpname)
+
+
+class ChangedOnlyOutput(FileOutput):
+
+    def __init__(self, filename, encoding='utf-8', compress=False, fsync=False):
+        self._raw = _HashingFile(self._open_temp(filename))
+        self._setup(self._raw, encoding, compress, fsync)
+
+    def commit(self):
+        try:
+            self._finish()
+        except Exception:
+            self.discard()
+            raise
+        if file_digest(self.filename) == self._raw.digest.digest():
+            os.remove(self._tmpname)
+            return False
+        self._replace()
+        return True
+
+
+class PlainOutput(FileOutput):
+
+    def __init__(self, filename, encoding='utf-8', compress=False, fsync=False):
+        if os.path.exists(filename) and not os.path.isfile(filename):
+            # devices and pipes can only be written in place
+            self.filename, self._tmpname = filename, None
+            fp = open(filename, 'wb', buffering=0)
+        else:
+            fp = self._open_temp(filename)
+        self._setup(fp, encoding, compress, fsync)
+
+    def commit(self):
+        try:
+            self._finish()
+        except Exception:
+            self.discard()
+            raise
+        if self._tmpname is not None:
+            self._replace()
+        return True
+
+
+class Output(object):
+    _changed_only = False
+    _current = None
+    _stdout = None
+    _pending = []
+    _results = []
+    _binaries = []
+
+    @classmethod
+    def set_changed_only(cls, flag):
+        cls._changed_only = bool(flag)
+
+    @classmethod
+    def reset(cls):
+        cls.close(commit=False)
+        cls._results = []
+
+    @classmethod
+    def results(cls):
+        return list(cls._results)
+
+    @classmethod
+    def open(cls, filename, encoding='utf-8', compress=None, fsync=False):
+        cls._close_current(True)
+        if compress is None:
+            compress = filename.lower().endswith('.gz')
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            Ctx.throw('错误的文件编码名称：{0}', encoding)
+        output_type = ChangedOnlyOutput if cls._changed_only else PlainOutput
+        try:
+            cls._current = output_type(filename, encoding, compress, fsync)
+        except IOError:
+            Ctx.throw('无法打开目标输出流：{0}', filename)
+        cls._stdout = sys.stdout
+        sys.stdout = cls._current.stream
+        pending, cls._pending = cls._pending, []
+        for text in pending:
+            cls._current.stream.write(text)
+
+    @classmethod
+    def open_binary(cls, filename, compress=None, fsync=False):
+        if compress is None:
+            compress = filename.lower().endswith('.gz')
+        output_type = ChangedOnlyOutput if cls._changed_only else PlainOutput
+        try:
+            output = output_type(filename, None, compress, fsync)
+        except IOError:
+            Ctx.throw('无法打开目标输出流：{0}', filename)
+        cls._binaries.append(output)
+        return output
+
+    @classmethod
+    def close_binary(cls, output, commit=True):
+        if output not in cls._binaries:
+            return
+        cls._binaries.remove(output)
+        if commit:
+            cls._results.append((output.filename, output.commit()))
+        else:
+            output.discard()
+
+    @classmethod
+    def drain(cls):
+        if cls._current is not None and isinstance(cls._current.stream, QueuedWriter):
+            cls._current.stream.drain()
+
+    @classmethod
+    def write(cls, text):
+        if cls._current is None:
+            cls._pending.append(text)
+        else:
+            cls._current.stream.write(text)
+
+    @classmethod
+    def _close_current(cls, commit):
+        current, cls._current = cls._current, None
+        if current is None:
+            return
+        sys.stdout = cls._stdout
+        if commit:
+            cls._results.append((current.filename, current.commit()))
+        else:
+            current.discard()
+
+    @classmethod
+    def close(cls, commit=True):
+        pending, cls._pending = cls._pending, []
+        cls._close_current(commit)
+        for output in list(cls._binaries):
+            cls.close_binary(output, commit)
+        if commit and pending:
+            sys.stdout.write(''.join(pending))
+            sys.stdout.flush()
+
+
+def open_as_stdout(filename, encoding='utf-8', compress=None, fsync=False):
+    Output.open(filename, encoding, compress, fsync)
+
+
+class LRUCache(object):
+
+    def __init__(self, maxsize):
+        self._maxsize = maxsize
+        self._items = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __setitem__(self, key, val):
+        self._items[key] = val
+        self._items.move_to_end(key)
+        while len(self._items) > self._maxsize:
+            self._items.popitem(last=False)
+
+    def get(self, key, default=None):
+        try:
+            val = self._items[key]
+        except KeyError:
+            return default
+        self._items.move_to_end(key)
+        return val
+
+    def pop(self, key, default=None):
+        return self._items.pop(key, default)
+
+    def clear(self):
+        self._items.clear()
+
+
+CACHE_OWNERS = collections.defaultdict(weakref.WeakSet)
+
+
+def drop_caches():
+    count = 0
+    for namespace, owners in CACHE_OWNERS.items():
+        for owner in list(owners):
+            cache_dict = getattr(owner, namespace)
+            count += len(cache_dict)
+            cache_dict.clear()
+    return count
 
 
 def cachedmethod(namespace, keyfmt, dumps=None, loads=None):
@@ -103,11 +702,309 @@ def cachedmethod(namespace, keyfmt, dumps=None, loads=None):
             cache_key  = keyfmt.format(*args, **kwds)
             cache_dict = getattr(args[0], namespace)
             if cache_key not in cache_dict:
+                # counters and memory checks are off unless --stats/--mem-limit ask for them
+                if Stats._enabled:
+                    Stats.add('cache.{0}.misses'.format(cache_key.partition(':')[0]))
+                if MemStats._limit > 0:
+                    MemStats.check()
+                CACHE_OWNERS[namespace].add(args[0])
                 result = func(*args, **kwds)
                 cache_val = result if dumps is None else dumps(result)
                 cache_dict[cache_key] = cache_val
             else:
+                if Stats._enabled:
+                    Stats.add('cache.{0}.hits'.format(cache_key.partition(':')[0]))
                 cache_val = cache_dict[cache_key]
             return cache_val if loads is None else loads(cache_val)
         return decorate
     return decorator
+
+
+class DedupeGraph(object):
+    LEAF, LIST, DICT = 0, 1, 2
+
+    def __init__(self):
+        self.nodes = []
+        self._index = {}
+
+    def _intern(self, key, node):
+        nid = self._index.get(key)
+        if nid is None:
+            nid = self._index[key] = len(self.nodes)
+            self.nodes.append(node)
+        return nid
+
+    @staticmethod
+    def _check_ref(obj, refs):
+        if type(obj) in (list, tuple, dict):
+            if id(obj) in refs:
+                return True
+            refs.add(id(obj))
+        return False
+
+    def add(self, obj, refs=None):
+        tp = type(obj)
+        if tp in (list, tuple, dict):
+            if refs is not None:
+                refs.add(id(obj))
+            if tp is dict:
+                items = []
+                for k, v in obj.items():
+                    if refs is not None and \
+                            (self._check_ref(k, refs) or self._check_ref(v, refs)):
+                        continue
+                    items.append((self.add(k, refs), self.add(v, refs)))
+                items = tuple(items)
+                return self._intern((self.DICT, items), (self.DICT, items))
+            else:
+                items = tuple(
+                    self.add(e, refs) for e in obj
+                    if refs is None or not self._check_ref(e, refs)
+                )
+                return self._intern((self.LIST, items), (self.LIST, items))
+        key = (self.LEAF, tp, repr(obj) if tp is float else obj)
+        try:
+            return self._intern(key, (self.LEAF, obj))
+        except TypeError:
+            return self._intern((self.LEAF, tp, id(obj)), (self.LEAF, obj))
+
+    def children(self, nid):
+        kind, payload = self.nodes[nid]
+        if kind == self.DICT:
+            for kid, vid in payload:
+                yield kid
+                yield vid
+        elif kind == self.LIST:
+            yield from payload
+
+    def materialize(self, nid, refs):
+        kind, payload = self.nodes[nid]
+        if kind == self.LEAF:
+            return payload
+        elif kind == self.LIST:
+            return tuple(
+                refs[cid] if cid in refs else self.materialize(cid, refs)
+                for cid in payload
+            )
+        else:
+            return {
+                refs[kid] if kid in refs else self.materialize(kid, refs):
+                    refs[vid] if vid in refs else self.materialize(vid, refs)
+                for kid, vid in payload
+            }
+
+    def shared(self, root):
+        uses = collections.Counter()
+        order = []
+        stack = [(root, False)]
+        while stack:
+            nid, done = stack.pop()
+            if done:
+                order.append(nid)
+                continue
+            uses[nid] += 1
+            if uses[nid] > 1:
+                continue
+            stack.append((nid, True))
+            stack.extend((child, False) for child in reversed(list(self.children(nid))))
+        return [
+            nid for nid in order
+            if uses[nid] > 1 and self.nodes[nid][0] != self.LEAF and self.nodes[nid][1]
+        ]
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [
+        ('cb', ctypes.c_ulong),
+        ('PageFaultCount', ctypes.c_ulong),
+        ('PeakWorkingSetSize', ctypes.c_size_t),
+        ('WorkingSetSize', ctypes.c_size_t),
+        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+        ('PagefileUsage', ctypes.c_size_t),
+        ('PeakPagefileUsage', ctypes.c_size_t),
+    ]
+
+
+def _win_memory_counters():
+    if sys.platform != 'win32':
+        return None
+    counters = _ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        psapi = ctypes.windll.psapi
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters
+
+
+def peak_rss():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    counters = _win_memory_counters()
+    return counters.PeakWorkingSetSize if counters else 0
+
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, ValueError, IndexError, AttributeError):
+        pass
+    counters = _win_memory_counters()
+    return counters.WorkingSetSize if counters else peak_rss()
+
+
+def format_size(size):
+    if size < 1024:
+        return '%dB' % size
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024.0
+        if size < 1024 or unit == 'GB':
+            return '%.1f%s' % (size, unit)
+
+
+SIZEOF_SKIP_TYPES = (
+    type, type(sys), type(len), type(format_size), type(Ctx.info),
+)
+
+
+def sizeof(obj, seen=None, skip=()):
+    seen = set() if seen is None else seen
+    skip = SIZEOF_SKIP_TYPES + tuple(skip)
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, skip):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj, 0)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif not isinstance(obj, (str, bytes, int, float)):
+            if hasattr(obj, '__dict__'):
+                stack.append(obj.__dict__)
+            for name in getattr(type(obj), '__slots__', ()):
+                if hasattr(obj, name):
+                    stack.append(getattr(obj, name))
+    return total
+
+
+class MemStats(object):
+    _limit = 0
+    _phases = []
+    _drops = 0
+
+    @classmethod
+    def set_limit(cls, limit):
+        cls._limit = limit or 0
+
+    @classmethod
+    def limited(cls):
+        return cls._limit > 0
+
+    @classmethod
+    def reset(cls):
+        cls._phases = []
+        cls._drops = 0
+
+    @classmethod
+    def mark(cls, phase):
+        cls._phases.append((phase, peak_rss(), current_rss()))
+
+    @classmethod
+    def phases(cls):
+        return list(cls._phases)
+
+    @classmethod
+    def drops(cls):
+        return cls._drops
+
+    @classmethod
+    def check(cls):
+        if cls._limit <= 0 or current_rss() < cls._limit:
+            return False
+        count = drop_caches()
+        cls._drops += 1
+        Ctx.debug('内存占用超过软上限{0}，已清除{1}项缓存', format_size(cls._limit), count)
+        return True
+
+
+class Stats(object):
+    _enabled = False
+    _counters = collections.Counter()
+    _phases = []
+    _clock = None
+
+    @classmethod
+    def set_enabled(cls, flag):
+        cls._enabled = bool(flag)
+
+    @classmethod
+    def enabled(cls):
+        return cls._enabled
+
+    @classmethod
+    def add(cls, name, num=1):
+        if cls._enabled:
+            cls._counters[name] += num
+
+    @classmethod
+    def reset(cls):
+        cls._counters = collections.Counter()
+        cls._phases = []
+        cls._clock = None
+
+    @classmethod
+    def counters(cls):
+        return dict(cls._counters)
+
+    @classmethod
+    def since(cls, before):
+        return {name: num - before.get(name, 0) for name, num in cls._counters.items()
+                if num != before.get(name, 0)}
+
+    @classmethod
+    def merge(cls, counters):
+        cls._counters.update(counters)
+
+    @classmethod
+    def start(cls):
+        cls._clock = time.perf_counter()
+
+    @classmethod
+    def mark(cls, phase, template=None):
+        now = time.perf_counter()
+        if cls._clock is None:
+            cls._clock = now
+        cls._phases.append((template, phase, now - cls._clock, peak_rss(), current_rss()))
+        cls._clock = now
+
+    @classmethod
+    def report(cls):
+        phases = [
+            collections.OrderedDict([
+                ('template', template),
+                ('phase', phase),
+                ('seconds', round(seconds, 6)),
+                ('peak_rss', peak),
+                ('current_rss', current),
+            ])
+            for template, phase, seconds, peak, current in cls._phases
+        ]
+        return collections.OrderedDict([
+            ('seconds', round(sum(phase['seconds'] for phase in phases), 6)),
+            ('peak_rss', peak_rss()),
+            ('counters', collections.OrderedDict(sorted(cls._counters.items()))),
+            ('phases', phases),
+        ])
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import struct
+import datetime
+
+from . import utils
+
+Ctx = utils.Ctx
+
+
+BIN_MAGIC = b'X2B\x01'
+GZIP_MAGIC = b'\x1f\x8b'
+
+TAG_NIL = 0x00
+TAG_FALSE = 0x01
+TAG_TRUE = 0x02
+TAG_INT = 0x03
+TAG_FLOAT = 0x04
+TAG_STR = 0x05
+TAG_STRREF = 0x06
+TAG_ARRAY = 0x07
+TAG_TABLE = 0x08
+TAG_DATE = 0x09
+TAG_DATETIME = 0x0a
+
+FLOAT_STRUCT = struct.Struct('<d')
+
+
+def write_varint(buf, num):
+    while num > 0x7f:
+        buf.append((num & 0x7f) | 0x80)
+        num >>= 7
+    buf.append(num)
+
+
+def zigzag(num):
+    return num << 1 if num >= 0 else ((-num) << 1) - 1
+
+
+def unzigzag(num):
+    return num >> 1 if not num & 1 else -((num + 1) >> 1)
+
+
+def _check_ref(obj, refs):
+    if type(obj) in (list, tuple, dict):
+        if id(obj) in refs:
+            return True
+        refs.add(id(obj))
+    return False
+
+
+class BinEncoder(object):
+
+    def __init__(self, check_circular=True):
+        self._strings = {}
+        self._check_circular = check_circular
+
+    def encode(self, obj):
+        buf = bytearray()
+        self._encode(obj, buf, set())
+        return bytes(buf)
+
+    def _encode(self, obj, buf, refs):
+        tp = type(obj)
+        if tp is str:
+            index = self._strings.get(obj)
+            if index is not None:
+                buf.append(TAG_STRREF)
+                write_varint(buf, index)
+            else:
+                self._strings[obj] = len(self._strings)
+                data = obj.encode('utf-8')
+                buf.append(TAG_STR)
+                write_varint(buf, len(data))
+                buf += data
+        elif obj is None:
+            buf.append(TAG_NIL)
+        elif obj is True:
+            buf.append(TAG_TRUE)
+        elif obj is False:
+            buf.append(TAG_FALSE)
+        elif tp is int:
+            buf.append(TAG_INT)
+            write_varint(buf, zigzag(obj))
+        elif tp is float:
+            buf.append(TAG_FLOAT)
+            buf += FLOAT_STRUCT.pack(obj)
+        elif tp in (list, tuple, dict):
+            _check_ref(obj, refs)
+            check_circular = self._check_circular
+            if tp is dict:
+                items = obj.items()
+                if check_circular:
+                    items = [(k, v) for k, v in items
+                             if not (_check_ref(k, refs) or _check_ref(v, refs))]
+                buf.append(TAG_TABLE)
+                write_varint(buf, len(items))
+                for k, v in items:
+                    self._encode(k, buf, refs)
+                    self._encode(v, buf, refs)
+            else:
+                items = obj
+                if check_circular:
+                    items = [e for e in items if not _check_ref(e, refs)]
+                buf.append(TAG_ARRAY)
+                write_varint(buf, len(items))
+                for e in items:
+                    self._encode(e, buf, refs)
+        elif tp is datetime.datetime:
+            buf.append(TAG_DATETIME)
+            write_varint(buf, obj.year)
+            buf += bytes((obj.month, obj.day, obj.hour, obj.minute, obj.second))
+        elif tp is datetime.date:
+            buf.append(TAG_DATE)
+            write_varint(buf, obj.year)
+            buf += bytes((obj.month, obj.day))
+        else:
+            Ctx.throw('不能将{0}转换为二进制类型', tp.__name__, exc_tp=TypeError)
+
+
+class BinDecoder(object):
+
+    def __init__(self):
+        self._strings = []
+
+    def decode(self, data, pos=0):
+        return self._decode(memoryview(data), pos)
+
+    def _varint(self, data, pos):
+        num = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            num |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return num, pos
+            shift += 7
+
+    def _decode(self, data, pos):
+        tag = data[pos]
+        pos += 1
+        if tag == TAG_STRREF:
+            index, pos = self._varint(data, pos)
+            return self._strings[index], pos
+        elif tag == TAG_STR:
+            size, pos = self._varint(data, pos)
+            obj = str(data[pos:pos + size], 'utf-8')
+            self._strings.append(obj)
+            return obj, pos + size
+        elif tag == TAG_INT:
+            num, pos = self._varint(data, pos)
+            return unzigzag(num), pos
+        elif tag == TAG_FLOAT:
+            return FLOAT_STRUCT.unpack_from(data, pos)[0], pos + FLOAT_STRUCT.size
+        elif tag == TAG_NIL:
+            return None, pos
+        elif tag == TAG_TRUE:
+            return True, pos
+        elif tag == TAG_FALSE:
+            return False, pos
+        elif tag == TAG_ARRAY:
+            size, pos = self._varint(data, pos)
+            obj = []
+            for _ in range(size):
+                item, pos = self._decode(data, pos)
+                obj.append(item)
+            return obj, pos
+        elif tag == TAG_TABLE:
+            size, pos = self._varint(data, pos)
+            obj = {}
+            for _ in range(size):
+                key, pos = self._decode(data, pos)
+                obj[key], pos = self._decode(data, pos)
+            return obj, pos
+        elif tag == TAG_DATE:
+            year, pos = self._varint(data, pos)
+            month, day = data[pos:pos + 2]
+            return datetime.date(year, month, day), pos + 2
+        elif tag == TAG_DATETIME:
+            year, pos = self._varint(data, pos)
+            month, day, hour, minute, second = data[pos:pos + 5]
+            return datetime.datetime(year, month, day, hour, minute, second), pos + 5
+        else:
+            Ctx.throw('无法识别的二进制类型标记：{0:#04x}', tag)
+
+
+class BinWriter(object):
+
+    def __init__(self, filename, check_circular=True, compress=None, fsync=False):
+        self._output = utils.Output.open_binary(filename, compress, fsync)
+        self._output.stream.write(BIN_MAGIC)
+        self._encoder = BinEncoder(check_circular=check_circular)
+
+    @property
+    def closed(self):
+        return self._output.stream.closed
+
+    def write(self, obj):
+        if self.closed:
+            Ctx.throw('二进制输出流已关闭')
+        self._output.stream.write(self._encoder.encode(obj))
+
+    def close(self):
+        utils.Output.close_binary(self._output)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def dumps(obj, **kwds):
+    return BIN_MAGIC + BinEncoder(**kwds).encode(obj)
+
+
+def iter_loads(data):
+    if data[:len(BIN_MAGIC)] != BIN_MAGIC:
+        Ctx.throw('无法识别的二进制文件头')
+    decoder = BinDecoder()
+    pos = len(BIN_MAGIC)
+    while pos < len(data):
+        obj, pos = decoder.decode(data, pos)
+        yield obj
+
+
+def loads(data):
+    for obj in iter_loads(data):
+        return obj
+    Ctx.throw('二进制数据为空')
+
+
+def load(filename):
+    with open(filename, 'rb') as fp:
+        data = fp.read()
+    if data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+    return list(iter_loads(data))
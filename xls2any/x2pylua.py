@@ -3,6 +3,7 @@
 import io
 import re
 import datetime
+import collections
 
 from . import utils
 
@@ -63,10 +64,18 @@ def _check_ref(obj, refs):
     return False
 
 
+class LuaRaw(object):
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
 class LuaEncoder(object):
     LUA_ESCAPE_TABLE = get_lua_escape_table()
 
-    def __init__(self, check_circular=True, indent=None, separators=(', ', ' = ')):
+    def __init__(self, check_circular=True, indent=None, separators=(', ', ' = '),
+                 dedupe=False):
         if isinstance(indent, str):
             _indent = indent if indent.isspace() else ''
         elif isinstance(indent, int):
@@ -76,6 +85,7 @@ class LuaEncoder(object):
         self._indent = _indent
         self._separators = separators
         self._check_circular = check_circular
+        self._dedupe = dedupe
 
     @classmethod
     def escape(cls, obj):
@@ -85,9 +95,35 @@ class LuaEncoder(object):
 
     def encode(self, obj):
         buf = io.StringIO()
-        self._encode(obj, buf, set())
+        if self._dedupe:
+            self._encode_dedupe(obj, buf)
+        else:
+            self._encode(obj, buf, set())
         return buf.getvalue()
 
+    def _encode_dedupe(self, obj, buf):
+        graph = utils.DedupeGraph()
+        root = graph.add(obj, set() if self._check_circular else None)
+        shared = graph.shared(root)
+        if not shared:
+            self._encode(obj, buf, set())
+            return
+        refs = {nid: LuaRaw('_D[%d]' % i) for i, nid in enumerate(shared, 1)}
+        newline = '\n' if self._indent else ' '
+        buf.write('(function()')
+        buf.write(newline)
+        buf.write('local _D = {}')
+        for nid in shared:
+            buf.write(newline)
+            buf.write(refs[nid].text)
+            buf.write(' = ')
+            self._encode(graph.materialize(nid, refs), buf, set())
+        buf.write(newline)
+        buf.write('return ')
+        self._encode(graph.materialize(root, refs), buf, set())
+        buf.write(newline)
+        buf.write('end)()')
+
     def _encode(self, obj, buf, refs, depth=0):
         indent = self._indent
         sep1 = self._separators[0]  # `,`
@@ -160,9 +196,144 @@ class LuaEncoder(object):
             buf.write(datetime_tolua(obj))
         elif tp is datetime.date:
             buf.write(date_tolua(obj))
+        elif tp is LuaRaw:
+            buf.write(obj.text)
         else:
             Ctx.throw('不能将{0}转换为Lua类型', tp.__name__, exc_tp=TypeError)
 
 
 def dumps(obj, **kwds):
     return LuaEncoder(**kwds).encode(obj)
+
+
+class LuaModuleEncoder(LuaEncoder):
+    STRTAB_NAME = '_S'
+
+    def __init__(self, check_circular=True, indent=None, separators=(', ', ' = '),
+                 hoist=2, chunk_size=4096):
+        super(LuaModuleEncoder, self).__init__(
+            check_circular=check_circular, indent=indent, separators=separators)
+        if chunk_size < 1:
+            Ctx.throw('分块大小必须是正整数：{0!r}', chunk_size)
+        self._hoist = hoist
+        self._chunk_size = chunk_size
+        self._strings = {}
+        self._weights = {}
+
+    def encode(self, obj):
+        counts = collections.Counter()
+        self._weights = {}
+        self._measure(obj, counts, set())
+
+        strings = []
+        if self._hoist:
+            for text, count in counts.most_common():
+                if count < self._hoist:
+                    break
+                literal = len(self.escape(text)) + 2
+                reference = len(self.STRTAB_NAME) + len(str(len(strings) + 1)) + 2
+                if literal > reference:
+                    strings.append(text)
+        self._strings = {}
+
+        buf = io.StringIO()
+        if strings:
+            self._encode_strtab(strings, buf)
+        self._strings = {text: i for i, text in enumerate(strings, 1)}
+        buf.write('return ')
+        self._encode(obj, buf, set())
+        buf.write('\n')
+        self._weights = {}
+        return buf.getvalue()
+
+    def _measure(self, obj, counts, refs):
+        tp = type(obj)
+        if tp is str:
+            counts[obj] += 1
+            return 1
+        elif tp in (list, tuple, dict):
+            if _check_ref(obj, refs):
+                return 1
+            weight = 1
+            if tp is dict:
+                for k, v in obj.items():
+                    if is_lua_ident(k):
+                        weight += 1
+                    else:
+                        weight += self._measure(k, counts, refs)
+                    weight += self._measure(v, counts, refs)
+            else:
+                for e in obj:
+                    weight += self._measure(e, counts, refs) + 1
+            self._weights[id(obj)] = weight
+            return weight
+        elif tp in (datetime.date, datetime.datetime):
+            return 7
+        return 1
+
+    def _encode_strtab(self, strings, buf):
+        name = self.STRTAB_NAME
+        buf.write('local {0} = {{}}\n'.format(name))
+        for base in range(0, len(strings), self._chunk_size):
+            chunk = strings[base:base + self._chunk_size]
+            buf.write(';(function()\nlocal s = {')
+            buf.write(','.join('"%s"' % self.escape(text) for text in chunk))
+            buf.write('}\nfor i = 1, #s do %s[%d + i] = s[i] end\nend)()\n' % (name, base))
+
+    def _encode(self, obj, buf, refs, depth=0):
+        tp = type(obj)
+        if tp is str and obj in self._strings:
+            buf.write('%s[%d]' % (self.STRTAB_NAME, self._strings[obj]))
+        elif tp in (list, tuple, dict) \
+                and self._weights.get(id(obj), 0) > self._chunk_size:
+            self._encode_chunked(obj, buf, refs, depth)
+        else:
+            super(LuaModuleEncoder, self)._encode(obj, buf, refs, depth)
+
+    def _iter_fields(self, obj, refs):
+        check_circular = self._check_circular
+        if type(obj) is dict:
+            for k, v in obj.items():
+                if check_circular:
+                    if _check_ref(k, refs) or _check_ref(v, refs):
+                        continue
+                yield k, v
+        else:
+            index = 0
+            for e in obj:
+                if check_circular:
+                    if _check_ref(e, refs):
+                        continue
+                index += 1
+                yield index, e
+
+    def _encode_chunked(self, obj, buf, refs, depth):
+        _check_ref(obj, refs)
+        buf.write('(function()\nlocal t = {}\n')
+        weight = 0
+        for k, v in self._iter_fields(obj, refs):
+            if weight == 0:
+                buf.write(';(function()\n')
+            buf.write('t')
+            if is_lua_ident(k):
+                buf.write('.')
+                buf.write(k)
+            else:
+                buf.write('[')
+                self._encode(k, buf, refs, depth)
+                buf.write(']')
+            buf.write(' = ')
+            self._encode(v, buf, refs, depth)
+            buf.write('\n')
+            child = self._weights.get(id(v), 1)
+            weight += 2 + (child if child <= self._chunk_size else 1)
+            if weight >= self._chunk_size:
+                buf.write('end)()\n')
+                weight = 0
+        if weight > 0:
+            buf.write('end)()\n')
+        buf.write('return t\nend)()')
+
+
+def dumps_module(obj, **kwds):
+    return LuaModuleEncoder(**kwds).encode(obj)
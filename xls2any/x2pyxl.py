@@ -3,16 +3,24 @@
 import re
 import os
 import sys
+import glob
+import hashlib
 import ctypes
+import weakref
+import sqlite3
+import zipfile
 import datetime
 import functools
 import itertools
 import collections
+import concurrent.futures
 from decimal import Decimal
 
 import openpyxl
+from openpyxl.utils import range_boundaries
 
 from . import utils
+from . import xlsxfast
 
 Ctx = utils.Ctx
 
@@ -198,7 +206,7 @@ TOSTRING_TYPES = {
 def xstr(val1):
     conv = TOSTRING_TYPES.get(type(val1))
     if conv is None:
-        Ctx.throw('不能将该类型转化为文本：{0}', tp_val1.__name__)
+        Ctx.throw('不能将该类型转化为文本：{0}', type(val1).__name__)
     return conv(val1)
 
 
@@ -216,7 +224,8 @@ def _cmp_str_str(val1, val2):
     val2 = val2.strip()
     diff = len(val1) - len(val2)
     if diff == 0:
-        return _libc_strcmp(val1, val2)
+        # ctypes passes str as wide chars, strcmp would stop at the first zero byte
+        return _libc_strcmp(val1.encode('utf-8'), val2.encode('utf-8'))
     elif diff < 0:
         return -1
     else:
@@ -324,6 +333,65 @@ def xge_(val1, val2):
     return xcmp_(val1, val2) >= 0
 
 
+XKEY_NUM_TYPES = (int, float, Decimal)
+XKEY_STR_BOOLS = {'TRUE': 1.0, 'FALSE': 0.0}
+XKEY_STR_TIMES = {
+    # length: (separator index, separator, format, type), only as str() spells them
+    8:  (2, ':', '%H:%M:%S', datetime.time),
+    10: (4, '-', '%Y-%m-%d', datetime.date),
+    15: (2, ':', '%H:%M:%S.%f', datetime.time),
+    19: (4, '-', '%Y-%m-%d %H:%M:%S', datetime.datetime),
+    26: (4, '-', '%Y-%m-%d %H:%M:%S.%f', datetime.datetime),
+}
+
+
+def _xkey_str(val1):
+    # numeric text equals the number it spells, as in _cmp_str_num
+    try:
+        return XCMP_ALL_TYPES[int], float(val1)
+    except ValueError:
+        pass
+    # 'TRUE'/'FALSE' equal the bools, as in _cmp_str_bool
+    fit1 = XKEY_STR_BOOLS.get(val1)
+    if fit1 is not None:
+        return XCMP_ALL_TYPES[int], fit1
+    # date text equals the date it spells, as in _cmp_str_date
+    spec = XKEY_STR_TIMES.get(len(val1))
+    if spec is not None and val1[spec[0]] == spec[1]:
+        try:
+            fit1 = datetime.datetime.strptime(val1, spec[2])
+        except ValueError:
+            pass
+        else:
+            if spec[3] is datetime.time:
+                fit1 = fit1.time()
+            elif spec[3] is datetime.date:
+                fit1 = fit1.date()
+            if str(fit1) == val1:
+                return xkey_(fit1)
+    return XCMP_ALL_TYPES[str], val1
+
+
+def xkey_(val1):
+    tp_val1 = type(val1)
+    if tp_val1 is tuple:
+        return tuple(xkey_(x) for x in val1)
+    elif tp_val1 is str:
+        return _xkey_str(val1.strip())
+    elif val1 is None:
+        return XCMP_ALL_TYPES[str], ''
+    elif tp_val1 is datetime.date:
+        return XCMP_ALL_TYPES[datetime.datetime], datetime.datetime.combine(val1, datetime.time())
+    elif tp_val1 in XKEY_NUM_TYPES:
+        return XCMP_ALL_TYPES[int], val1
+    elif tp_val1 is bool:
+        # shares the numeric key so that '1' and 'TRUE' both match True
+        return XCMP_ALL_TYPES[int], float(val1)
+    elif tp_val1 in XCMP_ALL_TYPES:
+        return XCMP_ALL_TYPES[tp_val1], val1
+    Ctx.throw('不支持该类型的比较：{0}', tp_val1.__name__)
+
+
 def xcmp_(val1, val2):
     if val1 is val2:
         return 0
@@ -346,7 +414,7 @@ def xcmp_(val1, val2):
             return _cmp_impl(val1, val2)
         _cmp_impl = XCMP_FIT_TYPES.get((tp_val2, tp_val1))
         if _cmp_impl is not None:
-            return _cmp_impl(val2, val1)
+            return -_cmp_impl(val2, val1)
         if tp_val1 not in XCMP_ALL_TYPES or tp_val2 not in XCMP_ALL_TYPES:
             Ctx.throw('不支持该类型之间的比较：{0} <-> {1}', tp_val1.__name__, tp_val2.__name__)
         return _cmp_num_num(XCMP_ALL_TYPES[tp_val1], XCMP_ALL_TYPES[tp_val2])
@@ -380,6 +448,10 @@ class XlRowView(object):
     def vidx(self):
         return self._vindex
 
+    @property
+    def sheet(self):
+        return self._sheet
+
     def hidx(self, key, multi=False):
         if isinstance(key, int):
             if key <= 0:
@@ -475,6 +547,7 @@ class SheetView(object):
         self._end_row = end_row or self._worksheet.max_row
         self._cur_row = None
         self._caches = {}
+        SHEET_VIEWS.add(self)
 
     def __str__(self):
         return '{0}#{1}'.format(self._filename, self._sheetname)
@@ -498,10 +571,21 @@ class SheetView(object):
             return
         slc_expr, args = parse_range(
             expr, max_col, max_row, self._headers, min_col=self._beg_col)
-        for idx, row in xslice(self._worksheet[slc_expr], self._beg_row, self._end_row):
-            Ctx.set_ctx(str(self), args.voff + idx)
-            self._cur_row = XlRowView(self, row, args.hoff, args.voff + idx)
-            yield self._cur_row
+        memcheck = utils.MemStats.limited()
+        rows = 0
+        try:
+            for idx, row in self._iter_rows(slc_expr, args):
+                if memcheck and idx % MEMCHECK_ROWS == 0:
+                    utils.MemStats.check()
+                rows += 1
+                Ctx.set_ctx(self, args.voff + idx)
+                self._cur_row = XlRowView(self, row, args.hoff, args.voff + idx)
+                yield self._cur_row
+        finally:
+            count_rows(rows, rows * args.hnum)
+
+    def _iter_rows(self, slc_expr, args):
+        return xslice(self._worksheet[slc_expr], self._beg_row, self._end_row)
 
     @property
     def vidx(self):
@@ -596,17 +680,7 @@ class SheetView(object):
         slc_expr, _ = parse_range(
             str(vidx), max_col, max_row, min_col=self._beg_col)
         for head_row in self._worksheet[slc_expr]:
-            headers = {}
-            for col, cell in enumerate(head_row, 1):
-                if xeq_(cell.value, ''):
-                    continue
-                key = str(cell.value).strip()
-                if not key:
-                    continue
-                vals = headers.get(key, [])
-                headers[key] = vals + [col]
-            for key, vals in list(headers.items()):
-                headers.update((val, key) for val in vals)
+            headers = build_headers(cell.value for cell in head_row)
             return type(self)(
                 self._filepath,
                 self._sheetname,
@@ -628,8 +702,85 @@ class SheetView(object):
         slc_expr, args = parse_range(
             expr, max_col, max_row, self._headers, min_col=self._beg_col)
         if slc_expr is not None:
-            for idx, row in xslice(self._worksheet[slc_expr], self._beg_row, self._end_row):
-                yield XlRowView(self, row, args.hoff, args.voff + idx)
+            rows = 0
+            try:
+                for idx, row in self._iter_rows(slc_expr, args):
+                    rows += 1
+                    yield XlRowView(self, row, args.hoff, args.voff + idx)
+            finally:
+                count_rows(rows, rows * args.hnum)
+
+    def _range_offset(self, key, args):
+        if isinstance(key, int) and key > 0:
+            key += args.hoff
+        return self.hidx(key, hoff=args.hoff, hmax=args.hoff + args.hnum) - args.hoff - 1
+
+    def where(self, expr, *conds):
+        max_row = self._worksheet.max_row
+        max_col = self._worksheet.max_column
+        if max_row <= 0 or max_col <= 0:
+            return
+        slc_expr, args = parse_range(
+            expr, max_col, max_row, self._headers, min_col=self._beg_col)
+        tests = [(self._range_offset(key, args), test, vals)
+                 for key, test, vals in parse_where(conds)]
+        memcheck = utils.MemStats.limited()
+        rows = 0
+        try:
+            for idx, row in self._iter_rows(slc_expr, args):
+                if memcheck and idx % MEMCHECK_ROWS == 0:
+                    utils.MemStats.check()
+                rows += 1
+                Ctx.set_ctx(self, args.voff + idx)
+                for offset, test, vals in tests:
+                    if not test(row[offset].value, *vals):
+                        break
+                else:
+                    self._cur_row = XlRowView(self, row, args.hoff, args.voff + idx)
+                    yield self._cur_row
+        finally:
+            count_rows(rows, rows * len(tests))
+
+    def records(self, expr, *keys, as_='tuple', required=False, over=0):
+        if not keys:
+            Ctx.throw('records 至少需要指定一列')
+        if as_ not in RECORD_TYPES:
+            Ctx.throw('不支持的记录类型：{0!r}', as_)
+        max_row = self._worksheet.max_row
+        max_col = self._worksheet.max_column
+        if max_row <= 0 or max_col <= 0:
+            return
+        slc_expr, args = parse_range(
+            expr, max_col, max_row, self._headers, min_col=self._beg_col)
+        offsets = [self._range_offset(key, args) for key in keys]
+        names = [key[1:] if isinstance(key, str) and key.startswith(COLKEY_TOKEN) else str(key)
+                 for key in keys]
+        if as_ == 'dict':
+            make_record = lambda vals: dict(zip(names, vals))
+        elif as_ == 'namedtuple':
+            make_record = collections.namedtuple('Record', names, rename=True)._make
+        else:
+            make_record = tuple
+        memcheck = utils.MemStats.limited()
+        rows = 0
+        blanks = 0
+        try:
+            for idx, row in self._iter_rows(slc_expr, args):
+                if memcheck and idx % MEMCHECK_ROWS == 0:
+                    utils.MemStats.check()
+                rows += 1
+                vals = [row[offset].value for offset in offsets]
+                if required:
+                    if any(xeq_(val, '') for val in vals):
+                        blanks += 1
+                        if 0 < over <= blanks:
+                            break
+                        continue
+                    blanks = 0
+                Ctx.set_ctx(self, args.voff + idx)
+                yield make_record(vals)
+        finally:
+            count_rows(rows, rows * len(offsets))
 
     def locate(self, ltag, htag, loff=1, hoff=-1):
         hbeg, vbeg, hend, vend = None, None, None, None
@@ -660,6 +811,7 @@ class SheetView(object):
 
     @utils.cachedmethod('_caches', '__index:{1}:{2}')
     def __index(self, tab, keys):
+        utils.Stats.add('index.builds')
         index = {}
         for row in self.select(tab):
             ukey = tuple(xstr(x) for x in row.vals(*keys))
@@ -670,6 +822,7 @@ class SheetView(object):
         return {ukey: tuple(vals) for ukey, vals in index.items()}
 
     def findall(self, val1, tab, *keys):
+        utils.Stats.add('findall.lookups')
         if isinstance(val1, (tuple, list)):
             if len(val1) <= 0:
                 Ctx.throw('目标元素个数必须大于零：{0!r}', val1)
@@ -686,6 +839,26 @@ class SheetView(object):
             ukey = (xstr(val1),)
         return self.__index(tab, keys).get(ukey, ())
 
+    def sorted_by(self, tab, *keys, asc=True):
+        if not keys:
+            Ctx.throw('sorted_by 至少需要指定一列')
+        asc = bool(asc)
+        return SortedView(self, tab, keys, asc, self.__sorted(tab, keys, asc))
+
+    @utils.cachedmethod('_caches', 'sorted:{1}:{2}:{3}')
+    def __sorted(self, tab, keys, asc):
+        # rows sorted by a prefix of the keys only need each run of equal
+        # prefix values to be sorted by the remaining keys
+        for num in range(len(keys) - 1, 0, -1):
+            prefix = self._caches.get('sorted:{0}:{1}:{2}'.format(tab, keys[:num], asc))
+            if prefix is not None:
+                utils.Stats.add('sorted.prefix_reuses')
+                rows = []
+                for run in _iter_runs(prefix, keys[:num]):
+                    rows.extend(_sort_rows(run, keys[num:], asc) if len(run) > 1 else run)
+                return tuple(rows)
+        return tuple(_sort_rows(self.select(tab), keys, asc))
+
     def findone(self, val1, tab, *keys):
         for row in self.findall(val1, tab):
             return row
@@ -694,26 +867,522 @@ class SheetView(object):
     def vlookup(self, val1, tab, idx):
         return self.findone(val1, tab).valx(idx)
 
-    def chkuniq(self, tab):
+    def fingerprint(self, tab=RANGE_SEP):
+        return self.__fingerprint(tab)
+
+    @utils.cachedmethod('_caches', 'fingerprint:{1}')
+    def __fingerprint(self, tab):
+        digest = hashlib.sha1(repr(list(self._headers.items())).encode('utf-8'))
+        for row in self._range_rows(tab):
+            digest.update(repr((row.vidx, row.aslist())).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _unique_keys(self):
+        return {}
+
+    def _range_rows(self, tab):
         max_row = self._worksheet.max_row
         max_col = self._worksheet.max_column
         if max_row <= 0 or max_col <= 0:
             return
         slc_expr, args = parse_range(
             tab, max_col, max_row, self._headers, min_col=self._beg_col)
+        for idx, row in self._iter_rows(slc_expr, args):
+            yield XlRowView(self, row, args.hoff, args.voff + idx)
+
+    def _row_ref(self, row):
+        return row.vidx
+
+    def chkuniq(self, tab, hashed=False):
+        max_row = self._worksheet.max_row
+        max_col = self._worksheet.max_column
+        if max_row <= 0 or max_col <= 0:
+            return
+        _, args = parse_range(
+            tab, max_col, max_row, self._headers, min_col=self._beg_col)
         keys = tuple(range(1, args.hnum + 1))
-        iterable = (
-            XlRowView(self, row, args.hoff, args.voff + idx)
-            for idx, row in xslice(self._worksheet[slc_expr], self._beg_row, self._end_row)
-        )
+        iterable = self._range_rows(tab)
+        if hashed:
+            firsts = self._unique_keys()
+            for row in xrequire(iterable, *keys):
+                key = row.vals(*keys)
+                ref = self._row_ref(row)
+                first = firsts.setdefault(xkey_(key), ref)
+                if first != ref:
+                    Ctx.set_ctx(row.sheet, row.vidx)
+                    Ctx.error('指定区域\'{0}\'!{1}含有重复值{2!r}：{3} <-> {4}',
+                              str(self), tab, key, ref, first)
+            return
         for key, group in xgroupby(iterable, *keys):
             first = None
             for row in group:
                 if first is None:
                     first = row
                     continue
+                Ctx.set_ctx(row.sheet, row.vidx)
                 Ctx.error('指定区域\'{0}\'!{1}含有重复值{2!r}：{3} <-> {4}',
-                          str(self), tab, key, row.vidx, first.vidx)
+                          str(self), tab, row.vals(*keys), self._row_ref(row),
+                          self._row_ref(first))
+
+    def chkref(self, tab, keys, other, other_tab, other_keys=None):
+        keys = tuple(keys) if isinstance(keys, (tuple, list)) else (keys,)
+        if other_keys is None:
+            other_keys = keys
+        elif not isinstance(other_keys, (tuple, list)):
+            other_keys = (other_keys,)
+        other_keys = tuple(other_keys)
+        if not keys or len(keys) != len(other_keys):
+            Ctx.throw('源索引列数和目标索引列数不一致：{0!r} <-> {1!r}', keys, other_keys)
+        targets = other.__index(other_tab, other_keys)
+        dangling = []
+        for row in xrequire(self.select(tab), *keys):
+            vals = row.vals(*keys)
+            if tuple(xstr(x) for x in vals) not in targets:
+                dangling.append((row, vals if len(vals) > 1 else vals[0]))
+        if dangling:
+            Ctx.set_ctx(self, dangling[0][0].vidx)
+            Ctx.error('指定区域\'{0}\'!{1}引用了\'{2}\'!{3}中不存在的值，共{4}处：{5}',
+                      str(self), tab, str(other), other_tab, len(dangling),
+                      ', '.join('{0}={1!r}'.format(row.vidx, val) for row, val in dangling))
+        return not dangling
+
+    def _check_chunks(self, tab):
+        yield tuple(self.select(tab))
+
+    def check(self, key, expr, tab=RANGE_SEP, msg=None, **names):
+        global_ = dict(names, __builtins__=utils.CHECK_BUILTINS)
+        try:
+            column_code = utils.compile_check_column(expr)
+            code = utils.compile_check_expr(expr)
+        except (SyntaxError, ValueError):
+            Ctx.error('校验表达式异常 {0} -- {1}', repr(expr), utils.get_pyexc_msg())
+            return False
+        errors = []
+        for rows in self._check_chunks(tab):
+            # blank cells are skipped the same way xrequire does
+            rows = [row for row in rows if not xeq_(row.valx(key), '')]
+            vals = [row.valx(key) for row in rows]
+            try:
+                fails = eval(column_code, dict(global_, __xs__=vals))
+            except Exception:
+                fails = None
+            if fails is None:
+                # one bad cell must not hide the failures of the others
+                fails = []
+                for val in vals:
+                    try:
+                        fails.append(not eval(code, global_, {'x': val}))
+                    except Exception:
+                        fails.append(utils.get_pyexc_msg())
+            errors.extend((row, fail) for row, fail in zip(rows, fails) if fail)
+        if errors:
+            Ctx.set_ctx(errors[0][0].sheet, errors[0][0].vidx)
+            text = (msg or '数值校验不通过 {0}').format(repr(expr))
+            text = text.replace('{', '{{').replace('}', '}}')
+            Ctx.error(text + '，共{0}处：{1}', len(errors), ', '.join(
+                '{0}={1!r}'.format(row.expr(key), row.valx(key))
+                + ('' if fail is True else '（{0}）'.format(fail)) for row, fail in errors))
+        return not errors
+
+
+class StreamSheetView(SheetView):
+
+    def __init__(self, *args, **kwds):
+        super(StreamSheetView, self).__init__(*args, **kwds)
+        self._cursor = [0]
+
+    def _forward(self, vidx):
+        if vidx < self._cursor[0]:
+            Ctx.throw('流式工作表只能向前读取，第{0}行已经读过：{1}', vidx, str(self))
+        self._cursor[0] = vidx
+
+    def _unsupported(self, name):
+        Ctx.throw('流式工作表不支持 {0}：{1}', name, str(self))
+
+    def _forward_row(self, vidx):
+        if isinstance(vidx, str) and VINDEX_REGEX.match(vidx.strip()):
+            vidx = int(vidx.strip())
+        if isinstance(vidx, int) and vidx > 0:
+            self._forward(vidx)
+
+    def _iter_rows(self, slc_expr, args):
+        self._forward(args.voff + max(self._beg_row, 1))
+        # indexing read-only worksheets by range builds a tuple of all rows
+        min_col, min_row, max_col, max_row = range_boundaries(slc_expr)
+        rows = self._worksheet.iter_rows(
+            min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col)
+        for idx, row in xslice(rows, self._beg_row, self._end_row):
+            self._forward(args.voff + idx)
+            yield idx, row
+
+    def _check_chunks(self, tab):
+        chunk = []
+        for row in self.select(tab):
+            chunk.append(row)
+            if len(chunk) >= MEMCHECK_ROWS:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _unique_keys(self):
+        return SpilledKeys()
+
+    def fingerprint(self, tab=RANGE_SEP):
+        # hashing the cells would consume the stream, use the file instead
+        if tab != RANGE_SEP:
+            self._unsupported('fingerprint')
+        digest = hashlib.sha1(_file_fingerprint(self._filepath))
+        digest.update(repr((self._sheetname, list(self._headers.items()), self._beg_col,
+                            self._beg_row, self._end_col, self._end_row)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def rowx(self, vidx=None):
+        self._forward_row(vidx)
+        return super(StreamSheetView, self).rowx(vidx)
+
+    def valx(self, expr):
+        self._forward(self.exprrow(expr))
+        return super(StreamSheetView, self).valx(expr)
+
+    def rehead(self, vidx, *args, **kwds):
+        # header rows are read by a separate pass, they do not move the cursor
+        view = super(StreamSheetView, self).rehead(vidx, *args, **kwds)
+        view._cursor = self._cursor
+        return view
+
+    def select(self, expr):
+        return SheetView.select.__wrapped__(self, expr)
+
+    def chkuniq(self, tab, hashed=True):
+        return super(StreamSheetView, self).chkuniq(tab, hashed=True)
+
+    def findall(self, val1, tab, *keys):
+        self._unsupported('findall')
+
+    def sorted_by(self, tab, *keys, asc=True):
+        self._unsupported('sorted_by')
+
+    def _SheetView__index(self, tab, keys):
+        self._unsupported('findall')
+
+
+FILE_FINGERPRINTS = {}
+
+
+def _file_fingerprint(filepath):
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        Ctx.throw('无法读取目标工作簿：{0}', filepath)
+    key = os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size
+    digest = FILE_FINGERPRINTS.get(key)
+    if digest is None:
+        digest = FILE_FINGERPRINTS[key] = utils.file_digest(filepath) or b''
+    return digest
+
+
+def _spill_key(ukey):
+    tp_ukey = type(ukey)
+    if tp_ukey is tuple:
+        return '(' + ','.join(_spill_key(x) for x in ukey) + ')'
+    if tp_ukey is float and ukey.is_integer():
+        ukey = int(ukey)
+    elif tp_ukey is Decimal:
+        ukey = int(ukey) if ukey == ukey.to_integral_value() else float(ukey)
+    return repr(ukey)
+
+
+class SpilledKeys(object):
+
+    def __init__(self):
+        # an empty name gives a temporary database that is moved to disk
+        # once it outgrows the page cache
+        self._db = sqlite3.connect('')
+        self._db.execute('CREATE TABLE keys (ukey TEXT PRIMARY KEY, val)')
+
+    def setdefault(self, ukey, val):
+        ukey = _spill_key(ukey)
+        cursor = self._db.execute('INSERT OR IGNORE INTO keys VALUES (?, ?)', (ukey, val))
+        if cursor.rowcount:
+            return val
+        return self._db.execute('SELECT val FROM keys WHERE ukey = ?', (ukey,)).fetchone()[0]
+
+    def __del__(self):
+        self._db.close()
+
+
+class UnionSheetView(SheetView):
+
+    def __init__(self, views):
+        # headers and bounds come from the first sheet with any rows
+        base = next((view for view in views if view._worksheet.max_row > 0), views[0])
+        super(UnionSheetView, self).__init__(
+            base._filepath, base._sheetname, base._worksheet, headers=base._headers,
+            beg_col=base._beg_col, beg_row=base._beg_row,
+            end_col=base._end_col, end_row=base._end_row)
+        for view in views:
+            if view._worksheet.max_row > 0 and view._headers != base._headers:
+                Ctx.throw('工作表的表头与{0}不一致：{1}', str(base), str(view))
+        self._views = tuple(views)
+
+    def __str__(self):
+        if len(self._views) == 1:
+            return str(self._views[0])
+        return '{0}等{1}个工作簿#{2}'.format(
+            self._views[0]._filename, len(self._views), self._sheetname)
+
+    @property
+    def views(self):
+        return self._views
+
+    def _unsupported(self, name):
+        Ctx.throw('合并工作表不支持 {0}：{1}', name, str(self))
+
+    def _chain(self, rows_of):
+        # every row keeps its own sheet, so contexts point at the source file
+        for view in self._views:
+            for row in rows_of(view):
+                self._cur_row = row
+                yield row
+
+    def __getitem__(self, expr):
+        return self._chain(lambda view: view[expr])
+
+    def _range_rows(self, tab):
+        return self._chain(lambda view: view._range_rows(tab))
+
+    def _row_ref(self, row):
+        return '{0}:{1}'.format(row.sheet, row.vidx)
+
+    def rowx(self, vidx=None):
+        if vidx is not None:
+            self._unsupported('rowx')
+        return self._cur_row
+
+    def valx(self, expr):
+        self._unsupported('valx')
+
+    def rehead(self, vidx, *args, **kwds):
+        self._unsupported('rehead')
+
+    def locate(self, ltag, htag, loff=1, hoff=-1):
+        self._unsupported('locate')
+
+    def select(self, expr):
+        return self._chain(lambda view: view.select(expr))
+
+    def where(self, expr, *conds):
+        return self._chain(lambda view: view.where(expr, *conds))
+
+    def records(self, expr, *keys, **kwds):
+        for view in self._views:
+            for record in view.records(expr, *keys, **kwds):
+                yield record
+
+    @utils.cachedmethod('_caches', '__index:{1}:{2}')
+    def _SheetView__index(self, tab, keys):
+        index = {}
+        for view in self._views:
+            for ukey, rows in view._SheetView__index(tab, keys).items():
+                index[ukey] = index.get(ukey, ()) + rows
+        return index
+
+    def fingerprint(self, tab=RANGE_SEP):
+        digest = hashlib.sha1()
+        for view in self._views:
+            digest.update(view.fingerprint(tab).encode('ascii'))
+        return digest.hexdigest()
+
+    def chkref(self, tab, keys, other, other_tab, other_keys=None):
+        return all([view.chkref(tab, keys, other, other_tab, other_keys)
+                    for view in self._views])
+
+    def check(self, key, expr, tab=RANGE_SEP, msg=None, **names):
+        return all([view.check(key, expr, tab, msg, **names)
+                    for view in self._views])
+
+
+class SortedView(object):
+
+    def __init__(self, sheet, tab, keys, asc, rows):
+        self._sheet = sheet
+        self._tab = tab
+        self._keys = keys
+        self._asc = asc
+        self._rows = rows
+
+    def __str__(self):
+        return '{0}!{1}'.format(self._sheet, self._tab)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        for row in self._rows:
+            Ctx.set_ctx(row.sheet, row.vidx)
+            self._sheet._cur_row = row
+            yield row
+
+    def __getitem__(self, idx):
+        return self._rows[idx]
+
+    @property
+    def keys(self):
+        return self._keys
+
+    @property
+    def asc(self):
+        return self._asc
+
+    def covers(self, keys, asc=True):
+        return bool(asc) == self._asc and 0 < len(keys) <= len(self._keys) \
+            and tuple(keys) == self._keys[:len(keys)]
+
+    def _bisect(self, ukey, keys, right):
+        sign = 1 if self._asc else -1
+        lo, hi = 0, len(self._rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            res = xcmp_(self._rows[mid].vals(*keys), ukey) * sign
+            if res < 0 or (right and res == 0):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def findall(self, val1, *keys):
+        utils.Stats.add('findall.lookups')
+        ukey = tuple(val1) if isinstance(val1, (tuple, list)) else (val1,)
+        if not ukey:
+            Ctx.throw('目标元素个数必须大于零：{0!r}', val1)
+        if not keys:
+            keys = self._keys[:len(ukey)]
+        if len(keys) != len(ukey):
+            Ctx.throw('目标元素个数和索引列数不一致：{0!r}', keys)
+        if not self.covers(keys, self._asc):
+            Ctx.throw('只能按排序列的前缀查找：{0!r}', keys)
+        lo = self._bisect(ukey, keys, False)
+        hi = self._bisect(ukey, keys, True)
+        return self._rows[lo:hi]
+
+    def findone(self, val1, *keys):
+        for row in self.findall(val1, *keys):
+            return row
+        Ctx.throw('指定区域\'{0}\'找不到对应值{1!r}', str(self), val1)
+
+
+def _sort_rows(rows, keys, asc=True):
+    rows = tuple(rows)
+    vals = [row.vals(*keys) for row in rows]
+    keyfunc = functools.cmp_to_key(xcmp_)
+    order = sorted(range(len(rows)), key=lambda idx: keyfunc(vals[idx]), reverse=not asc)
+    utils.Stats.add('sorted.sorts')
+    return [rows[idx] for idx in order]
+
+
+def _iter_runs(rows, keys):
+    run = []
+    last = None
+    for row in rows:
+        vals = row.vals(*keys)
+        if run and xcmp_(vals, last) != 0:
+            yield run
+            run = []
+        run.append(row)
+        last = vals
+    if run:
+        yield run
+
+
+SHEET_VIEWS = weakref.WeakSet()
+MEMCHECK_ROWS = 4096
+RECORD_TYPES = ('tuple', 'dict', 'namedtuple')
+
+
+def memory_report():
+    report = []
+    views = sorted(SHEET_VIEWS, key=str)
+    # workbook objects may be shared by several views, count them once
+    seen_cells = {id(view) for view in views}
+    for view in views:
+        if id(view._worksheet) in seen_cells:
+            cells = 0
+        else:
+            cells = utils.sizeof(view._worksheet, seen_cells)
+        seen = {id(view), id(view._worksheet)}
+        caches = collections.OrderedDict()
+        for key, val in sorted(view._caches.items()):
+            prefix = key.partition(':')[0]
+            count, size = caches.get(prefix, (0, 0))
+            # cells are owned by the worksheet, only count what the cache adds
+            size += utils.sizeof(val, seen, skip=(xlsxfast.XlCell,))
+            caches[prefix] = (count + 1, size)
+        report.append((str(view), cells, caches))
+    return report
+
+
+def _xin(val1, index):
+    # xkey_ never splits values xeq_ finds equal, but it may join a few
+    # that xeq_ tells apart (1 and 'TRUE'), so candidates are confirmed
+    cands = index.get(xkey_(val1))
+    return cands is not None and any(xeq_(val1, val2) for val2 in cands)
+
+
+def _xin_index(vals):
+    index = {}
+    for val in vals:
+        index.setdefault(xkey_(val), []).append(val)
+    return index
+
+
+def _xne(val1, val2):
+    return not xeq_(val1, val2)
+
+
+def _xbetween(val1, low, high):
+    return xge_(val1, low) and xle_(val1, high)
+
+
+def _xrequired(val1):
+    return not xeq_(val1, '')
+
+
+WHERE_TESTS = {
+    'xeq':          (xeq_, 1),
+    'xne':          (_xne, 1),
+    'xlt':          (xlt_, 1),
+    'xle':          (xle_, 1),
+    'xgt':          (xgt_, 1),
+    'xge':          (xge_, 1),
+    'in':           (_xin, 1),
+    'between':      (_xbetween, 2),
+    'required':     (_xrequired, 0),
+}
+
+
+def parse_where(conds):
+    idx = 0
+    while idx < len(conds):
+        name = conds[idx + 1] if idx + 1 < len(conds) else None
+        if not isinstance(name, str) or name not in WHERE_TESTS:
+            Ctx.throw('错误的过滤条件：{0!r}', conds[idx:idx + 2])
+        key = conds[idx]
+        test, nargs = WHERE_TESTS[name]
+        vals = tuple(conds[idx + 2:idx + 2 + nargs])
+        if len(vals) != nargs:
+            Ctx.throw('过滤条件缺少参数：{0!r}', conds[idx:])
+        if name == 'in':
+            if not hasattr(vals[0], '__iter__') or isinstance(vals[0], str):
+                Ctx.throw('in 条件的参数必须是集合：{0!r}', vals[0])
+            vals = (_xin_index(vals[0]),)
+        yield key, test, vals
+        idx += 2 + nargs
+
+
+def count_rows(rows, cells):
+    utils.Stats.add('rows.yielded', rows)
+    utils.Stats.add('cells.read', cells)
 
 
 def xslice(rows, vbeg=1, vend=sys.maxsize):
@@ -741,31 +1410,427 @@ def xrequire(rows, *keys, over=0):
                 break
 
 
-def xgroupby(rows, *keys, asc=True, required=True):
+def xgroupby(rows, *keys, asc=True, required=True, sort=True):
     if not hasattr(rows, '__iter__'):
         Ctx.throw('xgroupby 的传入参数必须是集合')
+    if sort not in XGROUPBY_SORTS:
+        Ctx.throw('错误的分组排序方式：{0!r}', sort)
+
+    comparisons = [0]
 
     def rowcmp(row1, row2):
+        comparisons[0] += 1
         key1 = tuple(row1.valx(key) for key in keys)
         key2 = tuple(row2.valx(key) for key in keys)
         return xcmp_(key1, key2)
 
     origin_rows = rows if not required else xrequire(rows, *keys)
-    sorted_rows = sorted(origin_rows, key=functools.cmp_to_key(rowcmp), reverse=not asc)
-    for key, group in itertools.groupby(sorted_rows, key=functools.cmp_to_key(rowcmp)):
-        yield key.obj, group
+    try:
+        if sort is not True:
+            groups = list(_bucket_rows(origin_rows, keys).values())
+            if sort == 'keys':
+                groups.sort(key=lambda group: functools.cmp_to_key(rowcmp)(group[0]),
+                            reverse=not asc)
+            for group in groups:
+                yield group[0], iter(group)
+            return
+        if isinstance(rows, SortedView) and rows.covers(keys, asc):
+            sorted_rows = origin_rows
+        else:
+            sorted_rows = sorted(origin_rows, key=functools.cmp_to_key(rowcmp), reverse=not asc)
+            utils.Stats.add('groupby.sorts')
+        for key, group in itertools.groupby(sorted_rows, key=functools.cmp_to_key(rowcmp)):
+            yield key.obj, group
+    finally:
+        utils.Stats.add('groupby.comparisons', comparisons[0])
+
+
+XGROUPBY_SORTS = (True, False, 'keys')
+
+
+def _bucket_rows(rows, keys):
+    buckets = collections.OrderedDict()
+    for row in rows:
+        ukey = xkey_(tuple(row.valx(key) for key in keys))
+        group = buckets.get(ukey)
+        if group is None:
+            group = buckets[ukey] = []
+        group.append(row)
+    utils.Stats.add('groupby.buckets', len(buckets))
+    return buckets
+
+
+def build_headers(values):
+    headers = {}
+    for col, value in enumerate(values, 1):
+        if xeq_(value, ''):
+            continue
+        key = str(value).strip()
+        if not key:
+            continue
+        vals = headers.get(key, [])
+        headers[key] = vals + [col]
+    for key, vals in list(headers.items()):
+        headers.update((val, key) for val in vals)
+    return headers
+
+
+def resolve_columns(columns, headers, max_col, strict=True):
+    result = set()
+    for column in columns:
+        try:
+            if isinstance(column, int):
+                if column <= 0:
+                    Ctx.throw('无法定位指定列：{0!r}', column)
+                result.add(column)
+            elif isinstance(column, (tuple, list)) and len(column) == 2:
+                key, size = column
+                if isinstance(key, str) and COLKEY_REGEX.match(key.strip()):
+                    starts = headers.get(key.strip()[1:], [])
+                    if not starts:
+                        Ctx.throw('无法定位指定列：{0!r}', key)
+                else:
+                    starts = resolve_columns([key], headers, max_col)
+                for start in starts:
+                    result.update(range(start, start + size))
+            elif isinstance(column, str) and COLKEY_REGEX.match(column.strip()):
+                cols = headers.get(column.strip()[1:], [])
+                if not cols:
+                    Ctx.throw('无法定位指定列：{0!r}', column)
+                result.update(cols)
+            elif isinstance(column, str) and CELLX2_REGEX.match(column.strip()):
+                _, args = parse_cell(column, headers)
+                result.add(args.hoff + 1)
+            else:
+                _, args = parse_range(column, max_col, 1, headers)
+                result.update(range(args.hoff + 1, args.hoff + args.hnum + 1))
+        except ValueError:
+            if strict:
+                raise
+    return result
+
+
+def column_selector(columns, strict=True):
+    def select(head_values, max_col):
+        headers = build_headers(head_values)
+        return resolve_columns(columns, headers, max_col, strict=strict)
+    return select
+
+
+def _to_int(value):
+    if isinstance(value, int):
+        return int(value)
+    elif isinstance(value, (float, Decimal)):
+        if value != int(value):
+            raise ValueError(value)
+        return int(value)
+    elif isinstance(value, str):
+        text = value.strip()
+        try:
+            return int(text)
+        except ValueError:
+            return _to_int(float(text))
+    raise TypeError(value)
+
+
+def _to_float(value):
+    if isinstance(value, (int, float, Decimal, str)):
+        return float(value)
+    raise TypeError(value)
+
+
+def _to_num(value):
+    if isinstance(value, bool):
+        return int(value)
+    elif isinstance(value, (int, float)):
+        return value
+    elif isinstance(value, Decimal):
+        return float(value)
+    elif isinstance(value, str):
+        text = value.strip()
+        try:
+            return int(text)
+        except ValueError:
+            return float(text)
+    raise TypeError(value)
+
+
+def _to_bool(value):
+    if isinstance(value, (int, float, Decimal)):
+        return bool(value)
+    elif isinstance(value, str):
+        text = value.strip().upper()
+        if text in ('TRUE', '1'):
+            return True
+        elif text in ('FALSE', '0'):
+            return False
+        raise ValueError(value)
+    raise TypeError(value)
+
+
+DATE_FORMATS = ('%Y-%m-%d',)
+DATETIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M', '%Y-%m-%d',
+)
+
+
+def _parse_datetime(text, formats):
+    # strptime instead of fromisoformat, which python 3.6 lacks
+    text = text.strip()
+    for fmt in formats:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    raise ValueError(text)
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    elif isinstance(value, datetime.date):
+        return value
+    elif isinstance(value, str):
+        return _parse_datetime(value, DATE_FORMATS).date()
+    raise TypeError(value)
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    elif isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    elif isinstance(value, str):
+        return _parse_datetime(value, DATETIME_FORMATS)
+    raise TypeError(value)
+
+
+SCHEMA_TYPES = {
+    'int':          _to_int,
+    'float':        _to_float,
+    'num':          _to_num,
+    'str':          xstr,
+    'bool':         _to_bool,
+    'date':         _to_date,
+    'datetime':     _to_datetime,
+}
 
 
-def load_worksheet(filepath, sheetname, head=0):
+def _is_blank(value):
+    return isinstance(value, str) and not value.strip()
+
+
+def apply_schema(ws, schema, head=0, context=None):
+    max_col = ws.max_column
+    headers = build_headers(cell.value for cell in ws[str(head)]) \
+        if 0 < head <= ws.max_row else {}
+    min_row = head + 1
+    if isinstance(schema, dict):
+        types = []
+        for column, type_name in schema.items():
+            for hidx in sorted(resolve_columns([column], headers, max_col)):
+                types.append((hidx, type_name))
+    else:
+        if isinstance(schema, str) and VINDEX_REGEX.match(schema.strip()):
+            schema = int(schema.strip())
+        if not isinstance(schema, int) or schema <= 0:
+            Ctx.throw('错误的类型定义：{0!r}', schema)
+        types = [
+            (hidx, str(cell.value).strip())
+            for hidx, cell in enumerate(ws[str(schema)], 1)
+            if not xeq_(cell.value, '')
+        ]
+        min_row = max(min_row, schema + 1)
+
+    for hidx, type_name in types:
+        convert = SCHEMA_TYPES.get(type_name)
+        if convert is None:
+            Ctx.throw('不支持的列类型：{0!r}', type_name)
+        failures = ws.convert_column(hidx, convert, min_row, skip=_is_blank)
+        if failures:
+            Ctx.set_ctx(context or ws.title, failures[0][0])
+            Ctx.error('列{0}的值无法转换为{1}类型，共{2}处：{3}',
+                      build_column(hidx), type_name, len(failures),
+                      ', '.join('{0}={1!r}'.format(cell_expr(hidx, vidx), value)
+                                for vidx, value in failures))
+
+
+AUTO_COLUMNS = None
+
+
+def set_auto_columns(columns):
+    global AUTO_COLUMNS
+    AUTO_COLUMNS = columns
+
+
+def _open_openpyxl(filepath, sheetname, head=0, select=None, trim=False):
+    wb = openpyxl.load_workbook(filepath, data_only=True, read_only=True)
+    utils.Stats.add('workbooks.opened')
+    ws = wb[sheetname]
+    if ws.max_row is None or ws.max_column is None:
+        # files written without a dimension record, scanned once without keeping rows
+        ws.calculate_dimension(force=True)
+    if select is not None or trim:
+        ws = xlsxfast.FastWorksheet.from_worksheet(ws, head, select, trim)
+    return ws
+
+
+READER_ENGINES = {
+    'openpyxl':     _open_openpyxl,
+    'fast':         xlsxfast.open_worksheet,
+}
+
+
+PRELOADED_SHEETS = {}
+LOADED_SHEETS = None
+LOADED_SHEETS_MAX = 32
+
+
+def keep_worksheets(flag=True, maxsize=LOADED_SHEETS_MAX):
+    global LOADED_SHEETS
+    LOADED_SHEETS = utils.LRUCache(maxsize) if flag else None
+
+
+def _loaded_key(filepath, sheetname, head, engine, columns, trim):
     try:
-        wb = openpyxl.load_workbook(filepath, data_only=True, read_only=True)
-        ws = wb[sheetname]
-    except IOError:
-        Ctx.abort('无法打开目标工作簿：{0}', filepath)
-    except KeyError:
-        Ctx.abort('无法打开目标工作表：{0}#{1}', filepath, sheetname)
-
-    sheet_view = SheetView(filepath, sheetname, ws)
-    if 0 < head <= ws.max_row:
-        sheet_view = sheet_view.rehead(head)
-    return sheet_view
+        stat = os.stat(filepath)
+    except OSError:
+        return None, None
+    key = (os.path.abspath(filepath), sheetname, head, engine, repr(columns), trim)
+    return key, (stat.st_mtime_ns, stat.st_size)
+
+
+def _preload_key(filepath, sheetname, engine):
+    return os.path.abspath(filepath), sheetname, engine
+
+
+def _preload_worksheet(filepath, sheetname, engine):
+    counters = utils.Stats.counters()
+    try:
+        ws = READER_ENGINES[engine](filepath, sheetname)
+    except Exception:
+        return None, utils.Stats.since(counters)
+    if not isinstance(ws, xlsxfast.FastWorksheet):
+        ws = xlsxfast.FastWorksheet.from_worksheet(ws)
+    return ws, utils.Stats.since(counters)
+
+
+def preload_worksheets(entries, jobs=None):
+    pending = []
+    for filepath, sheetname, engine in entries:
+        key = _preload_key(filepath, sheetname, engine)
+        if engine not in READER_ENGINES or key in PRELOADED_SHEETS or key in pending:
+            continue
+        pending.append(key)
+    if not pending:
+        return
+    Ctx.debug('预加载{0}个工作表', len(pending))
+    if jobs == 1 or len(pending) == 1:
+        results = [_preload_worksheet(*key)[0] for key in pending]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            results = []
+            for ws, counters in executor.map(_preload_worksheet, *zip(*pending)):
+                utils.Stats.merge(counters)
+                results.append(ws)
+    for key, ws in zip(pending, results):
+        if ws is not None:
+            utils.Stats.add('sheets.preloaded')
+            PRELOADED_SHEETS[key] = ws
+            Ctx.debug('已预加载工作表：{0}#{1}', key[0], key[1])
+
+
+def load_worksheet(filepath, sheetname, head=0, engine='openpyxl', columns=None, schema=None,
+                   trim=False, stream=False):
+    open_worksheet = READER_ENGINES.get(engine)
+    if open_worksheet is None:
+        Ctx.throw('不支持的读取引擎：{0!r}', engine)
+    if stream:
+        # only openpyxl reads rows lazily, everything else builds the whole sheet
+        if engine != 'openpyxl':
+            Ctx.throw('流式加载只支持 openpyxl 引擎：{0!r}', engine)
+        if (columns is not None and columns != 'auto') or schema is not None or trim:
+            Ctx.throw('流式加载不能同时使用 columns、schema 或 trim 参数')
+        columns = None
+    if columns == 'auto':
+        select = None if AUTO_COLUMNS is None \
+            else column_selector(AUTO_COLUMNS, strict=False)
+    elif columns is not None:
+        if not isinstance(columns, (tuple, list)):
+            Ctx.throw('列投影参数必须是列表：{0!r}', columns)
+        select = column_selector(columns)
+    else:
+        select = None
+    # loading messages name the sheet, the caller's context is restored afterwards
+    saved_ctx = Ctx.get_ctx()
+    Ctx.set_ctx('{0}#{1}'.format(os.path.basename(filepath), sheetname), None)
+    try:
+        loaded_key = loaded_stamp = None
+        # schema conversion errors have to be reported on every run
+        if LOADED_SHEETS is not None and schema is None and not stream:
+            loaded_key, loaded_stamp = _loaded_key(
+                filepath, sheetname, head, engine,
+                AUTO_COLUMNS if columns == 'auto' else columns, trim)
+            loaded = LOADED_SHEETS.get(loaded_key)
+            if loaded is not None and loaded[0] == loaded_stamp:
+                utils.Stats.add('sheets.reused')
+                return loaded[1]
+            elif loaded is not None:
+                # the file changed, free the old sheet before loading the new one
+                LOADED_SHEETS.pop(loaded_key)
+        try:
+            preload_key = _preload_key(filepath, sheetname, engine)
+            if stream or select is not None:
+                # preloaded sheets hold every column
+                ws = None
+            elif schema is None and not trim:
+                ws = PRELOADED_SHEETS.get(preload_key)
+            else:
+                # converted cells and trimmed bounds must not leak into other
+                # views of the sheet
+                ws = PRELOADED_SHEETS.pop(preload_key, None)
+                if ws is not None and trim:
+                    ws.trim()
+            if ws is None:
+                ws = open_worksheet(filepath, sheetname, head, select, trim)
+        except (IOError, zipfile.BadZipFile):
+            Ctx.abort('无法打开目标工作簿：{0}', filepath)
+        except KeyError:
+            Ctx.abort('无法打开目标工作表：{0}#{1}', filepath, sheetname)
+
+        if schema is not None and not isinstance(ws, xlsxfast.FastWorksheet):
+            ws = xlsxfast.FastWorksheet.from_worksheet(ws)
+        utils.Stats.add('sheets.loaded')
+        view_type = StreamSheetView if stream else SheetView
+        sheet_view = view_type(filepath, sheetname, ws)
+        if 0 < head <= ws.max_row:
+            sheet_view = sheet_view.rehead(head)
+        if schema is not None:
+            apply_schema(ws, schema, head, context=sheet_view)
+        if loaded_key is not None:
+            LOADED_SHEETS[loaded_key] = (loaded_stamp, sheet_view)
+        return sheet_view
+    finally:
+        Ctx.set_ctx(*saved_ctx)
+
+
+def load_worksheets(filepaths, sheetname, head=0, engine='openpyxl', jobs=None):
+    if isinstance(filepaths, str):
+        pattern = filepaths
+        filepaths = sorted(glob.glob(pattern))
+        if not filepaths:
+            Ctx.throw('没有匹配的工作簿：{0}', pattern)
+    elif not isinstance(filepaths, (tuple, list)) or not filepaths:
+        Ctx.throw('工作簿列表不能为空：{0!r}', filepaths)
+    entries = []
+    for filepath in filepaths:
+        if LOADED_SHEETS is not None:
+            loaded_key, loaded_stamp = _loaded_key(filepath, sheetname, head, engine, None, False)
+            loaded = LOADED_SHEETS.get(loaded_key)
+            if loaded is not None and loaded[0] == loaded_stamp:
+                continue
+        entries.append((filepath, sheetname, engine))
+    preload_worksheets(entries, jobs=jobs)
+    return UnionSheetView([
+        load_worksheet(filepath, sheetname, head, engine) for filepath in filepaths])
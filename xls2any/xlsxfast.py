@@ -0,0 +1,713 @@
+# -*- coding: utf-8 -*-
+
+import gc
+import re
+import zipfile
+import datetime
+import posixpath
+from xml.etree import ElementTree
+
+from . import utils
+
+Ctx = utils.Ctx
+
+
+NS_MAIN = (
+    'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'http://purl.oclc.org/ooxml/spreadsheetml/main',
+)
+NS_RELS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+NS_DOCREL = (
+    'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'http://purl.oclc.org/ooxml/officeDocument/relationships',
+)
+
+CELLREF_REGEX = \
+    re.compile(r'^([A-Z]+)([1-9][0-9]*)$', re.IGNORECASE)
+COLUMN_REGEX = \
+    re.compile(r'^([A-Z]+)$', re.IGNORECASE)
+VINDEX_REGEX = \
+    re.compile(r'^([1-9][0-9]*)$')
+DIMENSION_REGEX = \
+    re.compile(r'^\$?([A-Z]+)?\$?([1-9][0-9]*)?(?::\$?([A-Z]+)?\$?([1-9][0-9]*)?)?$', re.IGNORECASE)
+NUMFMT_STRIP_REGEX = \
+    re.compile(r'".*?"|\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]')
+NUMFMT_DATE_REGEX = \
+    re.compile(r'(?<![_\\])[dmhysDMHYS]')
+
+CELL_TAG_REGEX = \
+    re.compile(
+        r'<c r="([A-Z]+)([0-9]+)"([^>]*?)(?:/>|>'
+        r'(?:<f\b[^>]*?(?:/>|>[^<]*</f>))?(?:<v>([^<]*)</v>)?(?:<is>(.*?)</is>)?</c>)',
+        re.DOTALL)
+DIMENSION_TAG_REGEX = \
+    re.compile(r'<dimension\s+ref="([^"]*)"')
+ATTR_REGEX = \
+    re.compile(r'([a-zA-Z]+)="([^"]*)"')
+TEXT_TAG_REGEX = \
+    re.compile(r'<t\b[^>]*>([^<]*)</t>')
+PHONETIC_REGEX = \
+    re.compile(r'<rPh\b.*?</rPh>', re.DOTALL)
+XML_REF_REGEX = \
+    re.compile(r'&(?:#([0-9]+)|#x([0-9a-fA-F]+)|([a-zA-Z]+));')
+
+XML_ENTITIES = {'amp': '&', 'lt': '<', 'gt': '>', 'quot': '"', 'apos': "'"}
+
+BUILTIN_DATE_FORMATS = frozenset(
+    list(range(14, 23)) + list(range(27, 37)) +
+    list(range(45, 48)) + list(range(50, 59))
+)
+
+WINDOWS_EPOCH = datetime.datetime(1899, 12, 30)
+MAC_EPOCH = datetime.datetime(1904, 1, 1)
+SECS_PER_DAY = 86400
+SPARSE_ROWS = 1000
+SPARSE_COLUMNS = 100
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class XlCell(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def __repr__(self):
+        return '<XlCell {0!r}>'.format(self.value)
+
+
+EMPTY_CELL = XlCell()
+
+
+def build_column(col):
+    digits = []
+    while col > 0:
+        digits.append(chr((col - 1) % 26 + 65))
+        col = (col - 1) // 26
+    return ''.join(reversed(digits))
+
+
+def parse_column(letters):
+    col = 0
+    for ich in letters.upper():
+        col = col * 26 + ord(ich) - 64
+    return col
+
+
+def is_date_format(fmt):
+    if not fmt:
+        return False
+    fmt = NUMFMT_STRIP_REGEX.sub('', fmt.split(';')[0])
+    return NUMFMT_DATE_REGEX.search(fmt) is not None
+
+
+def from_excel(value, epoch=WINDOWS_EPOCH):
+    day, fraction = divmod(value, 1)
+    diff = datetime.timedelta(milliseconds=round(fraction * SECS_PER_DAY * 1000))
+    if 0 <= value < 1 and diff.days == 0:
+        return (datetime.datetime.min + diff).time()
+    if 0 < value < 60 and epoch is WINDOWS_EPOCH:
+        day += 1
+    return epoch + datetime.timedelta(days=day) + diff
+
+
+class _FallbackError(Exception):
+    pass
+
+
+def _parse_attrs(attrs, date_styles):
+    ctype = 'n'
+    is_date = False
+    for name, value in ATTR_REGEX.findall(attrs):
+        if name == 't':
+            ctype = value
+        elif name == 's':
+            is_date = int(value) in date_styles
+    return ctype, is_date and ctype == 'n'
+
+
+def _xml_ref(matches):
+    dec, hexa, name = matches.groups()
+    if name is not None:
+        text = XML_ENTITIES.get(name)
+        if text is None:
+            raise _FallbackError()
+        return text
+    code = int(dec) if dec is not None else int(hexa, 16)
+    if code > 0x10ffff:
+        raise _FallbackError()
+    return chr(code)
+
+
+def _unescape(text):
+    # line ends are normalized before references are resolved, as the
+    # xml parser does, so that '&#13;' survives as a carriage return
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return XML_REF_REGEX.sub(_xml_ref, text) if '&' in text else text
+
+
+def _inline_text(inline):
+    if '<rPh' in inline:
+        inline = PHONETIC_REGEX.sub('', inline)
+    return _unescape(''.join(TEXT_TAG_REGEX.findall(inline)))
+
+
+def _convert_text(ctype, text):
+    if ctype == 'b':
+        return text.strip() in ('1', 'true')
+    elif ctype == 'd':
+        return _parse_isodate(text)
+    return text
+
+
+def _local(tag):
+    return tag.rpartition('}')[2]
+
+
+def _iter_text(elem, ns):
+    # rich text runs are concatenated, phonetic runs are skipped
+    tag_t = '{%s}t' % ns
+    tag_rph = '{%s}rPh' % ns
+    for child in elem:
+        if child.tag == tag_t:
+            yield child.text or ''
+        elif child.tag != tag_rph:
+            for sub in child.iter(tag_t):
+                yield sub.text or ''
+
+
+class FastWorkbook(object):
+
+    def __init__(self, filepath):
+        self._filepath = filepath
+        self._archive = zipfile.ZipFile(filepath)
+        utils.Stats.add('workbooks.opened')
+        self._ns = NS_MAIN[0]
+        self._sheets = {}
+        self._epoch = WINDOWS_EPOCH
+        self._strings = None
+        self._strings_path = 'xl/sharedStrings.xml'
+        self._styles_path = 'xl/styles.xml'
+        self._date_styles = None
+        self._load_workbook()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def sheetnames(self):
+        return list(self._sheets)
+
+    def close(self):
+        self._archive.close()
+
+    def _read_xml(self, path):
+        with self._archive.open(path) as fp:
+            return ElementTree.parse(fp).getroot()
+
+    def _load_workbook(self):
+        root = self._read_xml('xl/workbook.xml')
+        ns = root.tag[1:].partition('}')[0]
+        self._ns = ns
+        targets = {}
+        try:
+            rels = self._read_xml('xl/_rels/workbook.xml.rels')
+        except KeyError:
+            rels = None
+        if rels is not None:
+            for rel in rels.iter('{%s}Relationship' % NS_RELS):
+                target = rel.get('Target', '')
+                if target.startswith('/'):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join('xl', target))
+                targets[rel.get('Id')] = target
+                rel_type = rel.get('Type', '')
+                if rel_type.endswith('/sharedStrings'):
+                    self._strings_path = target
+                elif rel_type.endswith('/styles'):
+                    self._styles_path = target
+        props = root.find('{%s}workbookPr' % ns)
+        if props is not None and props.get('date1904') in ('1', 'true'):
+            self._epoch = MAC_EPOCH
+        sheets = root.find('{%s}sheets' % ns)
+        for idx, sheet in enumerate(sheets if sheets is not None else (), 1):
+            rid = None
+            for docrel in NS_DOCREL:
+                rid = sheet.get('{%s}id' % docrel)
+                if rid:
+                    break
+            path = targets.get(rid, 'xl/worksheets/sheet%d.xml' % idx)
+            self._sheets[sheet.get('name')] = path
+
+    @property
+    def strings(self):
+        if self._strings is None:
+            strings = []
+            try:
+                fp = self._archive.open(self._strings_path)
+            except KeyError:
+                fp = None
+            if fp is not None:
+                with fp:
+                    tag_si = '{%s}si' % self._ns
+                    for _, elem in ElementTree.iterparse(fp):
+                        if elem.tag == tag_si:
+                            strings.append(''.join(_iter_text(elem, self._ns)))
+                            elem.clear()
+            self._strings = strings
+        return self._strings
+
+    @property
+    def date_styles(self):
+        if self._date_styles is None:
+            date_styles = set()
+            try:
+                root = self._read_xml(self._styles_path)
+            except KeyError:
+                root = None
+            if root is not None:
+                ns = self._ns
+                formats = {}
+                numfmts = root.find('{%s}numFmts' % ns)
+                for numfmt in numfmts if numfmts is not None else ():
+                    formats[int(numfmt.get('numFmtId'))] = numfmt.get('formatCode')
+                cellxfs = root.find('{%s}cellXfs' % ns)
+                for idx, xf in enumerate(cellxfs if cellxfs is not None else ()):
+                    fmt_id = int(xf.get('numFmtId', 0))
+                    if fmt_id in formats:
+                        if is_date_format(formats[fmt_id]):
+                            date_styles.add(idx)
+                    elif fmt_id in BUILTIN_DATE_FORMATS:
+                        date_styles.add(idx)
+            self._date_styles = date_styles
+        return self._date_styles
+
+    def __getitem__(self, sheetname):
+        return self.get_sheet(sheetname)
+
+    def get_sheet(self, sheetname, head=0, select=None, trim=False):
+        if sheetname not in self._sheets:
+            raise KeyError(sheetname)
+        return FastWorksheet.from_workbook(
+            self, sheetname, self._sheets[sheetname], head, select, trim)
+
+
+class FastWorksheet(object):
+
+    def __init__(self, title):
+        self.title = title
+        self._rows = []
+        self._max_row = 0
+        self._max_column = 0
+        self._dimension = None
+        self._columns = None
+        self._data_row = 0
+        self._data_column = 0
+
+    @classmethod
+    def from_workbook(cls, workbook, title, path, head=0, select=None, trim=False):
+        sheet = cls(title)
+        sheet._load(workbook, path, head, select, trim)
+        return sheet
+
+    @classmethod
+    def from_worksheet(cls, worksheet, head=0, select=None, trim=False):
+        sheet = cls(worksheet.title)
+        sheet._dimension = 'A1:%s%s' % (
+            build_column(max(worksheet.max_column or 0, 1)),
+            max(worksheet.max_row or 0, 1))
+        if trim and hasattr(worksheet, 'reset_dimensions'):
+            # stop openpyxl from padding rows and columns up to the
+            # declared dimension, only cells present in the file are read
+            worksheet.reset_dimensions()
+        data_row = 0
+        data_col = 0
+        keep = None
+        for vidx, row in enumerate(worksheet.iter_rows(), 1):
+            if select is not None and keep is None and vidx > head:
+                keep = sheet._select_columns(head, select)
+            values = [
+                EMPTY_CELL if cell.value is None or (keep is not None and hidx not in keep)
+                else XlCell(cell.value)
+                for hidx, cell in enumerate(row, 1)
+            ]
+            while values and values[-1] is EMPTY_CELL:
+                values.pop()
+            if values:
+                sheet._store_row(vidx, values)
+                data_row = vidx
+                data_col = max(data_col, len(values))
+        sheet._set_bounds(data_row, data_col, trim)
+        return sheet
+
+    def __getstate__(self):
+        # plain value rows pickle much faster than slotted cells, this
+        # keeps handing sheets over from worker processes cheap
+        state = self.__dict__.copy()
+        state['_rows'] = [
+            [cell.value for cell in values] if values else None
+            for values in self._rows
+        ]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._rows = [
+                [EMPTY_CELL if value is None else XlCell(value) for value in values]
+                if values else None
+                for values in self._rows
+            ]
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    @property
+    def max_row(self):
+        return self._max_row
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @property
+    def max_column(self):
+        return self._max_column
+
+    @property
+    def data_row(self):
+        return self._data_row
+
+    @property
+    def data_column(self):
+        return self._data_column
+
+    def trim(self):
+        self._max_row = self._data_row
+        self._max_column = self._data_column
+
+    def _load(self, workbook, path, head=0, select=None, trim=False):
+        # the loaders only allocate long-lived cells, pausing the cyclic
+        # collector avoids rescanning them over and over while loading
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with workbook._archive.open(path) as fp:
+                try:
+                    data_row, data_col = self._load_regex(workbook, fp, head, select)
+                except _FallbackError:
+                    data_row, data_col = None, None
+            if data_row is None:
+                del self._rows[:]
+                with workbook._archive.open(path) as fp:
+                    data_row, data_col = self._load_tree(workbook, fp, head, select)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self._set_bounds(data_row, data_col, trim)
+
+    def _set_bounds(self, data_row, data_col, trim=False):
+        self._data_row = data_row
+        self._data_column = data_col
+        max_row, max_col = self._calc_bounds(self._dimension, data_row, data_col)
+        if max_row > max(data_row * 2, data_row + SPARSE_ROWS) \
+                or max_col > max(data_col * 2, data_col + SPARSE_COLUMNS):
+            Ctx.warn('工作表{0!r}声明的范围{1}远大于实际数据范围A1:{2}{3}',
+                     self.title, self._dimension, build_column(max(data_col, 1)), max(data_row, 1))
+        if trim:
+            max_row, max_col = data_row, data_col
+        self._max_row = max_row
+        self._max_column = max_col
+
+    def _select_columns(self, head, select):
+        values = self._rows[head - 1] if 0 < head <= len(self._rows) else None
+        values = [cell.value for cell in values] if values else []
+        _, max_col = self._calc_bounds(self._dimension, 0, len(values))
+        self._columns = frozenset(select(values, max_col))
+        return self._columns
+
+    def _store_row(self, vidx, values):
+        rows = self._rows
+        if vidx > len(rows):
+            rows.extend([None] * (vidx - len(rows)))
+        rows[vidx - 1] = values
+
+    def _load_regex(self, workbook, fp, head=0, select=None):
+        # fast path for the canonical cell layout written by Excel and
+        # most libraries, any block it can not fully account for falls
+        # back to the element tree parser
+        strings = None
+        date_styles = workbook.date_styles
+        epoch = workbook._epoch
+        colcache = {}
+        attrcache = {}
+        data_row = 0
+        data_col = 0
+        cur_row = None
+        vidx = 0
+        values = None
+        header = True
+        buf = b''
+        keep = None
+
+        while True:
+            chunk = fp.read(CHUNK_SIZE)
+            buf += chunk
+            if chunk:
+                cut = buf.rfind(b'</row>')
+                if cut < 0:
+                    continue
+                cut += len(b'</row>')
+                block, buf = buf[:cut], buf[cut:]
+            else:
+                block, buf = buf, b''
+            try:
+                block = block.decode('utf-8')
+            except UnicodeDecodeError:
+                raise _FallbackError()
+            if header:
+                header = False
+                start = block.find('<sheetData')
+                if start < 0:
+                    if not block.strip():
+                        break
+                    raise _FallbackError()
+                matches = DIMENSION_TAG_REGEX.search(block, 0, start)
+                if matches:
+                    self._dimension = matches.group(1)
+            expected = block.count('<c ') + block.count('<c>') + block.count('<c/>')
+            matched = CELL_TAG_REGEX.findall(block)
+            if len(matched) != expected:
+                raise _FallbackError()
+
+            for letters, rref, attrs, text, inline in matched:
+                if rref is not cur_row and rref != cur_row:
+                    if values:
+                        self._store_row(vidx, values)
+                        data_row = max(data_row, vidx)
+                        data_col = max(data_col, len(values))
+                    cur_row = rref
+                    vidx = int(rref)
+                    values = []
+                    if select is not None and keep is None and vidx > head:
+                        keep = self._select_columns(head, select)
+                hidx = colcache.get(letters)
+                if hidx is None:
+                    hidx = colcache[letters] = parse_column(letters)
+                if keep is not None and hidx not in keep:
+                    continue
+                spec = attrcache.get(attrs)
+                if spec is None:
+                    spec = attrcache[attrs] = _parse_attrs(attrs, date_styles)
+                ctype, is_date = spec
+                if inline:
+                    value = _inline_text(inline)
+                elif not text:
+                    continue
+                elif ctype == 'n':
+                    if '.' in text or 'E' in text or 'e' in text:
+                        value = float(text)
+                    else:
+                        value = int(text)
+                    if is_date:
+                        value = from_excel(value, epoch)
+                elif ctype == 's':
+                    if strings is None:
+                        strings = workbook.strings
+                    value = strings[int(text)]
+                else:
+                    value = _convert_text(ctype, _unescape(text))
+                if hidx == len(values) + 1:
+                    values.append(XlCell(value))
+                elif hidx > len(values):
+                    values.extend([EMPTY_CELL] * (hidx - len(values) - 1))
+                    values.append(XlCell(value))
+                else:
+                    values[hidx - 1] = XlCell(value)
+            if not chunk:
+                break
+
+        if values:
+            self._store_row(vidx, values)
+            data_row = max(data_row, vidx)
+            data_col = max(data_col, len(values))
+        return data_row, data_col
+
+    def _load_tree(self, workbook, fp, head=0, select=None):
+        ns = workbook._ns
+        tag_dim = '{%s}dimension' % ns
+        tag_row = '{%s}row' % ns
+        tag_v = '{%s}v' % ns
+        tag_is = '{%s}is' % ns
+        strings = None
+        date_styles = workbook.date_styles
+        epoch = workbook._epoch
+        colcache = {}
+        data_row = 0
+        data_col = 0
+        sheet_data = None
+        keep = None
+
+        for event, elem in ElementTree.iterparse(fp, events=('start', 'end')):
+            if event == 'start':
+                if sheet_data is None and _local(elem.tag) == 'sheetData':
+                    sheet_data = elem
+                continue
+            tag = elem.tag
+            if tag == tag_dim:
+                self._dimension = elem.get('ref')
+                continue
+            if tag != tag_row:
+                continue
+
+            rref = elem.get('r')
+            vidx = int(rref) if rref else data_row + 1
+            values = []
+            if select is not None and keep is None and vidx > head:
+                keep = self._select_columns(head, select)
+            hidx = 0
+            for cell in elem:
+                cref = cell.get('r')
+                if cref:
+                    letters = cref.rstrip('0123456789')
+                    col = colcache.get(letters)
+                    if col is None:
+                        col = colcache[letters] = parse_column(letters)
+                    hidx = col
+                else:
+                    hidx += 1
+                if keep is not None and hidx not in keep:
+                    continue
+                ctype = cell.get('t', 'n')
+                if ctype == 'inlineStr':
+                    inline = cell.find(tag_is)
+                    value = ''.join(_iter_text(inline, ns)) if inline is not None else None
+                else:
+                    velem = cell.find(tag_v)
+                    text = velem.text if velem is not None else None
+                    if text is None:
+                        value = None
+                    elif ctype == 'n':
+                        if '.' in text or 'E' in text or 'e' in text:
+                            value = float(text)
+                        else:
+                            value = int(text)
+                        style = cell.get('s')
+                        if style is not None and int(style) in date_styles:
+                            value = from_excel(value, epoch)
+                    elif ctype == 's':
+                        if strings is None:
+                            strings = workbook.strings
+                        value = strings[int(text)]
+                    else:
+                        value = _convert_text(ctype, text)
+                if value is None:
+                    continue
+                if hidx > len(values):
+                    values.extend([EMPTY_CELL] * (hidx - len(values) - 1))
+                    values.append(XlCell(value))
+                else:
+                    values[hidx - 1] = XlCell(value)
+            if values:
+                self._store_row(vidx, values)
+                data_row = max(data_row, vidx)
+                data_col = max(data_col, len(values))
+            elem.clear()
+            if sheet_data is not None:
+                sheet_data.clear()
+        return data_row, data_col
+
+    @staticmethod
+    def _calc_bounds(dimension, data_row, data_col):
+        max_row, max_col = data_row, data_col
+        matches = DIMENSION_REGEX.match(dimension or '')
+        if matches:
+            hcol = matches.group(3) or matches.group(1)
+            hrow = matches.group(4) or matches.group(2)
+            if hcol:
+                max_col = max(max_col, parse_column(hcol))
+            if hrow:
+                max_row = max(max_row, int(hrow))
+        return max_row, max_col
+
+    def convert_column(self, hidx, convert, min_row=1, skip=None):
+        failures = []
+        for vidx in range(min_row, len(self._rows) + 1):
+            values = self._rows[vidx - 1]
+            if not values or hidx > len(values):
+                continue
+            cell = values[hidx - 1]
+            if cell.value is None or (skip is not None and skip(cell.value)):
+                continue
+            try:
+                cell.value = convert(cell.value)
+            except (TypeError, ValueError, AttributeError, ArithmeticError):
+                failures.append((vidx, cell.value))
+        return failures
+
+    def _row(self, vidx, lcol, hcol):
+        values = self._rows[vidx - 1] if vidx <= len(self._rows) else None
+        if not values:
+            return (EMPTY_CELL,) * (hcol - lcol + 1)
+        cells = values[lcol - 1:hcol]
+        if len(cells) < hcol - lcol + 1:
+            cells = cells + [EMPTY_CELL] * (hcol - lcol + 1 - len(cells))
+        return tuple(cells)
+
+    def iter_rows(self, min_row=None, max_row=None, min_col=None, max_col=None):
+        lrow = min_row or 1
+        hrow = max_row or self._max_row
+        lcol = min_col or 1
+        hcol = max_col or self._max_column
+        for vidx in range(lrow, hrow + 1):
+            yield self._row(vidx, lcol, hcol)
+
+    def cell(self, row, column):
+        values = self._rows[row - 1] if row <= len(self._rows) else None
+        if values and column <= len(values):
+            return values[column - 1]
+        return EMPTY_CELL
+
+    def __getitem__(self, key):
+        key = str(key).strip().replace('$', '')
+        if ':' in key:
+            lexpr, _, hexpr = key.partition(':')
+            lmatch = CELLREF_REGEX.match(lexpr)
+            hmatch = CELLREF_REGEX.match(hexpr)
+            if lmatch and hmatch:
+                return self.iter_rows(
+                    int(lmatch.group(2)), int(hmatch.group(2)),
+                    parse_column(lmatch.group(1)), parse_column(hmatch.group(1)))
+        elif VINDEX_REGEX.match(key):
+            return self._row(int(key), 1, self._max_column)
+        elif COLUMN_REGEX.match(key):
+            col = parse_column(key)
+            return tuple(row[0] for row in self.iter_rows(min_col=col, max_col=col))
+        else:
+            matches = CELLREF_REGEX.match(key)
+            if matches:
+                return self.cell(int(matches.group(2)), parse_column(matches.group(1)))
+        Ctx.throw('错误的单元格式：{0!r}', key)
+
+
+def _parse_isodate(text):
+    text = text.strip().rstrip('Z')
+    for fmt in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d', '%H:%M:%S.%f', '%H:%M:%S'):
+        try:
+            value = datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return value.time() if fmt.startswith('%H') else value
+    return text
+
+
+def open_worksheet(filepath, sheetname, head=0, select=None, trim=False):
+    with FastWorkbook(filepath) as wb:
+        return wb.get_sheet(sheetname, head, select, trim)